@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import DailyVisitor
+from .models import DailyVisitor, DailyMetrics, VisitorSnapshot
 
 @admin.register(DailyVisitor)
 class DailyVisitorAdmin(admin.ModelAdmin):
@@ -7,3 +7,15 @@ class DailyVisitorAdmin(admin.ModelAdmin):
     list_filter = ('date', 'path')
     search_fields = ('visitor_id', 'ip_address', 'path', 'referrer')
     date_hierarchy = 'date'
+
+@admin.register(DailyMetrics)
+class DailyMetricsAdmin(admin.ModelAdmin):
+    list_display = ('date', 'signups', 'active_subscriptions', 'revenue', 'purchasers', 'logins', 'total_users')
+    date_hierarchy = 'date'
+
+@admin.register(VisitorSnapshot)
+class VisitorSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('date', 'path', 'visitors', 'updated_at')
+    list_filter = ('date',)
+    search_fields = ('path',)
+    date_hierarchy = 'date'
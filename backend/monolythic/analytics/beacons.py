@@ -0,0 +1,156 @@
+import json
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_ipv46_address
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
+
+from .models import DailyVisitor
+from .visitors import add_visit
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "analytics:beacons"
+
+DEFAULTS = {
+    "MAX_EVENTS": 100,  # events accepted per request
+    "BATCH_SIZE": 1000,  # rows per INSERT
+    "MAX_QUEUE": 200000,  # newer events are dropped beyond this size
+}
+
+# field -> (type, max length); everything else sent by the client is ignored
+OPTIONAL_FIELDS = {
+    "user_agent": (str, None),
+    "referrer": (str, 500),
+    "browser_language": (str, 20),
+    "screen_width": (int, None),
+    "screen_height": (int, None),
+}
+
+
+def get_beacon_settings():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "VISITOR_BEACONS", {}))
+    return config
+
+
+def get_connection():
+    return get_redis_connection("default")
+
+
+def clean_beacon(event, ip_address=None, user_id=None):
+    """
+    Validate one beacon and return the DailyVisitor fields to store, raises
+    ValueError with a message when the event is unusable.
+    """
+    if not isinstance(event, dict):
+        raise ValueError("Event must be an object")
+    visitor_id, path = event.get("visitor_id"), event.get("path")
+    if not isinstance(visitor_id, str) or not visitor_id or len(visitor_id) > 255:
+        raise ValueError("visitor_id must be a string of at most 255 characters")
+    if not isinstance(path, str) or not path or len(path) > 255:
+        raise ValueError("path must be a string of at most 255 characters")
+
+    beacon = {"visitor_id": visitor_id, "path": path}
+    for field, (field_type, max_length) in OPTIONAL_FIELDS.items():
+        value = event.get(field)
+        if value is None or isinstance(value, bool) or not isinstance(value, field_type):
+            continue
+        beacon[field] = value[:max_length] if max_length else value
+    beacon.setdefault("user_agent", "")
+
+    # The IP sent by the client is only kept when it is valid
+    beacon["ip_address"] = ip_address
+    client_ip = event.get("ip_address")
+    if isinstance(client_ip, str):
+        try:
+            validate_ipv46_address(client_ip)
+            beacon["ip_address"] = client_ip
+        except ValidationError:
+            pass
+    if not beacon["ip_address"]:
+        raise ValueError("ip_address is missing")
+    beacon["user_id"] = str(user_id) if user_id else None
+    beacon["time"] = timezone.now().isoformat()
+    return beacon
+
+
+def enqueue_beacons(beacons):
+    """
+    Queue cleaned beacons for ingest_visitor_beacons and count them in the
+    visitor HyperLogLogs. Falls back to writing them right away when Redis is
+    unavailable. Returns the number of beacons accepted.
+    """
+    if not beacons:
+        return 0
+    config = get_beacon_settings()
+    try:
+        connection = get_connection()
+        pipe = connection.pipeline()
+        pipe.rpush(QUEUE_KEY, *[json.dumps(beacon) for beacon in beacons])
+        # Keeps the oldest events: a backlog is not made worse by new traffic
+        pipe.ltrim(QUEUE_KEY, 0, config["MAX_QUEUE"] - 1)
+        today = timezone.localdate()
+        for beacon in beacons:
+            add_visit(pipe, beacon["visitor_id"], beacon["path"], today)
+        length = pipe.execute()[0]
+        if length > config["MAX_QUEUE"]:
+            dropped = min(len(beacons), length - config["MAX_QUEUE"])
+            logger.warning(f"Visitor beacon queue is full, dropped {dropped} events")
+            return len(beacons) - dropped
+        return len(beacons)
+    except Exception as e:
+        logger.warning(f"Visitor beacon queue unavailable, writing {len(beacons)} events directly: {str(e)}")
+        return write_beacons(beacons)
+
+
+def write_beacons(beacons):
+    """Insert beacons, the ones already stored for the visitor that day are skipped"""
+    visitors = []
+    for beacon in beacons:
+        beacon = dict(beacon)
+        moment = parse_datetime(beacon.pop("time"))
+        visitors.append(
+            DailyVisitor(date=timezone.localdate(moment), time=moment, **beacon)
+        )
+    DailyVisitor.objects.bulk_create(visitors, ignore_conflicts=True)
+    return len(visitors)
+
+
+def pop_beacons(count):
+    """Atomically take up to ``count`` beacons from the head of the queue"""
+    pipe = get_connection().pipeline(transaction=True)
+    pipe.lrange(QUEUE_KEY, 0, count - 1)
+    pipe.ltrim(QUEUE_KEY, count, -1)
+    items, _ = pipe.execute()
+    return [json.loads(item) for item in items]
+
+
+def ingest_beacons(max_batches=50):
+    """
+    Write queued beacons in chunks of BATCH_SIZE until the queue is empty or
+    ``max_batches`` chunks were written. Returns the number of beacons read.
+    """
+    batch_size = get_beacon_settings()["BATCH_SIZE"]
+    count = 0
+    for _ in range(max_batches):
+        beacons = pop_beacons(batch_size)
+        if not beacons:
+            break
+        try:
+            write_beacons(beacons)
+        except Exception:
+            # Put the chunk back for the next run before reporting the error
+            get_connection().lpush(QUEUE_KEY, *[json.dumps(beacon) for beacon in reversed(beacons)])
+            raise
+        count += len(beacons)
+        if len(beacons) < batch_size:
+            break
+    return count
+
+
+def get_queue_length():
+    return get_connection().llen(QUEUE_KEY)
@@ -0,0 +1,24 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from analytics.metrics import rollup_daily_metrics
+
+class Command(BaseCommand):
+    help = 'Computes the DailyMetrics rows of past days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='Number of days to backfill, today included')
+        parser.add_argument('--since', type=date.fromisoformat, help='First day to backfill (YYYY-MM-DD), overrides --days')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        since = options['since'] or today - timezone.timedelta(days=options['days'] - 1)
+        try:
+            count = rollup_daily_metrics(since, today)
+            self.stdout.write(
+                self.style.SUCCESS(f'Backfilled the daily metrics of {count} days since {since}')
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'Failed to backfill the daily metrics: {str(e)}')
+            )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from analytics.visitors import RETENTION_DAYS, rebuild_visitor_counts, snapshot_visitor_counts
+
+class Command(BaseCommand):
+    help = 'Rebuilds the Redis unique visitor counters (and their snapshots) from the DailyVisitor rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help=f'Number of days to rebuild, today included (at most {RETENTION_DAYS})')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        since = today - timezone.timedelta(days=min(options['days'], RETENTION_DAYS) - 1)
+        try:
+            visits = rebuild_visitor_counts(since, today)
+            day = since
+            while day <= today:
+                snapshot_visitor_counts(day)
+                day += timezone.timedelta(days=1)
+            self.stdout.write(
+                self.style.SUCCESS(f'Rebuilt the visitor counters since {since} ({visits} visits)')
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'Failed to rebuild the visitor counters: {str(e)}')
+            )
@@ -0,0 +1,130 @@
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from payments.models import Subscription
+from .models import DailyMetrics
+
+User = get_user_model()
+
+DAY_FIELDS = ['signups', 'active_subscriptions', 'revenue', 'purchasers', 'logins']
+SNAPSHOT_FIELDS = ['total_users', 'total_students', 'total_professionals', 'total_admins']
+
+
+def day_range(start_date, end_date):
+    """Aware datetimes covering the days start_date..end_date (inclusive)"""
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start_date, time.min), tz),
+        timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), tz),
+    )
+
+
+def compute_daily_metrics(start_date, end_date):
+    """
+    Metrics of every day in start_date..end_date, as {date: {field: value}}.
+    One grouped query per source table, whatever the number of days.
+    """
+    start, end = day_range(start_date, end_date)
+    metrics = {}
+
+    def add(rows, field, value_field='total'):
+        for row in rows:
+            metrics.setdefault(row['day'], {})[field] = row[value_field] or 0
+
+    add(
+        User.objects.filter(date_joined__gte=start, date_joined__lt=end)
+        .annotate(day=TruncDate('date_joined')).values('day').annotate(total=Count('id')).order_by(),
+        'signups',
+    )
+    add(
+        User.objects.filter(last_login__gte=start, last_login__lt=end)
+        .annotate(day=TruncDate('last_login')).values('day').annotate(total=Count('id')).order_by(),
+        'logins',
+    )
+    # Paid subscriptions bought that day. Whether they are still running is
+    # left out: it changes after the day is rolled up, and a stored row would
+    # keep counting subscriptions that have expired since.
+    subscriptions = (
+        Subscription.objects.filter(
+            created_at__gte=start,
+            created_at__lt=end,
+            is_active=True,
+        )
+        .annotate(day=TruncDate('created_at')).values('day')
+        .annotate(
+            total=Count('id'),
+            revenue=Sum('plan__price'),
+            purchasers=Count('user', distinct=True),
+        )
+        .order_by()
+    )
+    subscriptions = list(subscriptions)
+    add(subscriptions, 'active_subscriptions')
+    add(subscriptions, 'revenue', 'revenue')
+    add(subscriptions, 'purchasers', 'purchasers')
+    return metrics
+
+
+def compute_user_totals():
+    """Current user totals, in a single query"""
+    not_admin = Q(is_staff=False, is_superuser=False)
+    return User.objects.aggregate(
+        total_users=Count('id'),
+        total_students=Count('id', filter=Q(user_type='STUDENT') & not_admin),
+        total_professionals=Count('id', filter=Q(user_type='PROFESSIONAL') & not_admin),
+        total_admins=Count('id', filter=Q(is_staff=True) | Q(is_superuser=True)),
+    )
+
+
+def rollup_daily_metrics(start_date, end_date):
+    """
+    (Re)compute the rows of start_date..end_date and upsert them; today's row
+    also gets the current user totals. Returns the number of rows written.
+    """
+    metrics = compute_daily_metrics(start_date, end_date)
+    today = timezone.localdate()
+    rows = []
+    day = start_date
+    while day <= end_date:
+        values = {field: metrics.get(day, {}).get(field, 0) for field in DAY_FIELDS}
+        row = DailyMetrics(date=day, **values)
+        if day == today:
+            for field, value in compute_user_totals().items():
+                setattr(row, field, value)
+        rows.append(row)
+        day += timedelta(days=1)
+
+    update_fields = DAY_FIELDS + ['updated_at']
+    DailyMetrics.objects.bulk_create(
+        [row for row in rows if row.date != today],
+        update_conflicts=True,
+        unique_fields=['date'],
+        update_fields=update_fields,
+    )
+    DailyMetrics.objects.bulk_create(
+        [row for row in rows if row.date == today],
+        update_conflicts=True,
+        unique_fields=['date'],
+        update_fields=update_fields + SNAPSHOT_FIELDS,
+    )
+    return len(rows)
+
+
+def get_period_metrics(start_date, end_date):
+    """Sums of the daily metrics of start_date..end_date"""
+    totals = DailyMetrics.objects.filter(date__gte=start_date, date__lte=end_date).aggregate(
+        **{field: Sum(field) for field in DAY_FIELDS}
+    )
+    return {field: value or 0 for field, value in totals.items()}
+
+
+def get_user_totals():
+    """User totals of the latest rollup, computed on the spot if the task never ran"""
+    latest = DailyMetrics.objects.filter(total_users__isnull=False).order_by('-date').first()
+    if latest is None:
+        return compute_user_totals()
+    return {field: getattr(latest, field) for field in SNAPSHOT_FIELDS}
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.12 on 2026-10-18 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('signups', models.PositiveIntegerField(default=0)),
+                ('active_subscriptions', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('purchasers', models.PositiveIntegerField(default=0)),
+                ('logins', models.PositiveIntegerField(default=0)),
+                ('total_users', models.PositiveIntegerField(blank=True, null=True)),
+                ('total_students', models.PositiveIntegerField(blank=True, null=True)),
+                ('total_professionals', models.PositiveIntegerField(blank=True, null=True)),
+                ('total_admins', models.PositiveIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily metrics',
+                'ordering': ['-date'],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.12 on 2026-10-18 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_dailymetrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitorSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('path', models.CharField(blank=True, default='', max_length=255)),
+                ('visitors', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-date', 'path'],
+                'unique_together': {('date', 'path')},
+            },
+        ),
+    ]
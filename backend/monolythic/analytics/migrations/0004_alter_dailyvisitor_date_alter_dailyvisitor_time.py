@@ -0,0 +1,24 @@
+# Generated by Django 5.1.12 on 2026-10-18 03:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_visitorsnapshot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailyvisitor',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.AlterField(
+            model_name='dailyvisitor',
+            name='time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
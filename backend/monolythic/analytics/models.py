@@ -1,12 +1,14 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
 class DailyVisitor(models.Model):
     visitor_id = models.CharField(max_length=255)  # from frontend
-    date = models.DateField(auto_now_add=True)
-    time = models.DateTimeField(auto_now_add=True)
+    # Defaults rather than auto_now_add so that queued beacons keep the time they were received
+    date = models.DateField(default=timezone.localdate)
+    time = models.DateTimeField(default=timezone.now)
 
     ip_address = models.GenericIPAddressField()
     user_agent = models.TextField()
@@ -26,3 +28,52 @@ class DailyVisitor(models.Model):
 
     def __str__(self):
         return f"{self.visitor_id} on {self.date}"
+
+
+class DailyMetrics(models.Model):
+    """
+    One row per day of the dashboard figures, filled by the
+    rollup_daily_metrics beat task (see analytics/metrics.py).
+    """
+    date = models.DateField(unique=True)
+    signups = models.PositiveIntegerField(default=0)
+    # Paid subscriptions bought that day (expired ones included), and what they cost
+    active_subscriptions = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    purchasers = models.PositiveIntegerField(default=0)
+    # Users whose last login falls on that day
+    logins = models.PositiveIntegerField(default=0)
+
+    # User totals at the last rollup of the day (only kept on the days the task ran)
+    total_users = models.PositiveIntegerField(null=True, blank=True)
+    total_students = models.PositiveIntegerField(null=True, blank=True)
+    total_professionals = models.PositiveIntegerField(null=True, blank=True)
+    total_admins = models.PositiveIntegerField(null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name_plural = 'Daily metrics'
+
+    def __str__(self):
+        return f"Metrics of {self.date}"
+
+
+class VisitorSnapshot(models.Model):
+    """
+    Unique visitors of a day (per page, or the whole site when ``path`` is
+    empty) copied from the Redis HyperLogLogs by the snapshot_visitor_counts
+    beat task (see analytics/visitors.py).
+    """
+    date = models.DateField()
+    path = models.CharField(max_length=255, blank=True, default='')
+    visitors = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date', 'path']
+        unique_together = ('date', 'path')
+
+    def __str__(self):
+        return f"{self.visitors} visitors on {self.date} ({self.path or 'all pages'})"
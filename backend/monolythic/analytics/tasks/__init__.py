@@ -0,0 +1,6 @@
+# Make sure the tasks are registered when the 'tasks' package is imported
+from .beacons import ingest_visitor_beacons
+from .rollup import rollup_daily_metrics
+from .visitors import snapshot_visitor_counts
+
+__all__ = ['ingest_visitor_beacons', 'rollup_daily_metrics', 'snapshot_visitor_counts']
@@ -0,0 +1,27 @@
+import logging
+from celery import shared_task
+from ..beacons import ingest_beacons
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def ingest_visitor_beacons(max_batches=50):
+    """
+    Write the visitor beacons queued in Redis by the batch endpoint, in
+    chunks of VISITOR_BEACONS['BATCH_SIZE'] rows.
+    """
+    try:
+        count = ingest_beacons(max_batches=max_batches)
+
+        if count:
+            logger.info(f"Ingested {count} visitor beacons")
+        return {
+            'status': 'success',
+            'count': count
+        }
+    except Exception as e:
+        logger.exception(f"Error ingesting visitor beacons: {str(e)}")
+        return {
+            'status': 'error',
+            'message': f'Error ingesting visitor beacons: {str(e)}'
+        }
@@ -0,0 +1,28 @@
+import logging
+from celery import shared_task
+from django.utils import timezone
+from ..metrics import rollup_daily_metrics as rollup
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def rollup_daily_metrics(days=2):
+    """
+    Recompute the DailyMetrics rows of the last ``days`` days (today included).
+    Yesterday is redone so that activity logged around midnight is not lost.
+    """
+    try:
+        today = timezone.localdate()
+        count = rollup(today - timezone.timedelta(days=days - 1), today)
+
+        logger.info(f"Rolled up the daily metrics of {count} days")
+        return {
+            'status': 'success',
+            'count': count
+        }
+    except Exception as e:
+        logger.exception(f"Error rolling up daily metrics: {str(e)}")
+        return {
+            'status': 'error',
+            'message': f'Error rolling up daily metrics: {str(e)}'
+        }
@@ -0,0 +1,31 @@
+import logging
+from celery import shared_task
+from django.utils import timezone
+from ..visitors import snapshot_visitor_counts as snapshot
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def snapshot_visitor_counts(days=2):
+    """
+    Persist the unique visitors of the last ``days`` days (today included)
+    from the Redis HyperLogLogs to VisitorSnapshot.
+    """
+    try:
+        today = timezone.localdate()
+        count = sum(
+            snapshot(today - timezone.timedelta(days=offset))
+            for offset in range(days)
+        )
+
+        logger.info(f"Saved {count} visitor snapshots")
+        return {
+            'status': 'success',
+            'count': count
+        }
+    except Exception as e:
+        logger.exception(f"Error saving visitor snapshots: {str(e)}")
+        return {
+            'status': 'error',
+            'message': f'Error saving visitor snapshots: {str(e)}'
+        }
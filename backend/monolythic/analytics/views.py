@@ -10,11 +10,16 @@ from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 import datetime
+import logging
 from .models import DailyVisitor
 from .serializers import DailyVisitorSerializer
 from .filters import DailyVisitorFilter
+from .beacons import clean_beacon, enqueue_beacons, get_beacon_settings
+from .visitors import count_visitors, exact_daily_visits, exact_unique_visitors, record_visit
 from utils.mixins import ActivityLoggingMixin
 
+logger = logging.getLogger(__name__)
+
 class DailyVisitorViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
     queryset = DailyVisitor.objects.all()
     serializer_class = DailyVisitorSerializer
@@ -23,7 +28,7 @@ class DailyVisitorViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
     swagger_tags = ["Analytics"]
 
     def get_permissions(self):
-        if self.action == 'create':
+        if self.action in ['create', 'batch']:
             # Allow anyone to create a visitor record
             permission_classes = [AllowAny]
         else:
@@ -32,25 +37,97 @@ class DailyVisitorViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
     def create(self, request, *args, **kwargs):
-        # Get the client IP from the request
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip_address = x_forwarded_for.split(',')[0]
-        else:
-            ip_address = request.META.get('REMOTE_ADDR')
-            
+        data = request.data.copy()
+
         # Add IP address to the data if not provided
-        if 'ip_address' not in request.data:
-            request.data['ip_address'] = ip_address
-            
+        if 'ip_address' not in data:
+            data['ip_address'] = self.get_client_ip(request)
+
         # Add the user if they are authenticated
-        if request.user.is_authenticated and 'user' not in request.data:
-            request.data['user'] = request.user.id
-            
-        return super().create(request, *args, **kwargs)
+        if request.user.is_authenticated and 'user' not in data:
+            data['user'] = request.user.id
+
+        serializer = self.get_serializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    @swagger_auto_schema(
+        tags=["Analytics"],
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'events': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        required=['visitor_id', 'path'],
+                        properties={
+                            'visitor_id': openapi.Schema(type=openapi.TYPE_STRING),
+                            'path': openapi.Schema(type=openapi.TYPE_STRING),
+                            'ip_address': openapi.Schema(type=openapi.TYPE_STRING),
+                            'user_agent': openapi.Schema(type=openapi.TYPE_STRING),
+                            'referrer': openapi.Schema(type=openapi.TYPE_STRING),
+                            'browser_language': openapi.Schema(type=openapi.TYPE_STRING),
+                            'screen_width': openapi.Schema(type=openapi.TYPE_INTEGER),
+                            'screen_height': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        }
+                    )
+                )
+            }
+        ),
+        responses={
+            202: openapi.Response(
+                description="Events queued",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'accepted': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'rejected': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+                    }
+                )
+            )
+        }
+    )
+    @action(detail=False, methods=["post"])
+    def batch(self, request):
+        """
+        Record several visitor beacons at once. Events are checked against a
+        minimal schema and queued; they are written in bulk by the
+        ingest_visitor_beacons task (a visitor is stored once per day).
+        """
+        events = request.data.get('events') if isinstance(request.data, dict) else request.data
+        if not isinstance(events, list):
+            return Response({"detail": "Expected a list of events"}, status=status.HTTP_400_BAD_REQUEST)
+        max_events = get_beacon_settings()['MAX_EVENTS']
+        if len(events) > max_events:
+            return Response({"detail": f"At most {max_events} events per request"}, status=status.HTTP_400_BAD_REQUEST)
+
+        ip_address = self.get_client_ip(request)
+        user_id = request.user.id if request.user.is_authenticated else None
+        beacons, rejected = [], []
+        for index, event in enumerate(events):
+            try:
+                beacons.append(clean_beacon(event, ip_address, user_id))
+            except ValueError as e:
+                rejected.append({'index': index, 'error': str(e)})
+
+        accepted = enqueue_beacons(beacons)
+        return Response({'accepted': accepted, 'rejected': rejected}, status=status.HTTP_202_ACCEPTED)
+
+    def perform_create(self, serializer):
+        visitor = serializer.save()
+        record_visit(visitor.visitor_id, visitor.path, visitor.date)
         
     @swagger_auto_schema(
         tags=["Analytics"],
+        manual_parameters=[
+            openapi.Parameter('start_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, description="First day (default: 30 days ago)"),
+            openapi.Parameter('end_date', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, description="Last day (default: today)"),
+            openapi.Parameter('path', openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Only count the visitors of this page"),
+            openapi.Parameter('exact', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN, description="Count from the database instead of the estimates (audits)"),
+        ],
         responses={
             200: openapi.Response(
                 description="Visitor statistics",
@@ -77,39 +154,48 @@ class DailyVisitorViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
     @action(detail=False, methods=["get"])
     def stats(self, request):
         """
-        Get visitor statistics for the past 30 days
+        Get visitor statistics, for the past 30 days by default.
+        Counts come from the Redis HyperLogLogs (see analytics/visitors.py),
+        ``exact=true`` counts the DailyVisitor rows instead.
         """
         # Only authenticated users can access statistics
         if not request.user.is_authenticated:
             return Response({"detail": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
-            
-        end_date = timezone.now().date()
-        start_date = end_date - datetime.timedelta(days=30)
-        
-        # Daily visits
-        daily_visits = DailyVisitor.objects.filter(
-            date__gte=start_date,
-            date__lte=end_date
-        ).values('date').annotate(
-            count=Count('id')
-        ).order_by('date')
-        
-        # Total visits in period
-        total_visits = DailyVisitor.objects.filter(
-            date__gte=start_date,
-            date__lte=end_date
-        ).count()
-        
-        # Unique visitors (based on visitor_id)
-        unique_visitors = DailyVisitor.objects.filter(
-            date__gte=start_date,
-            date__lte=end_date
-        ).values('visitor_id').distinct().count()
-        
+
+        try:
+            end_date = self.parse_date(request.query_params.get('end_date')) or timezone.localdate()
+            start_date = self.parse_date(request.query_params.get('start_date')) or end_date - datetime.timedelta(days=30)
+        except ValueError:
+            return Response({"detail": "Dates must use the YYYY-MM-DD format"}, status=status.HTTP_400_BAD_REQUEST)
+        if start_date > end_date:
+            return Response({"detail": "start_date must be before end_date"}, status=status.HTTP_400_BAD_REQUEST)
+        path = request.query_params.get('path') or None
+        exact = request.query_params.get('exact', '').lower() in ('1', 'true', 'yes')
+
+        daily = None
+        if not exact:
+            try:
+                unique_visitors, daily = count_visitors(start_date, end_date, path)
+            except Exception as e:
+                logger.warning(f"Visitor counters unavailable, counting in the database: {str(e)}")
+        if daily is None:
+            # Rows are unique per visitor and day, so daily visits are daily unique visitors
+            daily = exact_daily_visits(start_date, end_date, path)
+            unique_visitors = exact_unique_visitors(start_date, end_date, path)
+
+        daily_visits = [
+            {'date': day, 'count': count}
+            for day, count in sorted(daily.items()) if count
+        ]
+        total_visits = sum(daily.values())
+
         self.log_activity(request, "Retrieved visitor statistics")
-        
+
         return Response({
             'daily_visits': daily_visits,
             'total_visits': total_visits,
             'unique_visitors': unique_visitors
         })
+
+    def parse_date(self, value):
+        return datetime.date.fromisoformat(value) if value else None
@@ -23,7 +23,7 @@ django_asgi_app = get_asgi_application()
 # Import the websocket routing for the forum public chat and notifications
 from forum.routing import websocket_urlpatterns as forum_websocket_urlpatterns
 from notifications.routing import websocket_urlpatterns as notifications_websocket_urlpatterns
-from oauth2_provider.models import AccessToken  # used for token authentication
+from users.token_cache import resolve_token  # used for token authentication
 
 # # Debug prints
 # print("Forum WebSocket patterns:", forum_websocket_urlpatterns, file=sys.stderr)
@@ -36,11 +36,10 @@ all_websocket_urlpatterns = forum_websocket_urlpatterns + notifications_websocke
 # Define a sync function to get user from token
 @database_sync_to_async
 def get_user_from_token(token):
-    try:
-        access_token = AccessToken.objects.select_related("user").get(token=token)
-        return access_token.user
-    except AccessToken.DoesNotExist:
+    resolution = resolve_token(token)
+    if resolution is None:
         return AnonymousUser()
+    return resolution.user
 
 # Custom middleware to extract token from the query string and authenticate
 class Oauth2TokenMiddleware:
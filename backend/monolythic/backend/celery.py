@@ -2,6 +2,8 @@ from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_shutdown
+from django.conf import settings
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
@@ -21,8 +23,43 @@ app.conf.beat_schedule = {
         'task': 'payments.tasks.process_payments.check_stalled_transactions',
         'schedule': 60.0 * 10,  # Run every 10 minutes
     },
+    'retry-failed-payments-every-15-minutes': {
+        'task': 'payments.tasks.process_payments.retry_failed_payments',
+        # The retry engine budgets its status checks per run on this interval
+        'schedule': 60.0 * settings.PAYMENT_RETRY['INTERVAL'],
+    },
+    'requeue-stalled-webhook-events-every-5-minutes': {
+        'task': 'payments.tasks.webhooks.requeue_stalled_webhook_events',
+        'schedule': 60.0 * 5,  # Run every 5 minutes
+    },
+    'decay-forum-engagement-scores-every-hour': {
+        'task': 'forum.tasks.engagement.decay_engagement_scores',
+        'schedule': 60.0 * 60,  # Run every hour
+    },
+    'flush-forum-post-views-every-15-seconds': {
+        'task': 'forum.tasks.views.flush_post_views',
+        'schedule': 15.0,  # Run every 15 seconds
+    },
+    'rollup-daily-metrics-every-15-minutes': {
+        'task': 'analytics.tasks.rollup.rollup_daily_metrics',
+        'schedule': 60.0 * 15,  # Run every 15 minutes
+    },
+    'snapshot-visitor-counts-every-hour': {
+        'task': 'analytics.tasks.visitors.snapshot_visitor_counts',
+        'schedule': 60.0 * 60,  # Run every hour
+    },
+    'ingest-visitor-beacons-every-10-seconds': {
+        'task': 'analytics.tasks.beacons.ingest_visitor_beacons',
+        'schedule': 10.0,  # Run every 10 seconds
+    },
 }
 
+@worker_process_shutdown.connect
+def flush_pending_activity_logs(**kwargs):
+    # Activity logs emitted inside tasks are buffered in-process, write them before the child exits
+    from utils.activity_log import flush_activity_logs
+    flush_activity_logs()
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
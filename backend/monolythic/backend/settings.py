@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import environ
 import os
+import sys
 
 env = environ.Env()
 environ.Env.read_env()
@@ -206,9 +207,11 @@ if USER_S3:
     # MEDIA_URL = f"https://{AWS_STORAGE_BUCKET_NAME}.s3.{AWS_S3_REGION_NAME}.wasabisys.com/media/"
     # MEDIA_URL = f'https://{AWS_STORAGE_BUCKET_NAME}.s3.{AWS_S3_REGION_NAME}.backblazeb2.com/media/'
 
+    # S3Boto3Storage with shared-client signing and cached presigned URLs
+    # (see backend/storage_backends.py)
     STORAGES = {
         "default": {
-            "BACKEND": "storages.backends.s3boto3.S3Boto3Storage",
+            "BACKEND": "backend.storage_backends.CachedUrlS3Storage",
         },
         "staticfiles": {
             "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
@@ -257,7 +260,8 @@ OAUTH2_PROVIDER = {
 # Make sure our custom backend is used first to validate tokens
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'oauth2_provider.contrib.rest_framework.OAuth2Authentication',
+        # OAuth2Authentication backed by the token cache (users/token_cache.py)
+        'users.authentication.CachedOAuth2Authentication',
         'drf_social_oauth2.authentication.SocialAuthentication',
     ),
 }
@@ -324,6 +328,49 @@ CELERY_WORKER_SEND_TASK_EVENTS = True
 CELERY_TASK_SEND_SENT_EVENT = True
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 
+# User activity logs are buffered in-process and written in batches (see utils.activity_log)
+# SINK: "buffered" (bulk_create from a background thread), "celery" (batches handed to a task) or "sync"
+# The test runner always writes synchronously: a background flush would race the test database
+# and could outlive it.
+TESTING = sys.argv[1:2] == ["test"]
+ACTIVITY_LOG = {
+    "SINK": "sync" if TESTING else env("ACTIVITY_LOG_SINK", default="buffered"),
+    "BATCH_SIZE": env.int("ACTIVITY_LOG_BATCH_SIZE", default=200),
+    "FLUSH_INTERVAL": env.float("ACTIVITY_LOG_FLUSH_INTERVAL", default=2.0),
+    "MAX_BUFFER": env.int("ACTIVITY_LOG_MAX_BUFFER", default=10000),
+}
+
+# Visitor beacons posted to /api/visitors/batch/ are queued in Redis and
+# written in bulk by the ingest_visitor_beacons task (see analytics.beacons)
+VISITOR_BEACONS = {
+    "MAX_EVENTS": env.int("VISITOR_BEACON_MAX_EVENTS", default=100),  # events accepted per request
+    "BATCH_SIZE": env.int("VISITOR_BEACON_BATCH_SIZE", default=1000),  # rows per INSERT
+    "MAX_QUEUE": env.int("VISITOR_BEACON_MAX_QUEUE", default=200000),  # newer events are dropped beyond this size
+}
+
+# Notifications sent to every admin are written and pushed in batches by the
+# fan_out_notification task (see notifications/fanout.py)
+NOTIFICATION_FANOUT = {
+    "BATCH_SIZE": env.int("NOTIFICATION_FANOUT_BATCH_SIZE", default=500),  # notifications per INSERT
+    "DELIVERY_BATCH_SIZE": env.int("NOTIFICATION_FANOUT_DELIVERY_BATCH_SIZE", default=100),  # WebSocket events sent concurrently
+}
+
+# Forum post views are recorded in Redis and written in bulk by the
+# flush_post_views task (see forum/seen.py)
+FORUM_VIEWS = {
+    "BATCH_SIZE": env.int("FORUM_VIEWS_BATCH_SIZE", default=200),  # posts flushed per batch
+    "INSERT_BATCH_SIZE": env.int("FORUM_VIEWS_INSERT_BATCH_SIZE", default=1000),  # Seen rows per INSERT
+    "SEEN_TTL": env.int("FORUM_VIEWS_SEEN_TTL", default=60 * 60 * 24 * 7),  # seconds before an idle seen set is reloaded
+}
+
+# Public chat posts are broadcast right away and written in batches by an
+# in-process writer (see forum/writer.py)
+PUBLIC_CHAT_WRITER = {
+    "TICK": env.float("PUBLIC_CHAT_WRITER_TICK", default=0.05),  # seconds between two writes
+    "BATCH_SIZE": env.int("PUBLIC_CHAT_WRITER_BATCH_SIZE", default=200),  # posts per INSERT
+    "MAX_QUEUE": env.int("PUBLIC_CHAT_WRITER_MAX_QUEUE", default=5000),  # new messages are refused beyond this many unwritten posts
+}
+
 # Rabbitmq configuration
 
 RABBITMQ_HOST = env("RABBITMQ_HOST", default="localhost")
@@ -428,6 +475,45 @@ FREEMOPAY_APP_KEY = os.environ.get('FREEMOPAY_APP_KEY', 'your_freemopay_app_key'
 FREEMOPAY_SECRET_KEY = os.environ.get('FREEMOPAY_SECRET_KEY', 'your_freemopay_secret_key')
 FREEMOPAY_BASE_URL = os.environ.get('FREEMOPAY_BASE_URL', 'https://api-v2.freemopay.com')
 
+# Payment links are created by a Celery task and the views answer 202 right
+# away (see payments/initiation.py); clients can also ask for it with "async"
+PAYMENT_ASYNC_INITIATION = env.bool("PAYMENT_ASYNC_INITIATION", default=False)
+
+# Pooled HTTP sessions and shared tokens of the payment providers (see payments/providers.py)
+PAYMENT_PROVIDERS = {
+    "POOL_MAXSIZE": env.int("PAYMENT_PROVIDERS_POOL_MAXSIZE", default=20),  # connections kept open per host and process
+    "CONNECT_TIMEOUT": env.float("PAYMENT_PROVIDERS_CONNECT_TIMEOUT", default=5),
+    "READ_TIMEOUT": env.float("PAYMENT_PROVIDERS_READ_TIMEOUT", default=30),
+    "RETRIES": env.int("PAYMENT_PROVIDERS_RETRIES", default=2),  # connection errors and status checks only
+    "TOKEN_REFRESH_MARGIN": env.int("PAYMENT_PROVIDERS_TOKEN_REFRESH_MARGIN", default=60 * 5),  # seconds before expiry
+}
+
+# Failed payments are checked again with the provider status APIs by the
+# retry_failed_payments task (see payments/retry.py)
+PAYMENT_RETRY = {
+    "INTERVAL": env.int("PAYMENT_RETRY_INTERVAL", default=15),  # minutes between scheduler runs
+    "BATCH_SIZE": env.int("PAYMENT_RETRY_BATCH_SIZE", default=50),  # transactions claimed and queued together
+    "MAX_ATTEMPTS": env.int("PAYMENT_RETRY_MAX_ATTEMPTS", default=5),
+    "BASE_DELAY": env.int("PAYMENT_RETRY_BASE_DELAY", default=60 * 5),  # seconds, doubled after every attempt
+    "MAX_DELAY": env.int("PAYMENT_RETRY_MAX_DELAY", default=60 * 60 * 12),
+    # Status checks per minute and provider
+    "RATE_LIMITS": {
+        "campay": env.int("PAYMENT_RETRY_CAMPAY_RATE", default=30),
+        "freemopay": env.int("PAYMENT_RETRY_FREEMOPAY_RATE", default=30),
+    },
+}
+
+# PENDING transactions older than AFTER_MINUTES are marked FAILED by the
+# check_stalled_transactions task, in batches (see payments/stalled.py)
+STALLED_TRANSACTIONS = {
+    "AFTER_MINUTES": env.int("STALLED_TRANSACTIONS_AFTER_MINUTES", default=30),
+    "BATCH_SIZE": env.int("STALLED_TRANSACTIONS_BATCH_SIZE", default=500),
+    "MAX_BATCHES": env.int("STALLED_TRANSACTIONS_MAX_BATCHES", default=20),  # per run, the rest waits for the next one
+    # Ask the providers before giving up on a transaction (payments that went through are applied)
+    "CHECK_PROVIDER": env.bool("STALLED_TRANSACTIONS_CHECK_PROVIDER", default=False),
+    "CHECK_WORKERS": env.int("STALLED_TRANSACTIONS_CHECK_WORKERS", default=8),
+}
+
 
 # Trust proxy headers from Nginx
 USE_X_FORWARDED_HOST = True
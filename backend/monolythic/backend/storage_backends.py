@@ -1,39 +1,188 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
 from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
 import boto3
+from botocore.config import Config
 from django.conf import settings
+from django.core.cache import cache
+from utils.local_cache import LocalLRUCache
 
-class MediaStorage(S3Boto3Storage):
-    location = 'media'
-    default_acl = 'private'
-    file_overwrite = False
-    custom_domain = False
-    
-    def url(self, name, parameters=None, expire=3600):
+logger = logging.getLogger(__name__)
+
+PRESIGNED_URL_EXPIRE = 3600
+# Cached URLs are served for at most this long, so a client always gets a URL
+# that stays valid for (expire - ttl) seconds after we hand it out.
+PRESIGNED_URL_CACHE_TTL = getattr(settings, 'PRESIGNED_URL_CACHE_TTL', 3000)
+PRESIGNED_URL_LRU_SIZE = getattr(settings, 'PRESIGNED_URL_LRU_SIZE', 2048)
+S3_MAX_POOL_CONNECTIONS = getattr(settings, 'S3_MAX_POOL_CONNECTIONS', 20)
+
+_client_lock = threading.Lock()
+_clients = {}
+client_builds = 0
+
+
+def get_s3_client():
+    """
+    Process wide S3 client. boto3 clients are thread safe, so one client (and
+    its connection pool) is shared by every request of the process and only
+    rebuilt after a fork.
+    """
+    global client_builds
+    key = (
+        os.getpid(),
+        settings.AWS_S3_ENDPOINT_URL,
+        settings.AWS_ACCESS_KEY_ID,
+        settings.AWS_S3_REGION_NAME,
+    )
+    client = _clients.get(key)
+    if client is None:
+        with _client_lock:
+            client = _clients.get(key)
+            if client is None:
+                # Creating the client is not thread safe on the default session
+                client = boto3.session.Session().client(
+                    's3',
+                    endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_S3_REGION_NAME,
+                    config=Config(max_pool_connections=S3_MAX_POOL_CONNECTIONS),
+                )
+                _clients.clear()
+                _clients[key] = client
+                client_builds += 1
+    return client
+
+
+class PresignedUrlCache:
+    """
+    Two level cache of presigned URLs: a per process LRU in front of the
+    shared Redis cache. Entries keep the time they stop being served, so a URL
+    found in Redis is only kept in memory for what is left of its lifetime.
+    """
+
+    def __init__(self, max_size=PRESIGNED_URL_LRU_SIZE, ttl=PRESIGNED_URL_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.local = LocalLRUCache(max_size=max_size, timeout=ttl)
+
+    @staticmethod
+    def cache_key(bucket, key):
+        digest = hashlib.md5(f"{bucket}/{key}".encode()).hexdigest()
+        return f"presigned_url_{digest}"
+
+    def get(self, bucket, key):
+        cache_key = self.cache_key(bucket, key)
+        url = self.local.get(cache_key)
+        if url is not None:
+            self.hits += 1
+            return url
+
+        try:
+            entry = cache.get(cache_key)
+        except Exception as e:
+            logger.warning(f"Presigned URL cache unavailable: {str(e)}")
+            entry = None
+        remaining = entry[1] - time.time() if entry is not None else 0
+        if remaining > 0:
+            self.local.set(cache_key, entry[0], timeout=remaining)
+            self.redis_hits += 1
+            return entry[0]
+        self.misses += 1
+        return None
+
+    def set(self, bucket, key, url):
+        cache_key = self.cache_key(bucket, key)
+        self.local.set(cache_key, url)
+        try:
+            cache.set(cache_key, (url, time.time() + self.ttl), timeout=self.ttl)
+        except Exception as e:
+            logger.warning(f"Presigned URL cache unavailable: {str(e)}")
+
+    def delete(self, bucket, key):
+        cache_key = self.cache_key(bucket, key)
+        self.local.delete(cache_key)
+        try:
+            cache.delete(cache_key)
+        except Exception as e:
+            logger.warning(f"Presigned URL cache unavailable: {str(e)}")
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self):
+        return {
+            'size': len(self.local),
+            'hits': self.hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'client_builds': client_builds,
+        }
+
+
+presigned_url_cache = PresignedUrlCache()
+
+
+class CachedUrlS3Storage(S3Boto3Storage):
+    """
+    S3Boto3Storage whose presigned URLs are signed with the shared client and
+    cached (see PresignedUrlCache). This is the default storage when USE_S3
+    is on, so every FileField (resource files, avatars, post attachments)
+    goes through the cache with its usual bucket and object keys.
+    """
+
+    def object_key(self, name):
+        return self._normalize_name(clean_name(name))
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
         """
-        Generate a presigned URL for the file that expires in 1 hour
+        Presigned URL of the file, valid for 1 hour by default. URLs with
+        the default expiry and no extra parameters are cached.
         """
+        if self.custom_domain or not self.querystring_auth or http_method not in (None, 'GET'):
+            return super().url(name, parameters=parameters, expire=expire, http_method=http_method)
+        if expire is None:
+            expire = self.querystring_expire
         try:
-            s3_client = boto3.client(
-                's3',
-                endpoint_url=settings.AWS_S3_ENDPOINT_URL,
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_S3_REGION_NAME
-            )
-            
-            url = s3_client.generate_presigned_url(
+            bucket = self.bucket_name
+            key = self.object_key(name)
+            cacheable = parameters is None and expire == PRESIGNED_URL_EXPIRE
+            if cacheable:
+                url = presigned_url_cache.get(bucket, key)
+                if url is not None:
+                    return url
+
+            params = dict(parameters or {}, Bucket=bucket, Key=key)
+            url = get_s3_client().generate_presigned_url(
                 'get_object',
-                Params={
-                    'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
-                    'Key': self._normalize_name(self._clean_name(name)),
-                },
+                Params=params,
                 ExpiresIn=expire
             )
+            if cacheable:
+                presigned_url_cache.set(bucket, key, url)
             return url
         except Exception as e:
-            print(f"Error generating URL: {str(e)}")
+            logger.error(f"Error generating URL: {str(e)}")
             return None
 
+    def delete(self, name):
+        super().delete(name)
+        presigned_url_cache.delete(self.bucket_name, self.object_key(name))
+
+
+class MediaStorage(CachedUrlS3Storage):
+    location = 'media'
+    default_acl = 'private'
+    file_overwrite = False
+    custom_domain = False
+
 # from storages.backends.s3boto3 import S3Boto3Storage
 
 # class MediaStorage(S3Boto3Storage):
@@ -4,11 +4,12 @@ from .models import (
     SchoolYear, User, Topic, Class, Subject, Chapter,
     AbstractResource, VideoResource,
     RevisionResource, PDFResource, ExerciseResource,
-    UserProgress, CourseCategory, UserAvailability, DailyTimeSlot,
+    UserProgress, CourseCategory, UserAvailability,
     CourseOffering, CourseOfferingAction, TeacherStudentEnrollment, CourseDeclaration, UserClass,
     Section, EducationLevel, Speciality, LevelClassDefinition
     # Question, QuestionOption, QuizAttempt, QuestionResponse
 )
+from .availability import slots_of
 
 @admin.register(SchoolYear)
 class SchoolYearAdmin(admin.ModelAdmin):
@@ -117,20 +118,21 @@ class CourseCategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'parent')
     search_fields = ('name',)
 
-class DailyTimeSlotInline(admin.TabularInline):
-    model = DailyTimeSlot
-    extra = 1
-
 @admin.register(UserAvailability)
 class UserAvailabilityAdmin(admin.ModelAdmin):
-    list_display = ('user', 'is_available','last_updated')
+    list_display = ('user', 'is_available', 'available_slots', 'last_updated')
     search_fields = ('user__email',)
-    inlines = [DailyTimeSlotInline]
-    
-@admin.register(DailyTimeSlot)
-class DailyTimeSlotAdmin(admin.ModelAdmin):
-    list_display = ('availability', 'day', 'time_slot', 'is_available')
-    search_fields = ('availability__user__email',)
+    readonly_fields = ('available_slots_list',)
+
+    @admin.display(description='Available slots')
+    def available_slots(self, obj):
+        return obj.slots_mask.bit_count()
+
+    @admin.display(description='Available slots')
+    def available_slots_list(self, obj):
+        return ', '.join(
+            f"{slot['day']} {slot['time_slot']}" for slot in slots_of(obj.slots_mask) if slot['is_available']
+        ) or '-'
 
 @admin.register(CourseOffering)
 class CourseOfferingAdmin(admin.ModelAdmin):
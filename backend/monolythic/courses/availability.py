@@ -0,0 +1,110 @@
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import UserAvailability
+
+# Weekly availability is one integer per user (UserAvailability.slots_mask),
+# one bit per (day, time slot). Toggling a slot is a single UPDATE, and two
+# users share a slot when the AND of their masks is not zero.
+DAYS = [day for day, _ in UserAvailability.DAYS_OF_WEEK]
+TIME_SLOTS = [time_slot for time_slot, _ in UserAvailability.TIME_SLOTS]
+SLOT_COUNT = len(DAYS) * len(TIME_SLOTS)
+ALL_SLOTS = (1 << SLOT_COUNT) - 1
+
+
+def slot_index(day, time_slot):
+    """Bit of a (day, time slot) pair in the mask, ValueError if unknown"""
+    return DAYS.index(day) * len(TIME_SLOTS) + TIME_SLOTS.index(time_slot)
+
+
+def slot_bit(index):
+    if not 0 <= index < SLOT_COUNT:
+        raise ValueError(f"Invalid time slot {index}")
+    return 1 << index
+
+
+def mask_of(slots):
+    """Mask of an iterable of (day, time slot) pairs"""
+    mask = 0
+    for day, time_slot in slots:
+        mask |= 1 << slot_index(day, time_slot)
+    return mask
+
+
+def slots_of(mask):
+    """
+    Every slot of the week in the shape of the former DailyTimeSlot rows,
+    the bit index being the slot id.
+    """
+    return [
+        {
+            'id': index,
+            'day': DAYS[index // len(TIME_SLOTS)],
+            'time_slot': TIME_SLOTS[index % len(TIME_SLOTS)],
+            'is_available': bool(mask >> index & 1),
+        }
+        for index in range(SLOT_COUNT)
+    ]
+
+
+def common_slot_count(mask, other):
+    return (mask & other).bit_count()
+
+
+def set_time_slot(availability_id, index, is_available):
+    """
+    Switch one slot of an availability on or off in a single UPDATE, so
+    concurrent updates of other slots are never lost. Returns the number of
+    availabilities updated.
+    """
+    bit = slot_bit(index)
+    if is_available:
+        slots_mask = F('slots_mask').bitor(bit)
+    else:
+        slots_mask = F('slots_mask').bitand(ALL_SLOTS & ~bit)
+    return UserAvailability.objects.filter(pk=availability_id).update(
+        slots_mask=slots_mask,
+        last_updated=timezone.now()
+    )
+
+
+def student_mask(user_id):
+    """Slots a user declared, across all their availabilities"""
+    mask = 0
+    for slots_mask in UserAvailability.objects.filter(user_id=user_id, is_available=True).values_list('slots_mask', flat=True):
+        mask |= slots_mask
+    return mask
+
+
+def teacher_availabilities():
+    return UserAvailability.objects.filter(
+        Q(user_type='TEACHER') | Q(user__user_type='PROFESSIONAL'),
+        is_available=True,
+        user__is_active=True,
+    )
+
+
+def find_available_teachers(offer, min_common_slots=1):
+    """
+    Availabilities of the teachers sharing at least ``min_common_slots`` slots
+    with the student of ``offer``, most common slots first. The masks of all
+    teachers are matched in a single query; each availability gets the
+    ``common_mask`` and ``common_slots`` of its overlap.
+    """
+    mask = student_mask(offer.student_id)
+    if not mask:
+        return []
+    candidates = (
+        teacher_availabilities()
+        .exclude(user_id=offer.student_id)
+        .annotate(common_mask=F('slots_mask').bitand(mask))
+        .exclude(common_mask=0)
+        .select_related('user')
+    )
+    teachers = []
+    for availability in candidates:
+        availability.common_slots = availability.common_mask.bit_count()
+        if availability.common_slots >= min_common_slots:
+            teachers.append(availability)
+    teachers.sort(key=lambda availability: availability.common_slots, reverse=True)
+    return teachers
@@ -6,6 +6,10 @@ from .models import (
     CourseOffering, CourseOfferingAction, CourseDeclaration, TeacherStudentEnrollment, UserClass, SchoolYear,
     Section, EducationLevel, Speciality, LevelClassDefinition
 )
+from utils.search import search
+
+# Fields of the ranked ?search=, indexed by courses/migrations/0008_search_indexes.py
+RESOURCE_SEARCH_FIELDS = {'title': 'A', 'description': 'B'}
 
 class CourseCategoryFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(lookup_expr='icontains')
@@ -95,10 +99,15 @@ class ResourceFilter(django_filters.FilterSet):
     topic = django_filters.ModelChoiceFilter(queryset=Topic.objects.all())
     created_at = django_filters.DateTimeFromToRangeFilter()
     resource_type = django_filters.CharFilter(method='filter_resource_type')
+    search = django_filters.CharFilter(method='filter_search')
 
     class Meta:
         model = AbstractResource
         fields = ['title', 'topic']
+
+    def filter_search(self, queryset, name, value):
+        """Ranked search on title and description, best matches first (see utils/search.py)"""
+        return search(queryset, RESOURCE_SEARCH_FIELDS, value)
         
     def filter_resource_type(self, queryset, name, value):
         resource_types = {
@@ -0,0 +1,113 @@
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Class, EducationLevel, UserClass
+from .serializers import ClassSerializer
+
+# Same lifetime as the (commented) cache_page on the class list, the signals
+# in courses/signals.py drop the entries as soon as something changes.
+HIERARCHY_CACHE_TIMEOUT = 60 * 60 * 2
+
+
+def formatted_classes_cache_key(school_year=None):
+    return f"formatted_classes_{school_year.formatted_year if school_year else 'all'}"
+
+
+def invalidate_class_hierarchy(school_year=None):
+    """
+    Drop the cached hierarchy for one school year (and the all-years one),
+    or every cached hierarchy when no school year is given.
+    """
+    if school_year is None:
+        cache.delete_pattern('*formatted_classes_*')
+    else:
+        cache.delete_many([
+            formatted_classes_cache_key(school_year),
+            formatted_classes_cache_key(),
+        ])
+
+
+def get_student_counts(school_year=None):
+    """Number of UserClass rows per class, in a single grouped query"""
+    queryset = UserClass.objects.all()
+    if school_year:
+        queryset = queryset.filter(school_year=school_year)
+    return dict(
+        queryset.order_by().values_list('class_level').annotate(total=Count('id'))
+    )
+
+
+def build_class_hierarchy(school_year=None):
+    """
+    Build the section -> education level -> group -> classes tree served by
+    ClassViewSet.formatted_classes.
+
+    The whole tree comes from one select_related query over Class plus one
+    grouped UserClass count, instead of walking the relations and counting
+    students class by class.
+    """
+    queryset = (
+        Class.objects.filter(
+            definition__isnull=False,
+        )
+        .exclude(definition__education_level__code__contains=EducationLevel.PROFESSIONAL)
+        .select_related(
+            'definition__education_level__section',
+            'definition__speciality',
+        )
+        .order_by('id')
+    )
+    student_counts = get_student_counts(school_year)
+
+    formatted_data = {}
+    for class_obj in queryset:
+        definition = class_obj.definition
+        education_level = definition.education_level
+        section = education_level.section
+        section_code = section.code
+        level_code = education_level.code
+
+        if section_code not in formatted_data:
+            formatted_data[section_code] = {
+                'id': section.id,
+                'code': section.code,
+                'label': section.label,
+                'levels': {}
+            }
+
+        levels = formatted_data[section_code]['levels']
+        if level_code not in levels:
+            levels[level_code] = {
+                'id': education_level.id,
+                'code': education_level.code,
+                'label': education_level.label,
+                'groups': {}
+            }
+
+        if 'LYCEE' in level_code:
+            # For lycee level, organize by speciality
+            speciality = definition.speciality
+            group = speciality.code if speciality else 'NO_SPECIALITY'
+        elif 'UNIVERSITY' in level_code:
+            # For university level, organize by description (e.g., licence, master)
+            group = class_obj.description or 'OTHER'
+        else:
+            # For other levels (college), organize under 'classes'
+            group = 'classes'
+
+        class_obj.student_count = student_counts.get(class_obj.id, 0)
+        levels[level_code]['groups'].setdefault(group, []).append(
+            ClassSerializer(class_obj).data
+        )
+
+    return formatted_data
+
+
+def get_class_hierarchy(school_year=None):
+    """Cached version of build_class_hierarchy, keyed by school year"""
+    cache_key = formatted_classes_cache_key(school_year)
+    data = cache.get(cache_key)
+    if data is None:
+        data = build_class_hierarchy(school_year)
+        cache.set(cache_key, data, timeout=HIERARCHY_CACHE_TIMEOUT)
+    return data
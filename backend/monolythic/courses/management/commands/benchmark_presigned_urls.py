@@ -0,0 +1,81 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from backend import storage_backends
+from backend.storage_backends import presigned_url_cache
+from courses.models import VideoResource
+
+# Used when S3 is not configured (USE_S3=False): signing is done locally by
+# botocore, so the benchmark never talks to the bucket.
+DUMMY_S3_SETTINGS = {
+    'AWS_ACCESS_KEY_ID': 'benchmark',
+    'AWS_SECRET_ACCESS_KEY': 'benchmark',
+    'AWS_STORAGE_BUCKET_NAME': 'benchmark',
+    'AWS_S3_REGION_NAME': 'us-east-005',
+    'AWS_S3_ENDPOINT_URL': 'https://s3.us-east-005.backblazeb2.com',
+}
+
+
+def default_storage_settings(backend):
+    storages = dict(settings.STORAGES)
+    storages['default'] = {'BACKEND': backend}
+    return storages
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare presigned URL generation through a resource FileField, with the previous "
+        "default storage (S3Boto3Storage) and the cached one (CachedUrlS3Storage)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--objects', type=int, default=100, help="Distinct object keys (rows of a resource page)")
+        parser.add_argument('--pages', type=int, default=5, help="How many times the page is listed")
+
+    def handle(self, *args, **options):
+        overrides = {
+            name: value for name, value in DUMMY_S3_SETTINGS.items()
+            if not getattr(settings, name, None)
+        }
+        with override_settings(**overrides):
+            self.run(options['objects'], options['pages'])
+
+    def run(self, objects, pages):
+        # Unsaved resources: their video_file is bound to the default storage
+        # exactly like rows loaded by the resource views
+        resources = [VideoResource(video_file=f"videos/benchmark_{index}.mp4") for index in range(objects)]
+
+        def list_page():
+            for resource in resources:
+                if resource.get_video_url() is None:
+                    raise Exception(f"No URL for {resource.video_file.name}")
+
+        with override_settings(STORAGES=default_storage_settings('storages.backends.s3boto3.S3Boto3Storage')):
+            self.measure("S3Boto3Storage (previous)", list_page, pages)
+
+        with override_settings(STORAGES=default_storage_settings('backend.storage_backends.CachedUrlS3Storage')):
+            # Start from a cold cache (both tiers)
+            storage = resources[0].video_file.storage
+            for resource in resources:
+                presigned_url_cache.delete(storage.bucket_name, storage.object_key(resource.video_file.name))
+            builds = storage_backends.client_builds
+            self.measure("CachedUrlS3Storage, cold", list_page, 1)
+            warm_builds = storage_backends.client_builds
+            self.measure("CachedUrlS3Storage, warm", list_page, pages)
+
+        self.stdout.write(
+            f"client builds while listing warm pages: {storage_backends.client_builds - warm_builds} "
+            f"(cold run: {warm_builds - builds})"
+        )
+        self.stdout.write(f"cache stats: {presigned_url_cache.stats()}")
+
+    def measure(self, label, func, pages):
+        start = time.perf_counter()
+        for _ in range(pages):
+            func()
+        elapsed = time.perf_counter() - start
+        per_page = elapsed / pages * 1000
+        self.stdout.write(self.style.SUCCESS(f"{label:<30} {per_page:9.2f} ms/page  ({elapsed:.3f}s total)"))
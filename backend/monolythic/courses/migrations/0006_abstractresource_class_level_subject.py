@@ -0,0 +1,40 @@
+# Generated by Django 5.1.12 on 2026-10-18 03:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_resource_path(apps, schema_editor):
+    AbstractResource = apps.get_model('courses', 'AbstractResource')
+    Topic = apps.get_model('courses', 'Topic')
+    topics = Topic.objects.filter(pk=models.OuterRef('topic_id'))
+    AbstractResource.objects.update(
+        subject_id=models.Subquery(topics.values('chapter__subject_id')[:1]),
+        class_level_id=models.Subquery(topics.values('chapter__subject__class_level_id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('courses', '0005_alter_teacherstudentenrollment_offer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='abstractresource',
+            name='class_level',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.class'),
+        ),
+        migrations.AddField(
+            model_name='abstractresource',
+            name='subject',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.subject'),
+        ),
+        migrations.AddIndex(
+            model_name='abstractresource',
+            index=models.Index(fields=['class_level', 'created_at'], name='courses_abs_class_l_a561e5_idx'),
+        ),
+        migrations.RunPython(backfill_resource_path, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.12 on 2026-10-18 04:04
+
+from django.db import migrations, models
+
+DAYS = ['lun', 'mar', 'mer', 'jeu', 'ven', 'sam', 'dim']
+TIME_SLOTS = ['matin', '13h-14h', '14h-15h', '15h-16h', '16h-17h', '17h-18h', '18h-19h', '19h-20h']
+BATCH_SIZE = 1000
+
+
+def pack_daily_slots(apps, schema_editor):
+    UserAvailability = apps.get_model('courses', 'UserAvailability')
+    DailyTimeSlot = apps.get_model('courses', 'DailyTimeSlot')
+    masks = {}
+    available_slots = DailyTimeSlot.objects.filter(is_available=True).values_list('availability_id', 'day', 'time_slot')
+    for availability_id, day, time_slot in available_slots.iterator(chunk_size=BATCH_SIZE):
+        if day in DAYS and time_slot in TIME_SLOTS:
+            index = DAYS.index(day) * len(TIME_SLOTS) + TIME_SLOTS.index(time_slot)
+            masks[availability_id] = masks.get(availability_id, 0) | 1 << index
+    UserAvailability.objects.bulk_update(
+        [UserAvailability(pk=pk, slots_mask=mask) for pk, mask in masks.items()],
+        ['slots_mask'],
+        batch_size=BATCH_SIZE
+    )
+
+
+def unpack_daily_slots(apps, schema_editor):
+    UserAvailability = apps.get_model('courses', 'UserAvailability')
+    DailyTimeSlot = apps.get_model('courses', 'DailyTimeSlot')
+    slots = (
+        DailyTimeSlot(
+            availability_id=pk,
+            day=day,
+            time_slot=time_slot,
+            is_available=bool(mask >> (day_index * len(TIME_SLOTS) + slot_index) & 1)
+        )
+        for pk, mask in UserAvailability.objects.values_list('pk', 'slots_mask').iterator(chunk_size=BATCH_SIZE)
+        for day_index, day in enumerate(DAYS)
+        for slot_index, time_slot in enumerate(TIME_SLOTS)
+    )
+    while True:
+        batch = [slot for _, slot in zip(range(BATCH_SIZE), slots)]
+        if not batch:
+            break
+        DailyTimeSlot.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_abstractresource_class_level_subject'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useravailability',
+            name='slots_mask',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(pack_daily_slots, unpack_daily_slots),
+        migrations.DeleteModel(
+            name='DailyTimeSlot',
+        ),
+    ]
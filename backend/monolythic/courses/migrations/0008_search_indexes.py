@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from utils.search import add_postgres_indexes, search_index, trigram_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_pack_availability_slots'),
+        # pg_trgm
+        ('users', '0006_search_indexes'),
+    ]
+
+    operations = [
+        # PostgreSQL only. The search index must match
+        # courses.filters.RESOURCE_SEARCH_FIELDS, the trigram one serves the
+        # title icontains filter of ResourceFilter.
+        add_postgres_indexes(
+            'courses', 'AbstractResource',
+            search_index('courses_resource_search_idx', {'title': 'A', 'description': 'B'}),
+            trigram_index('courses_resource_title_trgm_idx', 'title'),
+        ),
+    ]
@@ -214,8 +214,16 @@ class Topic(models.Model):
     def __str__(self):
         return f"{self.title} - {self.chapter}"
 
+# Reverse one-to-one accessors of the concrete resource types, used to load
+# every subclass in the same query (see AbstractResource.flat)
+RESOURCE_SUBCLASS_ACCESSORS = ["videoresource", "revisionresource", "pdfresource", "exerciseresource"]
+
 class AbstractResource(PolymorphicModel):
     topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name="%(class)s_resources")
+    # Denormalized topic -> chapter -> subject -> class path, kept in sync by save()
+    # and the Topic/Chapter/Subject signals in courses/signals.py
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, null=True, blank=True, editable=False, related_name="+")
+    class_level = models.ForeignKey(Class, on_delete=models.CASCADE, null=True, blank=True, editable=False, related_name="+", db_index=False)
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     slug = models.SlugField(unique=True, blank=True, null=True)
@@ -224,12 +232,44 @@ class AbstractResource(PolymorphicModel):
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["class_level", "created_at"]),
+        ]
         
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        if self.topic_id:
+            self.subject_id, self.class_level_id = Topic.objects.filter(pk=self.topic_id).values_list(
+                "chapter__subject_id", "chapter__subject__class_level_id"
+            ).first() or (None, None)
         super().save(*args, **kwargs)
 
+    @classmethod
+    def flat(cls, queryset=None):
+        """
+        Non polymorphic queryset joining every concrete resource table, so a
+        page of mixed resources is a single query instead of one per type.
+        Use get_concrete_resource() on the results.
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        return queryset.non_polymorphic().select_related(*RESOURCE_SUBCLASS_ACCESSORS)
+
+    def get_concrete_resource(self):
+        """Concrete subclass instance, already loaded when coming from flat()"""
+        if type(self) is not AbstractResource:
+            return self
+        from django.contrib.contenttypes.models import ContentType
+
+        model = ContentType.objects.get_for_id(self.polymorphic_ctype_id).model_class()
+        # django-polymorphic replaces the reverse accessors with a fresh query,
+        # so read the instance select_related put in the relation cache
+        child = self._state.fields_cache.get(model._meta.model_name)
+        if child is not None:
+            return child
+        return self.get_real_instance()
+
     def get_signed_url(self, field_name):
         """Get a presigned URL for any file field"""
         file_field = getattr(self, field_name)
@@ -275,40 +315,18 @@ class ExerciseResource(AbstractResource):
 
 class UserAvailability(models.Model):
     """
-    Base availability model for both teachers and students
+    Base availability model for both teachers and students.
+
+    The weekly time slots are packed in ``slots_mask``: the bit
+    ``day_index * len(TIME_SLOTS) + time_slot_index`` is set when the user is
+    available on that slot (see courses/availability.py).
     """
     
     USER_TYPE_CHOICES = (
         ('TEACHER', 'Teacher'),
         ('STUDENT', 'Student'),
     )
-    
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='availabilities')
-    user_type = models.CharField(max_length=10, choices=USER_TYPE_CHOICES)
-    is_available = models.BooleanField(default=True)
-    last_updated = models.DateTimeField(auto_now=True)
 
-    class Meta:
-        verbose_name = "User Availability"
-        verbose_name_plural = "User Availabilities"
-        unique_together = ['user', 'user_type']
-        
-    def __str__(self):
-        return f"{self.user.email} - {self.user_type} Availability"
-        
-    def create_default_slots(self):
-        """Create all time slots as available"""
-        for day, _ in DailyTimeSlot.DAYS_OF_WEEK:
-            for time_slot, _ in DailyTimeSlot.TIME_SLOTS:
-                DailyTimeSlot.objects.get_or_create(
-                    availability=self,
-                    day=day,
-                    time_slot=time_slot,
-                    defaults={'is_available': False}
-                )
-        
-
-class DailyTimeSlot(models.Model):
     DAYS_OF_WEEK = [
         ('lun', 'Lundi'),
         ('mar', 'Mardi'),
@@ -329,29 +347,22 @@ class DailyTimeSlot(models.Model):
         ('18h-19h', '18h-19h'),
         ('19h-20h', '19h-20h'),
     ]
-
-    availability = models.ForeignKey(
-        UserAvailability,
-        on_delete=models.CASCADE,
-        related_name='daily_slots'
-    )
-    day = models.CharField(
-        max_length=3,
-        choices=DAYS_OF_WEEK
-    )
-    time_slot = models.CharField(
-        max_length=10,
-        choices=TIME_SLOTS
-    )
-    is_available = models.BooleanField(default=False)
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='availabilities')
+    user_type = models.CharField(max_length=10, choices=USER_TYPE_CHOICES)
+    is_available = models.BooleanField(default=True)
+    # 7 days x 8 time slots, every slot starts unavailable
+    slots_mask = models.BigIntegerField(default=0)
+    last_updated = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ['availability', 'day', 'time_slot']
-        verbose_name = _("Daily Time Slot")
-        verbose_name_plural = _("Daily Time Slots")
-
+        verbose_name = "User Availability"
+        verbose_name_plural = "User Availabilities"
+        unique_together = ['user', 'user_type']
+        
     def __str__(self):
-        return f"{self.get_day_display()} {self.get_time_slot_display()}"
+        return f"{self.user.email} - {self.user_type} Availability"
+        
 
 class CourseOffering(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='offers')
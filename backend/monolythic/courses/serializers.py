@@ -1,5 +1,6 @@
 import datetime
 from rest_framework import serializers
+from drf_yasg.utils import swagger_serializer_method
 
 from .models import (
     CourseCategory,
@@ -15,7 +16,6 @@ from .models import (
     RevisionResource,
     Topic,
     UserAvailability,
-    DailyTimeSlot,
     CourseOffering,
     CourseOfferingAction,
     TeacherStudentEnrollment,
@@ -29,6 +29,7 @@ from .models import (
     LevelClassDefinition,
 )
 from users.serializers import UserSerializer
+from .availability import DAYS, TIME_SLOTS, SLOT_COUNT, slots_of
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -62,6 +63,11 @@ class ClassSerializer(serializers.ModelSerializer):
         return str(obj)  # Use the Class.__str__ method
         
     def get_student_count(self, obj):
+        # Annotated by ClassViewSet.get_queryset (or set by courses.hierarchy),
+        # only count here for instances that did not come from those
+        student_count = getattr(obj, 'student_count', None)
+        if student_count is not None:
+            return student_count
         from .models import UserClass
         school_year = self.context.get("school_year")
         queryset = UserClass.objects.filter(class_level=obj)
@@ -205,21 +211,34 @@ class PolymorphicResourceSerializer(serializers.ModelSerializer):
         return AbstractResourceSerializer(obj, context=self.context).data
 
 
-class DailyTimeSlotSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = DailyTimeSlot
-        fields = ["id", "day", "time_slot", "is_available"]
+class FlatResourceSerializer(PolymorphicResourceSerializer):
+    """
+    Same output as PolymorphicResourceSerializer for querysets built with
+    AbstractResource.flat(), where the concrete resource is already joined.
+    """
 
+    def get_resource(self, obj):
+        return super().get_resource(obj.get_concrete_resource())
 
-class DailyTimeSlotUpdateSerializer(serializers.ModelSerializer):
-    slot_id = serializers.PrimaryKeyRelatedField(
-        queryset=DailyTimeSlot.objects.all(), write_only=True, source="id"
-    )
+
+class DailyTimeSlotSerializer(serializers.Serializer):
+    """One slot of UserAvailability.slots_mask, its id is the bit index"""
+    id = serializers.IntegerField(read_only=True)
+    day = serializers.ChoiceField(choices=UserAvailability.DAYS_OF_WEEK)
+    time_slot = serializers.ChoiceField(choices=UserAvailability.TIME_SLOTS)
     is_available = serializers.BooleanField()
 
-    class Meta:
-        model = DailyTimeSlot
-        fields = ["slot_id", "is_available"]
+
+class DailyTimeSlotUpdateSerializer(serializers.Serializer):
+    slot_id = serializers.IntegerField(min_value=0, max_value=SLOT_COUNT - 1, required=False)
+    day = serializers.ChoiceField(choices=DAYS, required=False)
+    time_slot = serializers.ChoiceField(choices=TIME_SLOTS, required=False)
+    is_available = serializers.BooleanField()
+
+    def validate(self, attrs):
+        if 'slot_id' not in attrs and not ('day' in attrs and 'time_slot' in attrs):
+            raise serializers.ValidationError("slot_id or day and time_slot are required")
+        return attrs
 
 
 class UserAvailabilityCreateSerializer(serializers.ModelSerializer):
@@ -229,13 +248,32 @@ class UserAvailabilityCreateSerializer(serializers.ModelSerializer):
 
 
 class UserAvailabilitySerializer(serializers.ModelSerializer):
-    daily_slots = DailyTimeSlotSerializer(many=True, read_only=True)
+    daily_slots = serializers.SerializerMethodField()
     user = UserSerializer(read_only=True)
 
     class Meta:
         model = UserAvailability
         fields = "__all__"
-        read_only_fields = ["user", "user_type", "created_at", "last_updated"]
+        read_only_fields = ["user", "user_type", "slots_mask", "created_at", "last_updated"]
+
+    @swagger_serializer_method(serializer_or_field=DailyTimeSlotSerializer(many=True))
+    def get_daily_slots(self, obj):
+        return slots_of(obj.slots_mask)
+
+
+class AvailableTeacherSerializer(serializers.ModelSerializer):
+    """A teacher availability matched with a course offering"""
+    user = UserSerializer(read_only=True)
+    common_slots = serializers.IntegerField(read_only=True)
+    common_daily_slots = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserAvailability
+        fields = ["id", "user", "user_type", "common_slots", "common_daily_slots", "last_updated"]
+
+    @swagger_serializer_method(serializer_or_field=DailyTimeSlotSerializer(many=True))
+    def get_common_daily_slots(self, obj):
+        return [slot for slot in slots_of(obj.common_mask) if slot['is_available']]
 
 
 class CourseOfferingSerializer(serializers.ModelSerializer):
@@ -560,6 +598,11 @@ class ClassDetailSerializer(serializers.ModelSerializer):
         return str(obj)  # Use the Class.__str__ method
 
     def get_student_count(self, obj):
+        # Annotated by ClassViewSet.get_queryset (or set by courses.hierarchy),
+        # only count here for instances that did not come from those
+        student_count = getattr(obj, 'student_count', None)
+        if student_count is not None:
+            return student_count
         from .models import UserClass
         school_year = self.context.get("school_year")
         queryset = UserClass.objects.filter(class_level=obj)
@@ -1,19 +1,14 @@
 from django.db.models.signals import post_save,post_delete
 from django.dispatch import receiver
-from .models import SchoolYear, UserAvailability,Class,Subject,UserClass,CourseOfferingAction,TeacherStudentEnrollment, Section, EducationLevel, LevelClassDefinition, Speciality
+from .models import SchoolYear, Class,Subject,Chapter,Topic,AbstractResource,UserClass,CourseOfferingAction,TeacherStudentEnrollment, Section, EducationLevel, LevelClassDefinition, Speciality
 from django.core.cache import cache
+from .hierarchy import invalidate_class_hierarchy
 from django.contrib.auth import get_user_model
 import logging
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
-@receiver(post_save, sender=UserAvailability)
-def create_time_slots(sender, instance:UserAvailability, created, **kwargs):
-    """Signal to create time slots when availability is created"""
-    if created and instance.is_available:
-        instance.create_default_slots()
-
 # invalidate caches when ever we add or remove a  class,subject
 @receiver([post_save,post_delete],sender=Class)
 def invalidate_class_cache(sender,instance,**kwargs):
@@ -24,6 +19,20 @@ def invalidate_class_cache(sender,instance,**kwargs):
     
     # TODO
     cache.delete_pattern('*class_list*')
+    invalidate_class_hierarchy()
+
+# the formatted class hierarchy embeds sections, levels, definitions and specialities
+@receiver([post_save,post_delete],sender=Section)
+@receiver([post_save,post_delete],sender=EducationLevel)
+@receiver([post_save,post_delete],sender=LevelClassDefinition)
+@receiver([post_save,post_delete],sender=Speciality)
+def invalidate_class_hierarchy_cache(sender,instance,**kwargs):
+    invalidate_class_hierarchy()
+
+# student counts in the hierarchy are per school year
+@receiver([post_save,post_delete],sender=UserClass)
+def invalidate_class_hierarchy_student_count(sender,instance,**kwargs):
+    invalidate_class_hierarchy(instance.school_year)
     
 @receiver([post_save,post_delete],sender=Subject)
 def invalidate_subjects_cache(sender,instance,**kwargs):
@@ -35,6 +44,36 @@ def invalidate_subjects_cache(sender,instance,**kwargs):
     # TODO
     cache.delete_pattern('*class_list*')
     
+# keep the denormalized subject/class_level of resources in sync when their
+# topic, chapter or subject is moved
+@receiver(post_save, sender=Topic)
+def sync_topic_resources_path(sender, instance, created, **kwargs):
+    if created:
+        return
+    path = Chapter.objects.filter(pk=instance.chapter_id).values_list('subject_id', 'subject__class_level_id').first()
+    if path:
+        subject_id, class_level_id = path
+        AbstractResource.objects.filter(topic=instance).exclude(
+            subject_id=subject_id, class_level_id=class_level_id
+        ).update(subject_id=subject_id, class_level_id=class_level_id)
+
+@receiver(post_save, sender=Chapter)
+def sync_chapter_resources_path(sender, instance, created, **kwargs):
+    if created:
+        return
+    class_level_id = Subject.objects.filter(pk=instance.subject_id).values_list('class_level_id', flat=True).first()
+    AbstractResource.objects.filter(topic__chapter=instance).exclude(
+        subject_id=instance.subject_id, class_level_id=class_level_id
+    ).update(subject_id=instance.subject_id, class_level_id=class_level_id)
+
+@receiver(post_save, sender=Subject)
+def sync_subject_resources_path(sender, instance, created, **kwargs):
+    if created:
+        return
+    AbstractResource.objects.filter(subject=instance).exclude(
+        class_level_id=instance.class_level_id
+    ).update(class_level_id=instance.class_level_id)
+
 # create a user class when a user is created and put the user in the correct class
 @receiver(post_save, sender=User)
 def create_user_class(sender, instance, created, **kwargs):
@@ -1,3 +1,220 @@
-from django.test import TestCase
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from . import availability
+from .availability import (
+    SLOT_COUNT, find_available_teachers, mask_of, set_time_slot, slot_bit, slot_index, slots_of
+)
+from .models import (
+    Class, CourseOffering, EducationLevel, LevelClassDefinition, SchoolYear, Section, UserAvailability, UserClass
+)
+from users.models import User
+
+
+class ClassListQueryCountTest(TestCase):
+    """Listing classes must not run one student COUNT per class"""
+
+    @classmethod
+    def setUpTestData(cls):
+        section = Section.objects.create(code=Section.FRANCOPHONE, label="Francophone")
+        cls.level = EducationLevel.objects.create(code=EducationLevel.COLLEGE, label="College", section=section)
+        cls.school_year = SchoolYear.objects.create(start_year=2023, end_year=2024)
+        cls.other_year = SchoolYear.objects.create(start_year=2024, end_year=2025)
+        cls.first_class = cls.create_class("6eme")
+        cls.student = User.objects.create_user(
+            email="student@example.com",
+            password="password",
+            first_name="Student",
+            last_name="One",
+            phone_number="+237650000001",
+            is_staff=True,
+        )
+        UserClass.objects.create(user=cls.student, class_level=cls.first_class, school_year=cls.school_year)
+        UserClass.objects.create(user=cls.student, class_level=cls.first_class, school_year=cls.other_year)
+
+    @classmethod
+    def create_class(cls, name):
+        definition = LevelClassDefinition.objects.create(education_level=cls.level, name=name)
+        return Class.objects.create(definition=definition)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def count_list_queries(self, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get("/api/classes/", params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.json()
+
+    def test_query_count_does_not_grow_with_classes(self):
+        few_queries, _ = self.count_list_queries()
+        for index in range(10):
+            self.create_class(f"Class {index}")
+        many_queries, data = self.count_list_queries()
+        self.assertEqual(len(data), 11)
+        self.assertEqual(few_queries, many_queries)
+
+    def test_query_count_with_school_year(self):
+        for index in range(10):
+            self.create_class(f"Class {index}")
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/classes/", {"school_year": "2023-2024"})
+        counts = {item["id"]: item["student_count"] for item in response.json()}
+        self.assertEqual(counts[self.first_class.id], 1)
+
+    def test_student_count_without_school_year(self):
+        response = self.client.get(f"/api/classes/{self.first_class.id}/")
+        self.assertEqual(response.json()["student_count"], 2)
+
+
+def create_user(number, **extra_fields):
+    return User.objects.create_user(
+        email=f"user{number}@example.com",
+        password="password",
+        first_name="User",
+        last_name=str(number),
+        phone_number=f"+2376500001{number:02d}",
+        is_staff=True,
+        **extra_fields
+    )
+
+
+class AvailabilityMaskTest(TestCase):
+    """Weekly slots packed in UserAvailability.slots_mask"""
+
+    def test_slot_index_bounds(self):
+        self.assertEqual(slot_index('lun', 'matin'), 0)
+        self.assertEqual(slot_index('lun', '13h-14h'), 1)
+        self.assertEqual(slot_index('mar', 'matin'), len(availability.TIME_SLOTS))
+        self.assertEqual(slot_index('dim', '19h-20h'), SLOT_COUNT - 1)
+        # Every slot fits in the BigIntegerField
+        self.assertLess(1 << (SLOT_COUNT - 1), 2 ** 63)
+        with self.assertRaises(ValueError):
+            slot_index('lundi', 'matin')
+        with self.assertRaises(ValueError):
+            slot_index('lun', '20h-21h')
+        with self.assertRaises(ValueError):
+            slot_bit(SLOT_COUNT)
+        with self.assertRaises(ValueError):
+            slot_bit(-1)
+
+    def test_mask_round_trip(self):
+        slots = {('lun', 'matin'), ('mer', '15h-16h'), ('dim', '19h-20h')}
+        mask = mask_of(slots)
+
+        week = slots_of(mask)
+        self.assertEqual(len(week), SLOT_COUNT)
+        self.assertEqual([slot['id'] for slot in week], list(range(SLOT_COUNT)))
+        available = {(slot['day'], slot['time_slot']) for slot in week if slot['is_available']}
+        self.assertEqual(available, slots)
+        for slot in week:
+            self.assertEqual(slot['id'], slot_index(slot['day'], slot['time_slot']))
+        self.assertEqual(mask_of(available), mask)
+
+    def test_set_time_slot_on_and_off(self):
+        user = create_user(0)
+        user_availability = UserAvailability.objects.create(
+            user=user, user_type='TEACHER', slots_mask=mask_of([('lun', 'matin')])
+        )
+        index = slot_index('ven', '17h-18h')
+
+        self.assertEqual(set_time_slot(user_availability.pk, index, True), 1)
+        user_availability.refresh_from_db()
+        self.assertEqual(user_availability.slots_mask, mask_of([('lun', 'matin'), ('ven', '17h-18h')]))
+
+        # Switching it on again changes nothing
+        set_time_slot(user_availability.pk, index, True)
+        user_availability.refresh_from_db()
+        self.assertEqual(user_availability.slots_mask, mask_of([('lun', 'matin'), ('ven', '17h-18h')]))
+
+        set_time_slot(user_availability.pk, index, False)
+        user_availability.refresh_from_db()
+        self.assertEqual(user_availability.slots_mask, mask_of([('lun', 'matin')]))
+
+        with self.assertRaises(ValueError):
+            set_time_slot(user_availability.pk, SLOT_COUNT, True)
+
+    def test_find_available_teachers(self):
+        student = create_user(0)
+        UserAvailability.objects.create(
+            user=student, user_type='TEACHER',
+            slots_mask=mask_of([('lun', 'matin'), ('mar', 'matin'), ('mer', 'matin')])
+        )
+        one_slot = UserAvailability.objects.create(
+            user=create_user(1), user_type='TEACHER', slots_mask=mask_of([('lun', 'matin'), ('sam', 'matin')])
+        )
+        three_slots = UserAvailability.objects.create(
+            user=create_user(2), user_type='TEACHER',
+            slots_mask=mask_of([('lun', 'matin'), ('mar', 'matin'), ('mer', 'matin')])
+        )
+        two_slots = UserAvailability.objects.create(
+            user=create_user(3), user_type='TEACHER', slots_mask=mask_of([('mar', 'matin'), ('mer', 'matin')])
+        )
+        # No common slot, unavailable, or not a teacher
+        UserAvailability.objects.create(user=create_user(4), user_type='TEACHER', slots_mask=mask_of([('dim', 'matin')]))
+        UserAvailability.objects.create(
+            user=create_user(5), user_type='TEACHER', is_available=False, slots_mask=mask_of([('lun', 'matin')])
+        )
+        UserAvailability.objects.create(user=create_user(6), user_type='STUDENT', slots_mask=mask_of([('lun', 'matin')]))
+        offer = CourseOffering(student=student)
+
+        teachers = find_available_teachers(offer)
+        # The student's own (teacher) availability is never matched
+        self.assertEqual([teacher.pk for teacher in teachers], [three_slots.pk, two_slots.pk, one_slot.pk])
+        self.assertEqual([teacher.common_slots for teacher in teachers], [3, 2, 1])
+        self.assertEqual(teachers[1].common_mask, mask_of([('mar', 'matin'), ('mer', 'matin')]))
+
+        teachers = find_available_teachers(offer, min_common_slots=2)
+        self.assertEqual([teacher.pk for teacher in teachers], [three_slots.pk, two_slots.pk])
+
+        self.assertEqual(find_available_teachers(CourseOffering(student=create_user(7))), [])
+
+
+class PackAvailabilitySlotsMigrationTest(TransactionTestCase):
+    """0007 packs the DailyTimeSlot rows into slots_mask, and unpacks them back"""
+
+    before = [('courses', '0006_abstractresource_class_level_subject')]
+    after = [('courses', '0007_pack_availability_slots')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_pack_and_unpack(self):
+        apps = self.migrate(self.before)
+        HistoricalAvailability = apps.get_model('courses', 'UserAvailability')
+        DailyTimeSlot = apps.get_model('courses', 'DailyTimeSlot')
+        # Only the courses migrations are unapplied, the users table is current
+        user = create_user(0)
+        packed = HistoricalAvailability.objects.create(user_id=user.pk, user_type='TEACHER')
+        empty = HistoricalAvailability.objects.create(user_id=user.pk, user_type='STUDENT')
+        slots = [('lun', 'matin'), ('jeu', '16h-17h'), ('dim', '19h-20h')]
+        DailyTimeSlot.objects.bulk_create(
+            [DailyTimeSlot(availability=packed, day=day, time_slot=time_slot, is_available=True) for day, time_slot in slots]
+            + [DailyTimeSlot(availability=packed, day='mar', time_slot='matin', is_available=False)]
+            + [DailyTimeSlot(availability=empty, day='mer', time_slot='matin', is_available=False)]
+        )
+
+        apps = self.migrate(self.after)
+        HistoricalAvailability = apps.get_model('courses', 'UserAvailability')
+        masks = dict(HistoricalAvailability.objects.values_list('pk', 'slots_mask'))
+        self.assertEqual(masks, {packed.pk: mask_of(slots), empty.pk: 0})
+
+        apps = self.migrate(self.before)
+        DailyTimeSlot = apps.get_model('courses', 'DailyTimeSlot')
+        # Every slot of the week is back, available or not
+        self.assertEqual(DailyTimeSlot.objects.filter(availability_id=packed.pk).count(), SLOT_COUNT)
+        self.assertEqual(DailyTimeSlot.objects.filter(availability_id=empty.pk).count(), SLOT_COUNT)
+        available = set(
+            DailyTimeSlot.objects.filter(is_available=True).values_list('availability_id', 'day', 'time_slot')
+        )
+        self.assertEqual(available, {(packed.pk, day, time_slot) for day, time_slot in slots})
@@ -7,7 +7,7 @@ from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from .models import (
     CourseCategory, Class, SchoolYear, Subject, Chapter, Topic,
-    AbstractResource, UserProgress,UserAvailability,DailyTimeSlot,
+    AbstractResource, UserProgress,UserAvailability,
     CourseOffering, CourseOfferingAction, TeacherStudentEnrollment, CourseDeclaration,
     # QuizResource, Question, QuestionOption, QuizAttempt, QuestionResponse,
     VideoResource, RevisionResource, PDFResource, ExerciseResource, UserClass,
@@ -15,16 +15,18 @@ from .models import (
 )
 from .serializers import (
     CourseCategorySerializer, ClassSerializer, PaymentProofSerializer, SchoolYearSerializer, SubjectSerializer,
-    ChapterSerializer, TopicSerializer, PolymorphicResourceSerializer, UserAvailabilityCreateSerializer,
+    ChapterSerializer, TopicSerializer, PolymorphicResourceSerializer, FlatResourceSerializer, UserAvailabilityCreateSerializer,
     UserProgressSerializer,UserAvailabilitySerializer,
     CourseOfferingSerializer, CourseOfferingActionSerializer,
-    TeacherStudentEnrollmentSerializer, CourseDeclarationSerializer,DailyTimeSlotSerializer,DailyTimeSlotUpdateSerializer,
+    TeacherStudentEnrollmentSerializer, CourseDeclarationSerializer,DailyTimeSlotUpdateSerializer,AvailableTeacherSerializer,
     VideoResourceSerializer, RevisionResourceSerializer, PDFResourceSerializer, ExerciseResourceSerializer,
     EnhancedTeacherEnrollmentSerializer, UserClassSerializer,
     SectionSerializer, EducationLevelSerializer, SpecialitySerializer, LevelClassDefinitionSerializer,
     SectionDetailSerializer
 )
 from .pagination import CustomPagination
+from .hierarchy import get_class_hierarchy
+from .availability import find_available_teachers, set_time_slot, slot_index
 from .filters import (
     CourseCategoryFilter, ClassFilter, EducationLevelFilter,SpecialityFilter,LevelClassDefinitionFilter, SectionFilter, SubjectFilter,
     ChapterFilter, TopicFilter, ResourceFilter, UserProgressFilter,
@@ -32,6 +34,8 @@ from .filters import (
     TeacherStudentEnrollmentFilter, CourseDeclarationFilter, UserClassFilter
 )
 from django.utils.decorators import method_decorator
+from django.db.models import Count, Q
+from django.contrib.contenttypes.models import ContentType
 # from django.views.decorators.cache import cache_page
 from rest_framework import serializers
 from utils.mixins import ActivityLoggingMixin
@@ -136,20 +140,34 @@ class ClassViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_class = ClassFilter
     
+    def get_school_year(self):
+        """School year from the ?school_year=YYYY-YYYY parameter, looked up once per request"""
+        if not hasattr(self, '_school_year'):
+            self._school_year = None
+            school_year_param = self.request.query_params.get('school_year')
+            if school_year_param:
+                try:
+                    start_year, end_year = school_year_param.split('-')
+                    self._school_year = SchoolYear.objects.filter(
+                        start_year=start_year,
+                        end_year=end_year
+                    ).first()
+                except (ValueError, SchoolYear.DoesNotExist):
+                    pass
+        return self._school_year
+
+    def get_queryset(self):
+        queryset = super().get_queryset().select_related('definition')
+        # Count students in the same query instead of once per class in ClassSerializer
+        school_year = self.get_school_year()
+        student_filter = Q(userclass__school_year=school_year) if school_year else None
+        return queryset.annotate(student_count=Count('userclass', filter=student_filter))
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
-        school_year_param = self.request.query_params.get('school_year')
-        if school_year_param:
-            try:
-                start_year, end_year = school_year_param.split('-')
-                school_year = SchoolYear.objects.filter(
-                    start_year=start_year,
-                    end_year=end_year
-                ).first()
-                if school_year:
-                    context['school_year'] = school_year
-            except (ValueError, SchoolYear.DoesNotExist):
-                pass
+        school_year = self.get_school_year()
+        if school_year:
+            context['school_year'] = school_year
         return context
     
     @swagger_auto_schema(
@@ -309,87 +327,10 @@ class ClassViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
         This endpoint has been updated to work with the new Class model structure
         and includes education level IDs for frontend use.
         """
-        # Get all classes, excluding any with a professional education level if needed
-        queryset = self.get_queryset()
-        # Try to filter out professional classes if they exist
-        try:
-            professional_levels = EducationLevel.objects.filter(code__contains='PROFESSIONAL')
-            if professional_levels.exists():
-                queryset = queryset.exclude(definition__education_level__in=professional_levels)
-        except Exception as e:
-            # If filtering fails, just use all classes
-            pass
-        
-        formatted_data = {}
-        context = self.get_serializer_context()
-
-        for class_obj in queryset:
-            # Extract the section and level from the class's definition
-            if not hasattr(class_obj, 'definition') or not class_obj.definition:
-                continue
-                
-            definition = class_obj.definition
-            if not hasattr(definition, 'education_level') or not definition.education_level:
-                continue
-                
-            education_level = definition.education_level
-            if not hasattr(education_level, 'section') or not education_level.section:
-                continue
-                
-            section = education_level.section
-            section_code = section.code
-            level_code = education_level.code
-
-            # Initialize the section in the formatted data if it doesn't exist
-            if section_code not in formatted_data:
-                formatted_data[section_code] = {
-                    'id': section.id,
-                    'code': section.code,
-                    'label': section.label,
-                    'levels': {}
-                }
-
-            # Initialize the education level in the section if it doesn't exist
-            if level_code not in formatted_data[section_code]['levels']:
-                formatted_data[section_code]['levels'][level_code] = {
-                    'id': education_level.id,  # Include the education level ID
-                    'code': education_level.code,
-                    'label': education_level.label,
-                    'groups': {}  # Store class groupings (by speciality, university level, or generic classes)
-                }
-
-            # Handle different education levels
-            if 'LYCEE' in level_code:
-                # For lycee level, organize by speciality
-                speciality = definition.speciality
-                speciality_code = speciality.code if speciality else 'NO_SPECIALITY'
-                
-                if speciality_code not in formatted_data[section_code]['levels'][level_code]['groups']:
-                    formatted_data[section_code]['levels'][level_code]['groups'][speciality_code] = []
-                    
-                formatted_data[section_code]['levels'][level_code]['groups'][speciality_code].append(
-                    ClassSerializer(class_obj, context=context).data
-                )
-                
-            elif 'UNIVERSITY' in level_code:
-                # For university level, organize by description (e.g., licence, master)
-                univ_level = class_obj.description or 'OTHER'
-                
-                if univ_level not in formatted_data[section_code]['levels'][level_code]['groups']:
-                    formatted_data[section_code]['levels'][level_code]['groups'][univ_level] = []
-                    
-                formatted_data[section_code]['levels'][level_code]['groups'][univ_level].append(
-                    ClassSerializer(class_obj, context=context).data
-                )
-                
-            else:
-                # For other levels (college), organize under 'classes'
-                if 'classes' not in formatted_data[section_code]['levels'][level_code]['groups']:
-                    formatted_data[section_code]['levels'][level_code]['groups']['classes'] = []
-                    
-                formatted_data[section_code]['levels'][level_code]['groups']['classes'].append(
-                    ClassSerializer(class_obj, context=context).data
-                )
+        # The whole tree is built from a couple of queries and cached per school year,
+        # see courses.hierarchy for the invalidation rules
+        school_year = self.get_serializer_context().get('school_year')
+        formatted_data = get_class_hierarchy(school_year)
 
         return Response(formatted_data)
     
@@ -425,27 +366,21 @@ class ClassViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
         """Get all resources associated with a specific class except videos."""
         class_obj = self.get_object()
         
-        # Get all subjects for this class
-        subjects = Subject.objects.filter(class_level=class_obj)
-        
-        # Get all chapters for these subjects
-        chapters = Chapter.objects.filter(subject__in=subjects)
-        
-        # Get all topics for these chapters
-        topics = Topic.objects.filter(chapter__in=chapters)
-        
-        # Get all resources for these topics except videos
-        resources = AbstractResource.objects.filter(topic__in=topics).exclude(
-            polymorphic_ctype__model='videoresource'
+        # Resources carry their class directly, and flat() joins every concrete
+        # resource type so the whole page is a single indexed query
+        resources = AbstractResource.flat(
+            AbstractResource.objects.filter(class_level=class_obj).exclude(
+                polymorphic_ctype=ContentType.objects.get_for_model(VideoResource)
+            )
         )
         
         # Paginate the results
         page = self.paginate_queryset(resources)
         if page is not None:
-            serializer = PolymorphicResourceSerializer(page, many=True, context={'request': request})
+            serializer = FlatResourceSerializer(page, many=True, context={'request': request})
             return self.get_paginated_response(serializer.data)
             
-        serializer = PolymorphicResourceSerializer(resources, many=True, context={'request': request})
+        serializer = FlatResourceSerializer(resources, many=True, context={'request': request})
         return Response(serializer.data)
     
     @swagger_auto_schema(
@@ -458,17 +393,8 @@ class ClassViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
         """Get all video resources associated with a specific class."""
         class_obj = self.get_object()
         
-        # Get all subjects for this class
-        subjects = Subject.objects.filter(class_level=class_obj)
-        
-        # Get all chapters for these subjects
-        chapters = Chapter.objects.filter(subject__in=subjects)
-        
-        # Get all topics for these chapters
-        topics = Topic.objects.filter(chapter__in=chapters)
-        
-        # Get all video resources for these topics
-        videos = VideoResource.objects.filter(topic__in=topics)
+        # Get all video resources of this class through the denormalized class_level
+        videos = VideoResource.objects.filter(class_level=class_obj)
         
         # Paginate the results
         page = self.paginate_queryset(videos)
@@ -787,19 +713,15 @@ class UserAvailabilityViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
     @action(detail=True, methods=['patch'],url_path='update-time-slot')
     def update_time_slot(self, request, pk=None):
         availability = self.get_object()
-        slot_id = request.data.get('slot_id')
-        is_available = request.data.get('is_available')
-        
-        if slot_id is None or is_available is None:
-            return Response({'error': 'Invalid data provided'}, status=400)
+        serializer = DailyTimeSlotUpdateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({'error': 'Invalid data provided', 'details': serializer.errors}, status=400)
 
+        data = serializer.validated_data
+        index = data['slot_id'] if 'slot_id' in data else slot_index(data['day'], data['time_slot'])
         try:
-            slot = DailyTimeSlot.objects.get(id=slot_id, availability=availability)
-            slot.is_available = is_available
-            slot.save()
+            set_time_slot(availability.pk, index, data['is_available'])
             return Response({'status': 'Time slot updated successfully'})
-        except DailyTimeSlot.DoesNotExist:
-            return Response({'error': 'Time slot not found'}, status=404)
         except Exception as e:
             return Response({'error': f'An error occurred: {str(e)}'}, status=500)
     
@@ -877,6 +799,27 @@ class CourseOfferingViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @swagger_auto_schema(
+        method='get',
+        manual_parameters=[
+            openapi.Parameter('min_common_slots', openapi.IN_QUERY, description="Minimum number of weekly slots shared with the student", type=openapi.TYPE_INTEGER, required=False),
+        ],
+        responses={200: AvailableTeacherSerializer(many=True)},
+        operation_description="Teachers whose weekly availability overlaps the student's, most common slots first"
+    )
+    @action(detail=True, methods=['get'], url_path='available-teachers')
+    def available_teachers(self, request, pk=None):
+        offer = self.get_object()
+        if not (request.user.is_staff or offer.student_id == request.user.id):
+            return Response({'error': 'You do not have permission to view the teachers of this offer'}, status=403)
+        try:
+            min_common_slots = max(1, int(request.query_params.get('min_common_slots', 1)))
+        except ValueError:
+            return Response({'error': 'min_common_slots must be an integer'}, status=400)
+        self.log_activity(request, "Viewed available teachers", {"offering_id": offer.id})
+        teachers = find_available_teachers(offer, min_common_slots)
+        return Response(AvailableTeacherSerializer(teachers, many=True).data)
+
 class CourseOfferingActionViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing course offering actions.
@@ -1,12 +1,31 @@
 import json
+import logging
+import uuid
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
-from asgiref.sync import async_to_sync
+
+from notifications.fanout import send_events
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+async def group_send_many(channel_layer, events):
+    """
+    Send (group, event) pairs from the event loop through the notifications
+    fan-out: the sends overlap, and a failed send is logged instead of raised
+    (the room event may already be out when a notification group fails).
+    """
+    failed = await send_events(channel_layer, events)
+    if failed:
+        logger.warning(f"{failed} of {len(events)} forum events could not be sent")
+
 
 class PublicChatConsumer(AsyncWebsocketConsumer):
+    # Id of the public forum, looked up once per connection
+    forum_id = None
+
     async def connect(self):
         self.room_group_name = "public_chat"
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
@@ -16,30 +35,14 @@ class PublicChatConsumer(AsyncWebsocketConsumer):
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
     
     @database_sync_to_async
-    def get_public_forum(self):
+    def get_public_forum_id(self):
         from forum.models import Forum
         forum, _ = Forum.objects.get_or_create(name="Public Forum")
-        return forum
-
-    @database_sync_to_async
-    def store_post(self, forum, sender, content, image=None, file=None):
-        from forum.models import Post
-        return Post.objects.create(
-            forum=forum, 
-            sender=sender, 
-            content=content,
-            image=image,
-            file=file
-        )
-
-    @database_sync_to_async
-    def serialize_post(self, post):
-        from forum.serializers import PostSerializer
-        from rest_framework.renderers import JSONRenderer
-        serializer = PostSerializer(post)
-        return json.loads(JSONRenderer().render(serializer.data).decode('utf-8'))
+        return forum.id
 
     async def receive(self, text_data):
+        from forum.writer import chat_post_payload, get_post_writer, new_chat_post
+
         data = json.loads(text_data)
         message_type = data.get('type', 'message')
         user = self.scope.get("user")
@@ -51,28 +54,39 @@ class PublicChatConsumer(AsyncWebsocketConsumer):
             }))
             return
             
-        forum = await self.get_public_forum()
+        if self.forum_id is None:
+            self.forum_id = await self.get_public_forum_id()
         
         if message_type == 'message':
-            content = data.get('message', '')
-            image = data.get('image')
-            file = data.get('file')
-            
-            # Store post in the database
-            post = await self.store_post(forum, user, content, image, file)
-            
-            # Serialize the post to include all necessary data
-            post_data = await self.serialize_post(post)
+            writer = get_post_writer()
+            if writer.is_full():
+                await self.send(text_data=json.dumps({
+                    'type': 'error',
+                    'message': 'The chat is busy, please try again'
+                }))
+                return
+
+            post = new_chat_post(
+                self.forum_id,
+                user,
+                data.get('message', ''),
+                image=data.get('image'),
+                file=data.get('file')
+            )
+            client_id = str(uuid.uuid4())
             
-            # Send post to the group
+            # Send post to the group right away, its id follows in a posts_saved event
             await self.channel_layer.group_send(
                 self.room_group_name,
                 {
                     'type': 'chat_post',
-                    'post': post_data,
+                    'post': chat_post_payload(post, client_id),
                     'user_id': str(user.id)
                 }
             )
+
+            # Stored by the batched writer of this process
+            writer.submit(post, client_id, self.channel_layer, self.room_group_name)
         elif message_type == 'reaction':
             # Handle reactions
             post_id = data.get('post_id')
@@ -96,6 +110,19 @@ class PublicChatConsumer(AsyncWebsocketConsumer):
             'user_id': event['user_id']
         }))
         
+    async def chat_posts_saved(self, event):
+        # Ids of posts broadcast before they were written, by client_id
+        await self.send(text_data=json.dumps({
+            'type': 'posts_saved',
+            'posts': event['posts']
+        }))
+
+    async def chat_posts_failed(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'posts_failed',
+            'posts': event['posts']
+        }))
+        
     async def chat_message(self, event):
         # For backward compatibility
         await self.send(text_data=json.dumps({
@@ -104,116 +131,113 @@ class PublicChatConsumer(AsyncWebsocketConsumer):
             'username': event['username'],
         }))
     
+    async def handle_reaction(self, user, post_id, reaction_type):
+        events = await self.save_reaction(user, post_id, reaction_type)
+        if events:
+            await group_send_many(self.channel_layer, events)
+
     @database_sync_to_async
-    def handle_reaction(self, user, post_id, reaction_type):
+    def save_reaction(self, user, post_id, reaction_type):
+        """DB phase of a reaction, returns the (group, event) pairs to send or None"""
         from forum.models import Post, Reaction, Notification
+        from forum import trending
         
         try:
             post = Post.objects.get(id=post_id)
-            # Create or update reaction
-            reaction, created = Reaction.objects.update_or_create(
+        except Post.DoesNotExist:
+            return None
+
+        # Create or update reaction
+        reaction, created = Reaction.objects.update_or_create(
+            post=post,
+            user=user,
+            defaults={'reaction_type': reaction_type}
+        )
+        if created:
+            trending.record_reaction(post, reaction)
+
+        events = []
+        # Create notification for post owner if not the same user
+        if created and post.sender_id != user.id:
+            notification = Notification.objects.create(
+                recipient_id=post.sender_id,
+                sender=user,
                 post=post,
-                user=user,
-                defaults={'reaction_type': reaction_type}
+                notification_type='REACTION'
             )
-            
-            # Create notification for post owner if not the same user
-            if created and post.sender != user:
-                notification = Notification.objects.create(
-                    recipient=post.sender,
-                    sender=user,
-                    post=post,
-                    notification_type='REACTION'
-                )
-                
-                # Notify the recipient via WebSocket
-                async_to_sync(self.channel_layer.group_send)(
-                    f"notifications_{post.sender.id}",
-                    {
-                        'type': 'notification',
-                        'notification_id': notification.id,
-                        'message': f"{user.first_name} {user.last_name} reacted to your post"
-                    }
-                )
-                
-            # Notify room about the reaction
-            serialized_reaction = {
+            events.append((f"notifications_{post.sender_id}", {
+                'type': 'notification',
+                'notification_id': notification.id,
+                'message': f"{user.first_name} {user.last_name} reacted to your post"
+            }))
+
+        # Notify room about the reaction
+        events.append((self.room_group_name, {
+            'type': 'post_reaction',
+            'reaction': {
                 'id': reaction.id,
                 'post_id': post.id,
                 'user_id': str(user.id),
                 'user_name': f"{user.first_name} {user.last_name}",
                 'reaction_type': reaction.reaction_type
             }
-            
-            async_to_sync(self.channel_layer.group_send)(
-                self.room_group_name,
-                {
-                    'type': 'post_reaction',
-                    'reaction': serialized_reaction
-                }
-            )
-            
-            return reaction
-        except Post.DoesNotExist:
-            return None
+        }))
+        return events
     
+    async def handle_comment(self, user, post_id, content):
+        events = await self.save_comment(user, post_id, content)
+        if events:
+            await group_send_many(self.channel_layer, events)
+
     @database_sync_to_async
-    def handle_comment(self, user, post_id, content):
+    def save_comment(self, user, post_id, content):
+        """DB phase of a comment, returns the (group, event) pairs to send or None"""
         from forum.models import Post, Notification
+        from forum import trending
+        from forum.serializers import CommentSerializer
+        from rest_framework.renderers import JSONRenderer
         
         try:
             parent_post = Post.objects.get(id=post_id)
+        except Post.DoesNotExist:
+            return None
+
+        # Create comment as a Post with parent
+        comment = Post.objects.create(
+            sender=user,
+            parent=parent_post,
+            forum_id=parent_post.forum_id,
+            content=content
+        )
+        trending.record_comment(parent_post, comment)
+
+        events = []
+        # Create notification
+        if parent_post.sender_id != user.id:
+            notification_type = 'COMMENT'
+            if parent_post.parent_id:  # This is a reply to a comment
+                notification_type = 'REPLY'
             
-            # Create comment as a Post with parent
-            comment = Post.objects.create(
+            notification = Notification.objects.create(
+                recipient_id=parent_post.sender_id,
                 sender=user,
-                parent=parent_post,
-                forum=parent_post.forum,
-                content=content
+                post=comment,
+                notification_type=notification_type
             )
-            
-            # Create notification
-            if parent_post.sender != user:
-                notification_type = 'COMMENT'
-                if parent_post.parent:  # This is a reply to a comment
-                    notification_type = 'REPLY'
-                
-                notification = Notification.objects.create(
-                    recipient=parent_post.sender,
-                    sender=user,
-                    post=comment,
-                    notification_type=notification_type
-                )
-                
-                # Notify the recipient via WebSocket
-                async_to_sync(self.channel_layer.group_send)(
-                    f"notifications_{parent_post.sender.id}",
-                    {
-                        'type': 'notification',
-                        'notification_id': notification.id,
-                        'message': f"{user.first_name} {user.last_name} commented on your post"
-                    }
-                )
-            
-            # Serialize and broadcast the comment
-            from forum.serializers import CommentSerializer
-            from rest_framework.renderers import JSONRenderer
-            
-            serializer = CommentSerializer(comment)
-            comment_data = json.loads(JSONRenderer().render(serializer.data).decode('utf-8'))
-            
-            async_to_sync(self.channel_layer.group_send)(
-                self.room_group_name,
-                {
-                    'type': 'post_comment',
-                    'comment': comment_data,
-                    'parent_post_id': str(parent_post.id)
-                }
-            )
-            
-            return comment
-        except Post.DoesNotExist:
-            return None
+            events.append((f"notifications_{parent_post.sender_id}", {
+                'type': 'notification',
+                'notification_id': notification.id,
+                'message': f"{user.first_name} {user.last_name} commented on your post"
+            }))
+
+        # Serialize and broadcast the comment
+        serializer = CommentSerializer(comment)
+        events.append((self.room_group_name, {
+            'type': 'post_comment',
+            'comment': json.loads(JSONRenderer().render(serializer.data).decode('utf-8')),
+            'parent_post_id': str(parent_post.id)
+        }))
+        return events
             
     async def post_reaction(self, event):
         await self.send(text_data=json.dumps({
@@ -244,7 +268,6 @@ class PostConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def get_trending_posts(self, limit=10):
         from forum.models import Post
-        from django.db.models import Count
         from django.utils import timezone
         import datetime
         
@@ -253,9 +276,6 @@ class PostConsumer(AsyncWebsocketConsumer):
         posts = Post.objects.filter(
             parent=None,
             created_at__gte=recent_threshold
-        ).annotate(
-            reaction_count=Count('reactions'),
-            comment_count=Count('comments')
         ).order_by('-reaction_count', '-comment_count', '-created_at')[:limit]
         
         from forum.serializers import PostSerializer
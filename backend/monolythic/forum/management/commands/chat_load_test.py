@@ -0,0 +1,213 @@
+import asyncio
+import json
+import statistics
+import time
+import uuid
+
+from channels.layers import InMemoryChannelLayer, channel_layers
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from forum.consumer import PublicChatConsumer
+from forum.models import Forum, Post
+
+User = get_user_model()
+
+MEMORY_LAYER = "chat_load_test"
+
+
+class DelayedChannelLayer(InMemoryChannelLayer):
+    """In-memory layer whose sends take ``delay`` seconds, like the round trip to a remote one"""
+
+    def __init__(self, delay=0, **kwargs):
+        super().__init__(**kwargs)
+        self.delay = delay
+
+    async def send(self, channel, message):
+        await asyncio.sleep(self.delay)
+        await super().send(channel, message)
+
+    async def group_send(self, group, message):
+        await asyncio.sleep(self.delay)
+        await super().group_send(group, message)
+
+
+def percentiles(values):
+    if not values:
+        return "no samples"
+    values = sorted(values)
+    cuts = statistics.quantiles(values, n=100) if len(values) > 1 else values * 99
+    return (
+        f"p50 {cuts[49]:.1f}ms, p95 {cuts[94]:.1f}ms, p99 {cuts[98]:.1f}ms, "
+        f"max {values[-1]:.1f}ms ({len(values)} samples)"
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Connects simulated WebSocket clients to the public chat consumer and measures how '
+        'long messages (or reactions, with --scenario reactions) take to reach every client. '
+        'Posts created by the run are deleted afterwards unless --keep is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', choices=['messages', 'reactions'], default='messages')
+        parser.add_argument('--clients', type=int, default=300, help='Connected clients')
+        parser.add_argument('--senders', type=int, default=10, help='Clients sending messages or reactions')
+        parser.add_argument('--messages', type=int, default=5, help='Messages or reactions sent by each sender')
+        parser.add_argument('--interval', type=float, default=0.01, help='Seconds between two sends of a sender')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds to wait for the broadcasts')
+        parser.add_argument('--email', help='User the clients are authenticated as (default: first superuser)')
+        parser.add_argument(
+            '--layer', choices=['configured', 'memory'], default='configured',
+            help='Use the configured channel layer or an in-memory one (consumer overhead only)'
+        )
+        parser.add_argument(
+            '--layer-delay', type=float, default=0,
+            help='Milliseconds added to every send of the in-memory layer, to emulate a remote one'
+        )
+        parser.add_argument('--keep', action='store_true', help='Keep the posts created by the run')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['email'])
+        senders = min(options['senders'], options['clients'])
+        expected = senders * options['messages']
+        run_id = uuid.uuid4().hex[:8]
+        alias = 'default'
+        if options['layer'] == 'memory':
+            alias = MEMORY_LAYER
+            channel_layers.set(MEMORY_LAYER, DelayedChannelLayer(options['layer_delay'] / 1000, capacity=100000))
+
+        targets = []
+        if options['scenario'] == 'reactions':
+            # One post per reaction, written by someone else so every reaction also notifies its author
+            author = User.objects.exclude(pk=user.pk).order_by('date_joined').first() or user
+            forum, _ = Forum.objects.get_or_create(name="Public Forum")
+            targets = Post.objects.bulk_create([
+                Post(forum=forum, sender=author, content=f'load-test {run_id} target {number}')
+                for number in range(expected)
+            ])
+
+        try:
+            result = asyncio.run(self.run(user, alias, run_id, senders, targets, options))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Load test failed: {str(e)}'))
+            result = None
+
+        post_ids = {post.pk for post in targets}
+        if result is not None:
+            post_ids |= result['post_ids']
+            self.report(result, senders, expected, options)
+        if post_ids and not options['keep']:
+            deleted, _ = Post.objects.filter(pk__in=post_ids).delete()
+            self.stdout.write(f'Deleted the {deleted} rows created by the run')
+
+    def get_user(self, email):
+        users = User.objects.filter(email=email) if email else User.objects.filter(is_superuser=True).order_by('date_joined')
+        user = users.first()
+        if user is None:
+            raise CommandError('No user to authenticate the clients as, pass --email')
+        return user
+
+    def report(self, result, senders, expected, options):
+        self.stdout.write(
+            f"{options['clients']} clients, {senders} senders, {expected} {options['scenario']}, "
+            f"{options['layer']} channel layer"
+            + (f" (+{options['layer_delay']}ms per send)" if options['layer'] == 'memory' and options['layer_delay'] else "")
+        )
+        self.stdout.write(f"Fan-out latency (send -> broadcast received): {percentiles(result['fanout'])}")
+        if options['scenario'] == 'messages':
+            self.stdout.write(f"Persist latency (send -> posts_saved received): {percentiles(result['saved'])}")
+        if result['duration']:
+            self.stdout.write(f"Throughput: {result['handled'] / result['duration']:.1f} {options['scenario']}/s")
+        missing = expected * options['clients'] - len(result['fanout'])
+        if missing:
+            self.stdout.write(self.style.ERROR(f'{missing} broadcasts were not received within {options["timeout"]}s'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Every client received every broadcast'))
+
+    async def run(self, user, alias, run_id, sender_count, targets, options):
+        expected = sender_count * options['messages']
+        client_count = options['clients']
+        # as_asgi() does not apply its keyword arguments to the consumer
+        consumer = type('LoadTestChatConsumer', (PublicChatConsumer,), {'channel_layer_alias': alias})
+        application = consumer.as_asgi()
+        clients = []
+        for _ in range(client_count):
+            client = WebsocketCommunicator(application, "/ws/chat/")
+            client.scope['user'] = user
+            clients.append(client)
+
+        connected = await asyncio.gather(*[client.connect(timeout=options['timeout']) for client in clients])
+        if not all(ok for ok, _ in connected):
+            raise Exception(f'Some of the {client_count} clients could not connect')
+
+        # Broadcast key (message content or reacted post id) -> send time
+        sent_at = {}
+        fanout, saved, post_ids = [], [], set()
+        # client_id -> message content, filled from the broadcasts
+        client_ids = {}
+        # Receive time of the last broadcast seen by the first client
+        last_received = []
+
+        def broadcast_key(event):
+            if event['type'] == 'post' and event['post']['content'].startswith(f'load-test {run_id} '):
+                client_ids[event['post'].get('client_id')] = event['post']['content']
+                return event['post']['content']
+            if event['type'] == 'reaction' and event['reaction']['post_id'] in sent_at:
+                return event['reaction']['post_id']
+            return None
+
+        async def listen(client, first):
+            seen = saved_count = 0
+            measure_saved = first and options['scenario'] == 'messages'
+            deadline = time.perf_counter() + options['timeout']
+            while seen < expected or (measure_saved and saved_count < expected):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return
+                try:
+                    event = json.loads(await client.receive_from(timeout=remaining))
+                except asyncio.TimeoutError:
+                    return
+                received = time.perf_counter()
+                key = broadcast_key(event)
+                if key is not None:
+                    seen += 1
+                    fanout.append((received - sent_at[key]) * 1000)
+                    if first:
+                        last_received[:] = [received]
+                elif event['type'] == 'posts_saved' and measure_saved:
+                    for post in event['posts']:
+                        content = client_ids.get(post['client_id'])
+                        if content is not None:
+                            saved_count += 1
+                            saved.append((received - sent_at[content]) * 1000)
+                            post_ids.add(post['id'])
+
+        async def send(client, sender):
+            for number in range(options['messages']):
+                if targets:
+                    post_id = targets[sender * options['messages'] + number].pk
+                    sent_at[post_id] = time.perf_counter()
+                    data = {'type': 'reaction', 'post_id': post_id, 'reaction_type': 'LIKE'}
+                else:
+                    content = f'load-test {run_id} {sender}-{number}'
+                    sent_at[content] = time.perf_counter()
+                    data = {'type': 'message', 'message': content}
+                await client.send_to(text_data=json.dumps(data))
+                await asyncio.sleep(options['interval'])
+
+        listeners = [asyncio.ensure_future(listen(client, index == 0)) for index, client in enumerate(clients)]
+        started = time.perf_counter()
+        await asyncio.gather(*[send(clients[index], index) for index in range(sender_count)])
+        await asyncio.gather(*listeners)
+        await asyncio.gather(*[client.disconnect() for client in clients])
+        return {
+            'fanout': fanout,
+            'saved': saved,
+            'post_ids': post_ids,
+            'handled': len(fanout) // client_count if client_count else 0,
+            'duration': last_received[0] - started if last_received else 0,
+        }
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from forum.trending import TRENDING_WINDOW_HOURS, rebuild_trending
+
+class Command(BaseCommand):
+    help = 'Rebuilds the Redis trending posts leaderboard from the database'
+
+    def handle(self, *args, **options):
+        try:
+            entries = rebuild_trending()
+            self.stdout.write(
+                self.style.SUCCESS(f'Rebuilt the trending leaderboard of the last {TRENDING_WINDOW_HOURS} hours ({entries} entries)')
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'Failed to rebuild the trending leaderboard: {str(e)}')
+            )
@@ -0,0 +1,64 @@
+# Generated by Django 5.1.12 on 2026-10-18 03:30
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def backfill_engagement(apps, schema_editor):
+    Post = apps.get_model('forum', 'Post')
+    Reaction = apps.get_model('forum', 'Reaction')
+
+    reactions = (
+        Reaction.objects.filter(post_id=models.OuterRef('pk'))
+        .order_by().values('post_id').annotate(total=models.Count('id')).values('total')
+    )
+    comments = (
+        Post.objects.filter(parent_id=models.OuterRef('pk'))
+        .order_by().values('parent_id').annotate(total=models.Count('id')).values('total')
+    )
+    Post.objects.update(
+        reaction_count=Coalesce(models.Subquery(reactions), 0),
+        comment_count=Coalesce(models.Subquery(comments), 0),
+    )
+    recent_threshold = timezone.now() - datetime.timedelta(days=7)
+    Post.objects.update(
+        engagement_score=models.F('reaction_count') + models.F('comment_count') * 2 + models.Case(
+            models.When(created_at__gt=recent_threshold, then=models.Value(5)),
+            default=models.Value(0),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='engagement_score',
+            field=models.IntegerField(default=5),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reaction_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['parent', '-engagement_score', '-created_at'], name='forum_post_feed_idx'),
+        ),
+        migrations.RunPython(backfill_engagement, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+from utils.search import add_postgres_indexes, search_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0003_post_engagement_score'),
+    ]
+
+    operations = [
+        # PostgreSQL only, must match forum.views.POST_SEARCH_FIELDS
+        add_postgres_indexes(
+            'forum', 'Post',
+            search_index('forum_post_search_idx', {'content': 'A'}),
+        ),
+    ]
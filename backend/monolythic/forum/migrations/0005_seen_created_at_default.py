@@ -0,0 +1,19 @@
+# Generated by Django 5.1.12 on 2026-10-18 04:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0004_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='seen',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -7,6 +7,13 @@ from django.utils import timezone
 
 User = get_user_model()
 
+# News feed ranking: engagement_score = reaction_count + COMMENT_WEIGHT * comment_count,
+# plus RECENCY_BONUS for posts younger than RECENCY_WINDOW (removed by the
+# decay_engagement_scores beat task)
+COMMENT_WEIGHT = 2
+RECENCY_BONUS = 5
+RECENCY_WINDOW = timezone.timedelta(days=7)
+
 class Forum(models.Model):
     name = models.CharField(max_length=25, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -29,6 +36,10 @@ class Post(models.Model):
     
     # Fields for tracking engagement
     view_count = models.PositiveIntegerField(default=0)
+    # Kept up to date by the signals in forum/signals.py
+    reaction_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    engagement_score = models.IntegerField(default=RECENCY_BONUS)
     
     @property
     def reaction_counts(self):
@@ -37,11 +48,15 @@ class Post(models.Model):
             count=Count('reaction_type')
         )
     
-    @property
-    def comment_count(self):
-        """Get count of comments for this post"""
-        return Post.objects.filter(parent=self).count()
-    
+    @classmethod
+    def update_engagement(cls, post_id, reactions=0, comments=0):
+        """Apply a reaction/comment count change to a post in a single UPDATE"""
+        return cls.objects.filter(pk=post_id).update(
+            reaction_count=F('reaction_count') + reactions,
+            comment_count=F('comment_count') + comments,
+            engagement_score=F('engagement_score') + reactions + comments * COMMENT_WEIGHT,
+        )
+
     @property 
     def is_comment(self):
         """Check if this post is a comment"""
@@ -54,6 +69,9 @@ class Post(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Post'
         verbose_name_plural = 'Posts'
+        indexes = [
+            models.Index(fields=['parent', '-engagement_score', '-created_at'], name='forum_post_feed_idx'),
+        ]
 
 # Keep Messages as a proxy model for backward compatibility
 class Messages(Post):
@@ -96,7 +114,8 @@ class Seen(models.Model):
     """
     post = models.ForeignKey(Post, related_name='seen', on_delete=models.CASCADE)
     user = models.ForeignKey(User, related_name='seen_posts', on_delete=models.CASCADE)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: views flushed from Redis keep the time of the first view
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         unique_together = ('post', 'user')
@@ -0,0 +1,127 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Post, Reaction, Seen
+from .seen import get_pending_viewers
+
+# Relations read by UserSerializer (class_display goes through the class definition)
+SENDER_RELATED = ("sender__class_enrolled__definition",)
+
+
+def top_comments(parent_ids, limit):
+    """Latest ``limit`` direct comments of every parent, in one query"""
+    if not parent_ids or not limit:
+        return []
+    return list(
+        Post.objects.filter(parent_id__in=parent_ids)
+        .annotate(
+            comment_rank=Window(
+                RowNumber(),
+                partition_by=[F("parent_id")],
+                order_by=[F("created_at").desc(), F("id").desc()],
+            )
+        )
+        .filter(comment_rank__lte=limit)
+        .select_related(*SENDER_RELATED)
+        .order_by("parent_id", "comment_rank")
+    )
+
+
+class PostPrefetch:
+    """
+    Everything PostSerializer / CommentSerializer look up per post, loaded for
+    a whole page at once: reactions by type, comment counts, the latest
+    comments (``limits`` gives how many per nesting level), the requester's
+    reactions, who has seen the top level posts and the views not flushed yet.
+
+    The number of queries only depends on ``len(limits)``, not on the page
+    size. It is built by PostListSerializer and handed to the serializers
+    through the ``post_prefetch`` context key.
+    """
+
+    def __init__(self, posts, user=None, limits=(3, 2), seen_by=True):
+        self.comments = defaultdict(list)
+        # How many comments were loaded for each post
+        self.comment_limits = {}
+
+        # Posts rendered with the full serializer (counts, reactions...);
+        # the last level is rendered with SimpleCommentSerializer
+        level = [post.pk for post in posts]
+        self.post_ids = set(level)
+        for depth, limit in enumerate(limits):
+            # A comment can also be in the page itself (e.g. forum messages),
+            # its comments are then already loaded
+            level = [post_id for post_id in level if post_id not in self.comment_limits]
+            self.comment_limits.update(dict.fromkeys(level, limit))
+            children = top_comments(level, limit)
+            for comment in children:
+                self.comments[comment.parent_id].append(comment)
+            level = [comment.pk for comment in children]
+            if depth < len(limits) - 1:
+                self.post_ids.update(level)
+
+        ids = list(self.post_ids)
+        self.comment_counts = dict(
+            Post.objects.filter(parent_id__in=ids)
+            .order_by()
+            .values_list("parent_id")
+            .annotate(total=Count("id"))
+        )
+
+        self.reaction_counts = defaultdict(list)
+        reaction_counts = (
+            Reaction.objects.filter(post_id__in=ids)
+            .order_by()
+            .values("post_id", "reaction_type")
+            .annotate(count=Count("id"))
+        )
+        for row in reaction_counts:
+            self.reaction_counts[row["post_id"]].append(
+                {"reaction_type": row["reaction_type"], "count": row["count"]}
+            )
+
+        self.user_reactions = {}
+        if user is not None and user.is_authenticated:
+            reactions = Reaction.objects.filter(post_id__in=ids, user=user).select_related(
+                "user__class_enrolled__definition"
+            )
+            self.user_reactions = {reaction.post_id: reaction for reaction in reactions}
+
+        self.seen_by = None
+        if seen_by:
+            self.seen_by = {post.pk: [] for post in posts}
+            seen = Seen.objects.filter(post_id__in=list(self.seen_by)).values_list("post_id", "user_id")
+            for post_id, user_id in seen:
+                self.seen_by[post_id].append(user_id)
+
+        # Views recorded in Redis and not flushed yet
+        self.pending_viewers = get_pending_viewers(ids)
+
+    def covers(self, post):
+        return post.pk in self.post_ids
+
+    def get_comments(self, post, limit):
+        """Prefetched comments of ``post``, None when they were not loaded at that depth"""
+        if self.comment_limits.get(post.pk, 0) < limit:
+            return None
+        return self.comments.get(post.pk, [])[:limit]
+
+    def get_comment_count(self, post):
+        return self.comment_counts.get(post.pk, 0)
+
+    def get_reaction_counts(self, post):
+        return self.reaction_counts.get(post.pk, [])
+
+    def get_user_reaction(self, post):
+        return self.user_reactions.get(post.pk)
+
+    def get_pending_viewers(self, post):
+        return self.pending_viewers.get(post.pk, {})
+
+    def get_seen_by(self, post):
+        """Prefetched seen-by user ids, None when they were not loaded for ``post``"""
+        if self.seen_by is None:
+            return None
+        return self.seen_by.get(post.pk)
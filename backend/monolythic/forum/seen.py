@@ -0,0 +1,240 @@
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
+
+from .models import Post, Seen
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# Post views are recorded in Redis instead of a Seen get_or_create and a
+# view_count UPDATE per request. Each post has a set of the users known to
+# have seen it (loaded from the Seen table the first time it is needed) and a
+# hash of the viewers not written yet, with the time of their first view; the
+# flush_post_views task writes the pending viewers with one INSERT per batch
+# and one UPDATE per post. Reads add the pending viewers to the persisted
+# ones.
+DEFAULTS = {
+    "BATCH_SIZE": 200,  # posts flushed per batch
+    "INSERT_BATCH_SIZE": 1000,  # Seen rows per INSERT
+    "SEEN_TTL": 60 * 60 * 24 * 7,  # the seen set of a post is reloaded after this long without views
+}
+SEEN_PREFIX = "forum:views:seen:"
+PENDING_PREFIX = "forum:views:pending_at:"
+DIRTY_KEY = "forum:views:dirty"
+# Member of every loaded seen set, so an empty one still exists
+LOADED = "-"
+
+
+def get_view_settings():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "FORUM_VIEWS", {}))
+    return config
+
+
+def get_connection():
+    return get_redis_connection("default")
+
+
+def seen_key(post_id):
+    return f"{SEEN_PREFIX}{post_id}"
+
+
+def pending_key(post_id):
+    return f"{PENDING_PREFIX}{post_id}"
+
+
+def load_seen(connection, post_id, ttl):
+    """Fill the seen set of a post from the Seen table"""
+    user_ids = [str(user_id) for user_id in Seen.objects.filter(post_id=post_id).values_list("user_id", flat=True)]
+    pipe = connection.pipeline()
+    pipe.sadd(seen_key(post_id), LOADED, *user_ids)
+    pipe.expire(seen_key(post_id), ttl)
+    pipe.execute()
+
+
+def save_view(post, user):
+    """Synchronous path, used when Redis is unavailable"""
+    seen, created = Seen.objects.get_or_create(post=post, user=user)
+    if created:
+        Post.objects.filter(pk=post.pk).update(view_count=F("view_count") + 1)
+    return created, seen.created_at
+
+
+def record_view(post, user):
+    """
+    Record that ``user`` has seen ``post``. Returns (first_view, seen_at),
+    seen_at being the time of their first view. The Seen row and the view
+    count are written by the next flush.
+    """
+    ttl = get_view_settings()["SEEN_TTL"]
+    now = timezone.now()
+    try:
+        connection = get_connection()
+        if not connection.exists(seen_key(post.pk)):
+            load_seen(connection, post.pk, ttl)
+        pipe = connection.pipeline()
+        pipe.sadd(seen_key(post.pk), str(user.pk))
+        pipe.expire(seen_key(post.pk), ttl)
+        pipe.hget(pending_key(post.pk), str(user.pk))
+        added, _, pending_at = pipe.execute()
+        if added == 1:
+            pipe = connection.pipeline()
+            pipe.hsetnx(pending_key(post.pk), str(user.pk), now.isoformat())
+            pipe.sadd(DIRTY_KEY, post.pk)
+            pipe.execute()
+            return True, now
+    except Exception as e:
+        logger.warning(f"View tracking unavailable, saving the view of post {post.pk} directly: {str(e)}")
+        return save_view(post, user)
+    if pending_at is not None:
+        return False, parse_datetime(pending_at.decode())
+    # Flushed already; now only while a flush is writing it
+    seen_at = Seen.objects.filter(post=post, user=user).values_list("created_at", flat=True).first()
+    return False, seen_at or now
+
+
+def decode_pending(members):
+    """{user_id: first view} of a pending hash, oldest view first"""
+    views = {user_id.decode(): parse_datetime(seen_at.decode()) for user_id, seen_at in members.items()}
+    return dict(sorted(views.items(), key=lambda view: view[1]))
+
+
+def get_pending_viewers(post_ids):
+    """
+    {post_id: {user_id: first view}} of the views not flushed yet, empty
+    when Redis is unavailable.
+    """
+    post_ids = list(post_ids)
+    if not post_ids:
+        return {}
+    try:
+        pipe = get_connection().pipeline()
+        for post_id in post_ids:
+            pipe.hgetall(pending_key(post_id))
+        members = pipe.execute()
+    except Exception as e:
+        logger.warning(f"View tracking unavailable, showing the persisted views only: {str(e)}")
+        return {}
+    return {
+        post_id: decode_pending(post_members)
+        for post_id, post_members in zip(post_ids, members)
+        if post_members
+    }
+
+
+def merge_viewers(persisted, pending):
+    """Persisted user ids followed by the pending ones that are not among them yet"""
+    known = {str(user_id) for user_id in persisted}
+    return list(persisted) + [user_id for user_id in pending if user_id not in known]
+
+
+def get_seen_records(post):
+    """Seen rows of a post, followed by unsaved ones for the pending viewers"""
+    records = list(Seen.objects.filter(post=post).select_related("user"))
+    known = {str(record.user_id) for record in records}
+    pending = {
+        user_id: seen_at
+        for user_id, seen_at in get_pending_viewers([post.pk]).get(post.pk, {}).items()
+        if user_id not in known
+    }
+    if pending:
+        users = {str(user.pk): user for user in User.objects.filter(pk__in=list(pending))}
+        records += [
+            Seen(post=post, user=users[user_id], created_at=seen_at)
+            for user_id, seen_at in pending.items()
+            if user_id in users
+        ]
+    return records
+
+
+def take_pending(post_ids):
+    """Atomically take the pending viewers of ``post_ids``: {post_id: {user_id: first view}}"""
+    pipe = get_connection().pipeline(transaction=True)
+    for post_id in post_ids:
+        pipe.hgetall(pending_key(post_id))
+        pipe.delete(pending_key(post_id))
+    results = pipe.execute()
+    return {
+        post_id: decode_pending(members)
+        for post_id, members in zip(post_ids, results[::2])
+        if members
+    }
+
+
+def restore_pending(pending):
+    """Put viewers taken by a failed flush back for the next one"""
+    pipe = get_connection().pipeline()
+    for post_id, views in pending.items():
+        pipe.hset(pending_key(post_id), mapping={user_id: seen_at.isoformat() for user_id, seen_at in views.items()})
+        pipe.sadd(DIRTY_KEY, post_id)
+    pipe.execute()
+
+
+def write_views(pending):
+    """
+    Insert the Seen rows of ``pending`` and add the new views to the view
+    count of each post, returns the number of views written.
+    """
+    post_ids = set(Post.objects.filter(pk__in=list(pending)).values_list("pk", flat=True))
+    user_ids = {user_id for post_id, users in pending.items() if post_id in post_ids for user_id in users}
+    existing_users = {str(pk) for pk in User.objects.filter(pk__in=user_ids).values_list("pk", flat=True)}
+    # Viewers saved meanwhile (e.g. by the synchronous fallback) are not counted twice
+    already_seen = {
+        (post_id, str(user_id))
+        for post_id, user_id in Seen.objects.filter(post_id__in=post_ids, user_id__in=existing_users).values_list("post_id", "user_id")
+    }
+
+    rows = []
+    counts = {}
+    for post_id, users in pending.items():
+        if post_id not in post_ids:
+            continue
+        for user_id, seen_at in users.items():
+            if user_id in existing_users and (post_id, user_id) not in already_seen:
+                rows.append(Seen(post_id=post_id, user_id=user_id, created_at=seen_at))
+                counts[post_id] = counts.get(post_id, 0) + 1
+
+    with transaction.atomic():
+        Seen.objects.bulk_create(rows, batch_size=get_view_settings()["INSERT_BATCH_SIZE"], ignore_conflicts=True)
+        for post_id, count in counts.items():
+            Post.objects.filter(pk=post_id).update(view_count=F("view_count") + count)
+    return len(rows)
+
+
+def flush_views(max_batches=50):
+    """
+    Write pending views in batches of BATCH_SIZE posts until none are left or
+    ``max_batches`` batches were written. Returns the number of views written.
+    """
+    batch_size = get_view_settings()["BATCH_SIZE"]
+    count = 0
+    for _ in range(max_batches):
+        post_ids = [int(post_id) for post_id in get_connection().spop(DIRTY_KEY, batch_size)]
+        if not post_ids:
+            break
+        pending = None
+        try:
+            pending = take_pending(post_ids)
+            count += write_views(pending)
+        except Exception:
+            if pending is None:
+                # Not taken: the pending hashes are intact, mark their posts again
+                get_connection().sadd(DIRTY_KEY, *post_ids)
+            else:
+                restore_pending(pending)
+            raise
+        if len(post_ids) < batch_size:
+            break
+    return count
+
+
+def get_dirty_count():
+    return get_connection().scard(DIRTY_KEY)
@@ -3,6 +3,8 @@ from .models import Forum, Post, Messages, Seen, Reaction, Notification, Reactio
 from users.serializers import UserSerializer
 from django.contrib.auth import get_user_model
 from django.db.models import Count
+from .prefetch import PostPrefetch, SENDER_RELATED
+from .seen import get_pending_viewers, merge_viewers
 
 User = get_user_model()
 
@@ -32,6 +34,68 @@ class ReactionCountSerializer(serializers.Serializer):
     reaction_type = serializers.CharField()
     count = serializers.IntegerField()
 
+class PostListSerializer(serializers.ListSerializer):
+    """
+    Loads the per post data of the whole list in one go (see PostPrefetch)
+    and shares it with the child serializers through the context.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if hasattr(data, 'all') else data
+        posts = list(iterable)
+        if posts and self.context.get('post_prefetch') is None:
+            request = self.context.get('request')
+            self.context['post_prefetch'] = PostPrefetch(
+                posts,
+                user=getattr(request, 'user', None),
+                limits=self.child.prefetch_limits,
+                seen_by=self.child.prefetch_seen_by,
+            )
+        return super().to_representation(posts)
+
+class PrefetchedPostMixin:
+    """Reads from the context prefetch when it covers the post, queries otherwise"""
+    prefetch_limits = ()
+    prefetch_seen_by = False
+
+    def get_prefetch(self, obj):
+        prefetch = self.context.get('post_prefetch')
+        if prefetch is not None and prefetch.covers(obj):
+            return prefetch
+        return None
+
+    def get_latest_comments(self, obj, limit):
+        prefetch = self.get_prefetch(obj)
+        comments = prefetch.get_comments(obj, limit) if prefetch else None
+        if comments is None:
+            comments = Post.objects.filter(parent=obj).select_related(*SENDER_RELATED).order_by('-created_at')[:limit]
+        return comments
+
+    def get_comment_count(self, obj):
+        prefetch = self.get_prefetch(obj)
+        if prefetch:
+            return prefetch.get_comment_count(obj)
+        return Post.objects.filter(parent=obj).count()
+
+    def get_reaction_counts(self, obj):
+        prefetch = self.get_prefetch(obj)
+        counts = prefetch.get_reaction_counts(obj) if prefetch else obj.reaction_counts
+        return ReactionCountSerializer(counts, many=True).data
+
+    def get_user_reaction(self, obj):
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            prefetch = self.get_prefetch(obj)
+            if prefetch:
+                reaction = prefetch.get_user_reaction(obj)
+                return ReactionSerializer(reaction).data if reaction else None
+            try:
+                reaction = Reaction.objects.get(post=obj, user=request.user)
+                return ReactionSerializer(reaction).data
+            except Reaction.DoesNotExist:
+                return None
+        return None
+
 class SimpleCommentSerializer(serializers.ModelSerializer):
     """A simplified serializer for nested replies to avoid recursion"""
     sender = UserSerializer(read_only=True)
@@ -40,7 +104,7 @@ class SimpleCommentSerializer(serializers.ModelSerializer):
         model = Post
         fields = ["id", "sender", "content", "created_at", "file", "image"]
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(PrefetchedPostMixin, serializers.ModelSerializer):
     sender = UserSerializer(read_only=True)
     comments = serializers.SerializerMethodField()
     comment_count = serializers.SerializerMethodField()
@@ -62,38 +126,25 @@ class CommentSerializer(serializers.ModelSerializer):
             "reaction_counts",
             "user_reaction"
         ]
-    
+        list_serializer_class = PostListSerializer
+
+    # Replies shown under each comment
+    prefetch_limits = (2,)
+
     def get_comments(self, obj):
         # Get replies to this comment (limited to avoid too much nesting)
-        replies = Post.objects.filter(parent=obj).order_by('-created_at')[:2]
+        replies = self.get_latest_comments(obj, 2)
         # Use simplified serializer for replies to prevent recursion
         return SimpleCommentSerializer(replies, many=True, context=self.context).data
-    
-    def get_comment_count(self, obj):
-        # Count of replies to this comment
-        return Post.objects.filter(parent=obj).count()
-    
-    def get_reaction_counts(self, obj):
-        counts = obj.reaction_counts
-        return ReactionCountSerializer(counts, many=True).data
-    
-    def get_user_reaction(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            try:
-                reaction = Reaction.objects.get(post=obj, user=request.user)
-                return ReactionSerializer(reaction).data
-            except Reaction.DoesNotExist:
-                return None
-        return None
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(PrefetchedPostMixin, serializers.ModelSerializer):
     sender = UserSerializer(read_only=True)
     comments = serializers.SerializerMethodField()
     comment_count = serializers.SerializerMethodField()
     reaction_counts = serializers.SerializerMethodField()
     user_reaction = serializers.SerializerMethodField()
     seen_by = serializers.SerializerMethodField()
+    view_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Post
@@ -125,35 +176,41 @@ class PostSerializer(serializers.ModelSerializer):
             "seen_by",
             "view_count"
         ]
-    
+        list_serializer_class = PostListSerializer
+
+    # Comments shown under each post, then replies under each comment
+    prefetch_limits = (3, 2)
+    prefetch_seen_by = True
+
     def get_comments(self, obj):
         # Get top level comments for this post
-        top_comments = Post.objects.filter(parent=obj).order_by('-created_at')[:3]
+        top_comments = self.get_latest_comments(obj, 3)
         return CommentSerializer(top_comments, many=True, context=self.context).data
 
     def get_comment_count(self, obj):
         # Use the annotated total_comments if available, otherwise fall back to property
         if hasattr(obj, 'total_comments'):
             return obj.total_comments
-        return Post.objects.filter(parent=obj).count()
+        return super().get_comment_count(obj)
+
+    def get_pending_viewers(self, obj):
+        """Viewers recorded in Redis and not flushed yet (see forum/seen.py)"""
+        prefetch = self.get_prefetch(obj)
+        if prefetch:
+            return prefetch.get_pending_viewers(obj)
+        if not hasattr(obj, '_pending_viewers'):
+            obj._pending_viewers = get_pending_viewers([obj.pk]).get(obj.pk, {})
+        return obj._pending_viewers
 
-    def get_reaction_counts(self, obj):
-        counts = obj.reaction_counts
-        return ReactionCountSerializer(counts, many=True).data
-    
-    def get_user_reaction(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            try:
-                reaction = Reaction.objects.get(post=obj, user=request.user)
-                return ReactionSerializer(reaction).data
-            except Reaction.DoesNotExist:
-                return None
-        return None
-    
     def get_seen_by(self, obj):
-        seen_by_ids = list(Seen.objects.filter(post=obj).values_list("user_id", flat=True))
-        return seen_by_ids
+        prefetch = self.get_prefetch(obj)
+        seen_by_ids = prefetch.get_seen_by(obj) if prefetch else None
+        if seen_by_ids is None:
+            seen_by_ids = list(Seen.objects.filter(post=obj).values_list("user_id", flat=True))
+        return merge_viewers(seen_by_ids, self.get_pending_viewers(obj))
+
+    def get_view_count(self, obj):
+        return obj.view_count + len(self.get_pending_viewers(obj))
 
 # For backward compatibility
 class MessageSerializer(PostSerializer):
@@ -0,0 +1,37 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Post, Messages, Reaction
+
+
+def deleted_with_post(origin, instance):
+    """
+    True when ``instance`` is removed by the cascade of a Post delete: the post
+    it would update is that post or one of its comments, so it is going away too.
+    """
+    return isinstance(origin, Post) and origin != instance
+
+
+@receiver(post_save, sender=Reaction)
+def count_reaction(sender, instance, created, **kwargs):
+    if created:
+        Post.update_engagement(instance.post_id, reactions=1)
+
+
+@receiver(post_delete, sender=Reaction)
+def uncount_reaction(sender, instance, origin=None, **kwargs):
+    if not deleted_with_post(origin, instance):
+        Post.update_engagement(instance.post_id, reactions=-1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Messages)
+def count_comment(sender, instance, created, **kwargs):
+    if created and instance.parent_id:
+        Post.update_engagement(instance.parent_id, comments=1)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Messages)
+def uncount_comment(sender, instance, origin=None, **kwargs):
+    if instance.parent_id and not deleted_with_post(origin, instance):
+        Post.update_engagement(instance.parent_id, comments=-1)
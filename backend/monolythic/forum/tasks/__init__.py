@@ -0,0 +1,5 @@
+# Make sure the tasks are registered when the 'tasks' package is imported
+from .engagement import decay_engagement_scores
+from .views import flush_post_views
+
+__all__ = ['decay_engagement_scores', 'flush_post_views']
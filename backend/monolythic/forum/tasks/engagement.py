@@ -0,0 +1,33 @@
+import logging
+from celery import shared_task
+from django.db.models import F
+from django.utils import timezone
+from ..models import Post, COMMENT_WEIGHT, RECENCY_WINDOW
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def decay_engagement_scores():
+    """
+    Remove the recency bonus from the engagement score of posts that are
+    older than RECENCY_WINDOW. Only posts still carrying the bonus are updated.
+    """
+    try:
+        threshold = timezone.now() - RECENCY_WINDOW
+        base_score = F('reaction_count') + F('comment_count') * COMMENT_WEIGHT
+        count = Post.objects.filter(
+            created_at__lte=threshold,
+            engagement_score__gt=base_score,
+        ).update(engagement_score=base_score)
+
+        logger.info(f"Removed the recency bonus from {count} posts")
+        return {
+            'status': 'success',
+            'count': count
+        }
+    except Exception as e:
+        logger.exception(f"Error decaying engagement scores: {str(e)}")
+        return {
+            'status': 'error',
+            'message': f'Error decaying engagement scores: {str(e)}'
+        }
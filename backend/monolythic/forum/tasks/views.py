@@ -0,0 +1,27 @@
+import logging
+from celery import shared_task
+from ..seen import flush_views
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def flush_post_views(max_batches=50):
+    """
+    Write the post views recorded in Redis: the Seen rows in bulk and one
+    view_count UPDATE per post.
+    """
+    try:
+        count = flush_views(max_batches=max_batches)
+
+        if count:
+            logger.info(f"Flushed {count} post views")
+        return {
+            'status': 'success',
+            'count': count
+        }
+    except Exception as e:
+        logger.exception(f"Error flushing post views: {str(e)}")
+        return {
+            'status': 'error',
+            'message': f'Error flushing post views: {str(e)}'
+        }
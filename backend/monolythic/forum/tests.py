@@ -1,3 +1,170 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from . import seen, trending
+from .models import Forum, Post, Seen
+from users.models import User
+
+
+class NewsFeedQueryCountTest(TestCase):
+    """Listing the feed must not run queries per post or per sender"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.forum = Forum.objects.create(name="Public Forum")
+        cls.user = cls.create_user(0)
+        cls.create_post(cls.user)
+
+    @staticmethod
+    def create_user(number):
+        return User.objects.create_user(
+            email=f"user{number}@example.com",
+            password="password",
+            first_name="User",
+            last_name=str(number),
+            phone_number=f"+2376500000{number:02d}",
+            is_staff=True,
+        )
+
+    @classmethod
+    def create_post(cls, sender):
+        return Post.objects.create(forum=cls.forum, sender=sender, content=f"Post of {sender.email}")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_feed_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get("/api/feed/")
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.json()
+
+    def test_query_count_does_not_grow_with_posts(self):
+        few_queries, _ = self.count_feed_queries()
+        for number in range(1, 11):
+            self.create_post(self.create_user(number))
+        many_queries, data = self.count_feed_queries()
+        self.assertEqual(len(data["results"]), 11)
+        self.assertEqual(few_queries, many_queries)
+
+    def test_senders_have_no_subscription_badge(self):
+        _, data = self.count_feed_queries()
+        self.assertNotIn("subscription_status", data["results"][0]["sender"])
+
+    def test_user_endpoints_have_the_subscription_badge(self):
+        response = self.client.get("/api/accounts/users/info/")
+        self.assertEqual(response.json()["subscription_status"], {"active": False})
+
+
+class ViewTrackingTest(TestCase):
+    """Views recorded in Redis and written by flush_views"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.forum = Forum.objects.create(name="Public Forum")
+        cls.author = NewsFeedQueryCountTest.create_user(0)
+        cls.viewer = NewsFeedQueryCountTest.create_user(1)
+        cls.post = Post.objects.create(forum=cls.forum, sender=cls.author, content="Post")
+
+    def setUp(self):
+        # Own keys, so the tests never flush the views of another database
+        keys = mock.patch.multiple(
+            seen,
+            SEEN_PREFIX="test:forum:views:seen:",
+            PENDING_PREFIX="test:forum:views:pending_at:",
+            DIRTY_KEY="test:forum:views:dirty",
+        )
+        keys.start()
+        self.addCleanup(keys.stop)
+        self.clear_redis()
+        self.addCleanup(self.clear_redis)
+
+    def clear_redis(self):
+        seen.get_connection().delete(seen.seen_key(self.post.pk), seen.pending_key(self.post.pk), seen.DIRTY_KEY)
+
+    def test_record_view_returns_the_first_view_time_on_repeat_views(self):
+        first_view, seen_at = seen.record_view(self.post, self.viewer)
+        self.assertTrue(first_view)
+
+        with mock.patch.object(seen.timezone, "now", return_value=seen_at + timedelta(minutes=5)):
+            first_view, repeat_seen_at = seen.record_view(self.post, self.viewer)
+        self.assertFalse(first_view)
+        self.assertEqual(repeat_seen_at, seen_at)
+
+    def test_flush_writes_each_view_once_with_its_first_view_time(self):
+        _, seen_at = seen.record_view(self.post, self.viewer)
+        seen.record_view(self.post, self.viewer)
+
+        self.assertEqual(seen.flush_views(), 1)
+        self.assertEqual(seen.flush_views(), 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 1)
+        self.assertEqual(Seen.objects.get(post=self.post, user=self.viewer).created_at, seen_at)
+
+        # Flushed views are not pending anymore, nor counted again
+        first_view, flushed_seen_at = seen.record_view(self.post, self.viewer)
+        self.assertFalse(first_view)
+        self.assertEqual(flushed_seen_at, seen_at)
+        self.assertEqual(seen.flush_views(), 0)
+
+    def test_failed_take_keeps_the_posts_dirty(self):
+        seen.record_view(self.post, self.viewer)
+
+        with mock.patch.object(seen, "take_pending", side_effect=TimeoutError("Redis timeout")):
+            with self.assertRaises(TimeoutError):
+                seen.flush_views()
+        self.assertEqual(seen.get_dirty_count(), 1)
+
+        self.assertEqual(seen.flush_views(), 1)
+        self.assertTrue(Seen.objects.filter(post=self.post, user=self.viewer).exists())
+
+    def test_failed_write_restores_the_pending_views(self):
+        _, seen_at = seen.record_view(self.post, self.viewer)
+
+        with mock.patch.object(seen, "write_views", side_effect=RuntimeError("database down")):
+            with self.assertRaises(RuntimeError):
+                seen.flush_views()
+
+        self.assertEqual(seen.flush_views(), 1)
+        self.assertEqual(Seen.objects.get(post=self.post, user=self.viewer).created_at, seen_at)
+
+
+class TrendingPaginationTest(TestCase):
+    """Trending posts are ranked in Redis on every request and paged by page number"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.forum = Forum.objects.create(name="Public Forum")
+        cls.user = NewsFeedQueryCountTest.create_user(0)
+        cls.posts = [Post.objects.create(forum=cls.forum, sender=cls.user, content=f"Post {number}") for number in range(5)]
+
+    def setUp(self):
+        # Own keys, so the tests never touch the live leaderboard
+        keys = mock.patch.multiple(trending, BUCKET_PREFIX="test:forum:trending:", UNION_KEY="test:forum:trending:window")
+        keys.start()
+        self.addCleanup(keys.stop)
+        self.addCleanup(self.clear_redis)
+        for score, post in enumerate(self.posts, start=1):
+            trending.record_activity(post.pk, score)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def clear_redis(self):
+        trending.get_connection().delete(trending.UNION_KEY, *trending.window_keys())
+
+    def test_pages_follow_the_ranking(self):
+        first = self.client.get("/api/feed/trending/", {"page_size": 2}).json()
+        self.assertEqual(first["count"], 5)
+        self.assertIn("page=2", first["next"])
+        second = self.client.get(first["next"]).json()
+        third = self.client.get(second["next"]).json()
+        self.assertIsNone(third["next"])
 
-# Create your tests here.
+        ranked = [post["id"] for page in (first, second, third) for post in page["results"]]
+        self.assertEqual(ranked, [post.pk for post in reversed(self.posts)])
@@ -0,0 +1,131 @@
+import logging
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db.models import Case, Count, IntegerField, Value, When
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from .models import COMMENT_WEIGHT, Post, Reaction
+from .prefetch import SENDER_RELATED
+
+logger = logging.getLogger(__name__)
+
+# Trending = reactions + COMMENT_WEIGHT * comments received by top level posts
+# over the last TRENDING_WINDOW_HOURS. Each hour has its own Redis sorted set
+# (post id -> score) and reads sum the buckets of the window.
+TRENDING_WINDOW_HOURS = 24
+TRENDING_LIMIT = 100
+BUCKET_PREFIX = "forum:trending:"
+UNION_KEY = "forum:trending:window"
+# Buckets outlive the window by an hour so late decrements still find them
+BUCKET_TTL = (TRENDING_WINDOW_HOURS + 1) * 60 * 60
+
+
+def bucket_key(moment):
+    return f"{BUCKET_PREFIX}{moment.astimezone(dt_timezone.utc):%Y%m%d%H}"
+
+
+def window_keys(now=None):
+    now = now or timezone.now()
+    return [bucket_key(now - timedelta(hours=hours)) for hours in range(TRENDING_WINDOW_HOURS)]
+
+
+def get_connection():
+    return get_redis_connection("default")
+
+
+def record_activity(post_id, weight, moment=None):
+    """Add ``weight`` to the post in the bucket of ``moment``, Redis errors are only logged"""
+    moment = moment or timezone.now()
+    if moment < timezone.now() - timedelta(hours=TRENDING_WINDOW_HOURS):
+        return
+    try:
+        key = bucket_key(moment)
+        pipe = get_connection().pipeline()
+        pipe.zincrby(key, weight, post_id)
+        pipe.expire(key, BUCKET_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not update trending score of post {post_id}: {str(e)}")
+
+
+def record_reaction(post, reaction, removed=False):
+    if post.parent_id is None:
+        record_activity(post.pk, -1 if removed else 1, reaction.created_at)
+
+
+def record_comment(parent_post, comment):
+    if parent_post.parent_id is None:
+        record_activity(parent_post.pk, COMMENT_WEIGHT, comment.created_at)
+
+
+def get_trending_scores(limit=TRENDING_LIMIT):
+    """Top ``limit`` (post id, score) pairs of the window, highest first"""
+    pipe = get_connection().pipeline()
+    pipe.zunionstore(UNION_KEY, window_keys())
+    pipe.zrevrange(UNION_KEY, 0, limit - 1, withscores=True)
+    _, top = pipe.execute()
+    return [(int(post_id), int(score)) for post_id, score in top if score > 0]
+
+
+def get_trending_queryset(limit=TRENDING_LIMIT):
+    """
+    Trending top level posts annotated with ``trending_score`` from Redis,
+    None when Redis is unavailable (callers then fall back to SQL).
+    """
+    try:
+        scores = get_trending_scores(limit)
+    except Exception as e:
+        logger.warning(f"Trending leaderboard unavailable, falling back to SQL: {str(e)}")
+        return None
+    if not scores:
+        return Post.objects.none()
+    return (
+        Post.objects.filter(pk__in=[post_id for post_id, _ in scores], parent=None)
+        .select_related(*SENDER_RELATED)
+        .annotate(
+            trending_score=Case(
+                *[When(pk=post_id, then=Value(score)) for post_id, score in scores],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+        .order_by("-trending_score", "-created_at")
+    )
+
+
+def rebuild_trending():
+    """
+    Recompute the buckets of the window from the database, returns the number
+    of (post, hour) entries written.
+    """
+    since = timezone.now() - timedelta(hours=TRENDING_WINDOW_HOURS)
+    reactions = (
+        Reaction.objects.filter(created_at__gte=since, post__parent=None)
+        .annotate(hour=TruncHour("created_at"))
+        .order_by()
+        .values_list("post_id", "hour")
+        .annotate(total=Count("id"))
+    )
+    comments = (
+        Post.objects.filter(created_at__gte=since, parent__isnull=False, parent__parent=None)
+        .annotate(hour=TruncHour("created_at"))
+        .order_by()
+        .values_list("parent_id", "hour")
+        .annotate(total=Count("id"))
+    )
+
+    connection = get_connection()
+    pipe = connection.pipeline()
+    for key in connection.scan_iter(match=f"{BUCKET_PREFIX}*"):
+        pipe.delete(key)
+    entries = 0
+    for rows, weight in ((reactions, 1), (comments, COMMENT_WEIGHT)):
+        for post_id, hour, total in rows:
+            key = bucket_key(hour)
+            pipe.zincrby(key, total * weight, post_id)
+            pipe.expire(key, BUCKET_TTL)
+            entries += 1
+    pipe.execute()
+    return entries
@@ -11,8 +11,13 @@ from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
 from datetime import timedelta
 from utils.mixins import ActivityLoggingMixin
+from utils.pagination import KeysetPagination
+from utils.search import search
 
 from .models import Forum, Post, Messages, Seen, Reaction, Notification, ReactionType
+from .prefetch import SENDER_RELATED
+from . import trending
+from .seen import record_view, get_seen_records
 from .serializers import (
     PostSerializer,
     MessageSerializer,
@@ -25,9 +30,25 @@ from .serializers import (
 
 # Create your views here.
 
+# Fields of the news feed ?search=, indexed by forum/migrations/0004_search_indexes.py
+POST_SEARCH_FIELDS = {"content": "A"}
 
-class PostPagination(PageNumberPagination):
-    """Custom pagination for posts"""
+
+class PostPagination(KeysetPagination):
+    """Keyset pagination for posts, follows the feed ordering (engagement or -created_at)"""
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class TrendingPagination(PageNumberPagination):
+    """
+    Page numbers for the trending posts: their scores are recomputed on every
+    request, so a cursor holding the trending_score of the last post would not
+    point at the same place on the next page. The Redis list is capped at
+    TRENDING_LIMIT posts, which keeps the OFFSET small.
+    """
 
     page_size = 20
     page_size_query_param = "page_size"
@@ -138,6 +159,16 @@ class NewsFeedViewSet(ActivityLoggingMixin, viewsets.ReadOnlyModelViewSet):
     swagger_tags = ["Posts"]
     pagination_class = PostPagination
 
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                "search",
+                openapi.IN_QUERY,
+                description="Ranked full-text search on the post content, best matches first",
+                type=openapi.TYPE_STRING,
+            )
+        ]
+    )
     def list(self, request, *args, **kwargs):
         self.log_activity(request, "Viewed news feed")
         return super().list(request, *args, **kwargs)
@@ -187,67 +218,64 @@ class NewsFeedViewSet(ActivityLoggingMixin, viewsets.ReadOnlyModelViewSet):
             return Post.objects.all()  # Don't filter by parent=None for retrieval
 
         # Base queryset - only top-level posts (not comments) for list view
-        queryset = Post.objects.filter(parent=None)
-
-        # Get time threshold for "recent" posts (last 7 days)
-        recent_threshold = timezone.now() - timedelta(days=7)
-
-        # Add engagement metrics
-        queryset = queryset.annotate(
-            reaction_count=Count("reactions"),
-            total_comments=Count("comments"),  # Changed from comment_count to total_comments
-            # Calculate engagement score - more weight to recent posts
-            # Using Case/When instead of direct F comparison
-            recency_score=Case(
-                When(created_at__gt=recent_threshold, then=Value(5)),
-                default=Value(0),
-                output_field=IntegerField(),
-            ),
-            engagement_score=Count("reactions")
-            + Count("comments") * 2
-            + F("recency_score"),
-        )
+        queryset = Post.objects.filter(parent=None).select_related(*SENDER_RELATED)
+
+        query = self.request.query_params.get("search")
+        if query and self.action == "list":
+            # Ranked by relevance, then recency (see utils/search.py)
+            return search(queryset, POST_SEARCH_FIELDS, query)
 
-        # Order by engagement score (higher is better)
+        # Order by the stored engagement score (higher is better), it is kept
+        # up to date on reaction/comment writes and loses its recency bonus
+        # after 7 days (see Post.engagement_score), served by forum_post_feed_idx
         return queryset.order_by("-engagement_score", "-created_at")
 
-    @action(detail=False, methods=["get"])
+    @action(detail=False, methods=["get"], pagination_class=TrendingPagination)
     def trending(self, request):
         self.log_activity(request, "Viewed trending posts")
+
+        # Redis leaderboard (hourly buckets, see forum/trending.py), the SQL
+        # query is only used when Redis is unavailable
+        queryset = trending.get_trending_queryset()
+        if queryset is None:
+            queryset = self.get_trending_sql_queryset()
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(
+                page, many=True, context={"request": request}
+            )
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(
+            queryset, many=True, context={"request": request}
+        )
+        return Response(serializer.data)
+
+    def get_trending_sql_queryset(self):
         recent_threshold = timezone.now() - timedelta(hours=24)
 
         # Get posts with reactions or comments in last 24 hours
-        queryset = (
+        return (
             Post.objects.filter(
                 Q(reactions__created_at__gte=recent_threshold)
                 | Q(comments__created_at__gte=recent_threshold),
                 parent=None,
             )
+            .select_related(*SENDER_RELATED)
             .annotate(
+                # distinct: the reactions and comments joins multiply each other
                 recent_reactions=Count(
-                    "reactions", filter=Q(reactions__created_at__gte=recent_threshold)
+                    "reactions", filter=Q(reactions__created_at__gte=recent_threshold), distinct=True
                 ),
                 recent_comments=Count(
-                    "comments", filter=Q(comments__created_at__gte=recent_threshold)
+                    "comments", filter=Q(comments__created_at__gte=recent_threshold), distinct=True
                 ),
-                total_comments=Count("comments"),  # Add this for consistency
                 trending_score=F("recent_reactions") + F("recent_comments") * 2,
             )
             .order_by("-trending_score", "-created_at")
         )
 
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(
-                page, many=True, context={"request": request}
-            )
-            return self.get_paginated_response(serializer.data)
-
-        serializer = self.get_serializer(
-            queryset, many=True, context={"request": request}
-        )
-        return Response(serializer.data)
-
 
 class PostViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
     """
@@ -338,7 +366,7 @@ class PostViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
             return Post.objects.all().order_by('-created_at')
         else:
             # Default behavior for list - only show top-level posts
-            return Post.objects.filter(parent=None).order_by("-created_at")
+            return Post.objects.filter(parent=None).select_related(*SENDER_RELATED).order_by("-created_at")
 
     def perform_create(self, serializer):
         serializer.save(sender=self.request.user)
@@ -389,6 +417,9 @@ class PostViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
             post=post, user=user, defaults={"reaction_type": reaction_type}
         )
 
+        if created:
+            trending.record_reaction(post, reaction)
+
         # Create notification for post owner if not the same user
         if created and post.sender != user:
             Notification.objects.create(
@@ -428,6 +459,7 @@ class PostViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
             reaction = Reaction.objects.get(post=post, user=user)
             reaction_type = reaction.reaction_type
             reaction.delete()
+            trending.record_reaction(post, reaction, removed=True)
             self.log_activity(request, "Removed reaction from post", {
                 "post_id": str(post.id),
                 "reaction_type": reaction_type
@@ -450,7 +482,7 @@ class PostViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
         
         # Ensure we're using a direct ID filter rather than object instance
         # This can sometimes cause issues with ORM
-        comments = Post.objects.filter(parent_id=post.id).order_by("-created_at")
+        comments = Post.objects.filter(parent_id=post.id).select_related(*SENDER_RELATED).order_by("-created_at")
         
         # Debug: print the query and count
         print(f"Comment query: {comments.query}")
@@ -501,6 +533,7 @@ class PostViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
                 parent=parent_post,
                 forum=parent_post.forum  # Add the forum from parent post
             )
+            trending.record_comment(parent_post, comment)
             
             # Create notification for post owner if not the same user
             if parent_post.sender != user:
@@ -537,13 +570,9 @@ class PostViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
         post = self.get_object()
         user = request.user
 
-        # Create or get seen record
-        seen, created = Seen.objects.get_or_create(post=post, user=user)
-
-        # Increment view count if this is a new view
-        if created:
-            post.view_count = F("view_count") + 1
-            post.save(update_fields=["view_count"])
+        # The Seen row and the view count are written by the flush_post_views task
+        first_view, _ = record_view(post, user)
+        if first_view:
             self.log_activity(request, "Viewed post content", {"post_id": str(post.id)})
 
         return Response({"status": "success"})
@@ -563,7 +592,7 @@ class MessageAPIView(ActivityLoggingMixin, APIView):
         forum = get_object_or_404(Forum, id=forum_id)
         self.log_activity(request, "Viewed forum messages", {"forum_id": str(forum_id)})
         
-        messages = Post.objects.filter(forum=forum).order_by("-created_at")
+        messages = Post.objects.filter(forum=forum).select_related(*SENDER_RELATED).order_by("-created_at")
         serializer = PostSerializer(messages, many=True, context={"request": request})
         return Response(serializer.data)
 
@@ -744,18 +773,15 @@ class MessageSeenAPIView(ActivityLoggingMixin, APIView):
         forum = get_object_or_404(Forum, id=forum_id)
         message = get_object_or_404(Post, id=message_id, forum=forum)
 
-        seen, created = Seen.objects.get_or_create(post=message, user=request.user)
-
-        # Increment view count if this is a new view
-        if created:
-            message.view_count = F("view_count") + 1
-            message.save(update_fields=["view_count"])
+        # The Seen row and the view count are written by the flush_post_views task
+        first_view, seen_at = record_view(message, request.user)
+        if first_view:
             self.log_activity(request, "Marked message as seen", {
                 "forum_id": str(forum_id),
                 "message_id": str(message_id)
             })
 
-        serializer = SeenSerializer(seen)
+        serializer = SeenSerializer(Seen(post=message, user=request.user, created_at=seen_at))
         return Response(serializer.data)
 
     @swagger_auto_schema(
@@ -778,7 +804,7 @@ class MessageSeenAPIView(ActivityLoggingMixin, APIView):
             "message_id": str(message_id)
         })
         
-        seen_records = Seen.objects.filter(post=message)
+        seen_records = get_seen_records(message)
         serializer = SeenSerializer(seen_records, many=True)
         return Response(serializer.data)
 
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Public chat messages are broadcast as soon as they are received and
+# written afterwards: every event loop has one PostWriter that collects the
+# posts of all its consumers and bulk_creates them every TICK seconds. Once
+# a batch is written its ids are broadcast (chat_posts_saved) so clients can
+# attach reactions and comments to the posts. Posts queued when the process
+# dies are lost, at most TICK seconds of messages.
+DEFAULTS = {
+    "TICK": 0.05,  # seconds between two writes
+    "BATCH_SIZE": 200,  # posts per INSERT
+    "MAX_QUEUE": 5000,  # new messages are refused beyond this many unwritten posts
+}
+
+_writers = {}
+
+
+def get_writer_settings():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "PUBLIC_CHAT_WRITER", {}))
+    return config
+
+
+def chat_post_payload(post, client_id):
+    """What is broadcast for a post not written yet, in the shape of PostSerializer"""
+    sender = post.sender
+    return {
+        "id": None,
+        "client_id": client_id,
+        "forum": post.forum_id,
+        "sender": {
+            "id": str(sender.id),
+            "email": sender.email,
+            "first_name": sender.first_name,
+            "last_name": sender.last_name,
+            "user_type": sender.user_type,
+        },
+        "content": post.content,
+        "file": post.file.name or None,
+        "image": post.image.name or None,
+        "created_at": post.created_at.isoformat(),
+        "updated_at": post.created_at.isoformat(),
+        "comments": [],
+        "comment_count": 0,
+        "reaction_counts": [],
+        "user_reaction": None,
+        "seen_by": [],
+        "view_count": 0,
+    }
+
+
+class PostWriter:
+    """Batches the posts of one event loop, see get_post_writer"""
+
+    def __init__(self, config=None):
+        self.config = config or get_writer_settings()
+        # (post, client_id, channel layer, group)
+        self.pending = []
+        self.task = None
+
+    def is_full(self):
+        return len(self.pending) >= self.config["MAX_QUEUE"]
+
+    def submit(self, post, client_id, channel_layer, group):
+        """Queue ``post`` for the next write, chat_posts_saved is then sent to ``group``"""
+        self.pending.append((post, client_id, channel_layer, group))
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        # Stops once everything is written, the next submit starts it again
+        while self.pending:
+            await asyncio.sleep(self.config["TICK"])
+            while self.pending:
+                batch = self.pending[:self.config["BATCH_SIZE"]]
+                self.pending = self.pending[self.config["BATCH_SIZE"]:]
+                await self.write(batch)
+
+    async def write(self, batch):
+        posts = [post for post, _, _, _ in batch]
+        try:
+            await database_sync_to_async(Post.objects.bulk_create)(posts)
+        except Exception as e:
+            logger.exception(f"Could not write {len(posts)} chat posts: {str(e)}")
+            await self.announce(batch, "chat_posts_failed", lambda post, client_id: {"client_id": client_id})
+            return
+        await self.announce(batch, "chat_posts_saved", lambda post, client_id: {
+            "client_id": client_id,
+            "id": post.id,
+            "created_at": post.created_at.isoformat(),
+        })
+
+    async def announce(self, batch, event_type, describe):
+        """One event per group for the whole batch"""
+        groups = {}
+        for post, client_id, channel_layer, group in batch:
+            groups.setdefault((channel_layer, group), []).append(describe(post, client_id))
+        for (channel_layer, group), posts in groups.items():
+            try:
+                await channel_layer.group_send(group, {"type": event_type, "posts": posts})
+            except Exception as e:
+                logger.warning(f"Could not announce {len(posts)} chat posts to {group}: {str(e)}")
+
+
+def get_post_writer():
+    """Writer of the running event loop"""
+    loop = asyncio.get_running_loop()
+    writer = _writers.get(loop)
+    if writer is None:
+        for other in [other for other in _writers if other.is_closed()]:
+            del _writers[other]
+        writer = _writers[loop] = PostWriter()
+    return writer
+
+
+def new_chat_post(forum_id, sender, content, image=None, file=None):
+    """Unsaved post of a chat message, created_at is set for the broadcast (the INSERT sets it again)"""
+    return Post(
+        forum_id=forum_id,
+        sender=sender,
+        content=content,
+        image=image,
+        file=file,
+        created_at=timezone.now(),
+    )
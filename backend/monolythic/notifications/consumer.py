@@ -62,4 +62,11 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             'message': event['message'],
             'notification_type': event['notification_type'],
             'created_at': event['created_at']
-        }))
\ No newline at end of file
+        }))
+
+    async def payment_status(self, event):
+        # Status changes of the user's payments (see payments/status.py)
+        await self.send(text_data=json.dumps({
+            'type': 'payment_status',
+            'payment': event['payment']
+        }))
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils.timezone import localtime
+
+from .models import Notification
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+# Notifications sent to many users (e.g. every admin) are written with
+# bulk_create by a Celery task, which then pushes the WebSocket events in
+# batches: the group_send calls of a batch are awaited together, so a batch
+# costs about one round trip to the channel layer instead of one per user.
+DEFAULTS = {
+    "BATCH_SIZE": 500,  # notifications per INSERT
+    "DELIVERY_BATCH_SIZE": 100,  # WebSocket events sent concurrently
+}
+
+
+def get_fanout_settings():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "NOTIFICATION_FANOUT", {}))
+    return config
+
+
+def notification_event(notification):
+    """The notifications WebSocket event of ``notification``"""
+    return {
+        'type': 'notification',
+        'notification_id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        'notification_type': notification.notification_type,
+        'created_at': localtime(notification.created_at).isoformat()
+    }
+
+
+def create_notifications(user_ids, title, message, notification_type, batch_size=None):
+    """One notification per user, written in batches (no post_save signal)"""
+    batch_size = batch_size or get_fanout_settings()["BATCH_SIZE"]
+    notifications = [
+        Notification(user_id=user_id, title=title, message=message, notification_type=notification_type)
+        for user_id in user_ids
+    ]
+    return Notification.objects.bulk_create(notifications, batch_size=batch_size)
+
+
+async def send_events(channel_layer, events):
+    """Send (group, event) pairs concurrently, returns the number of failed sends"""
+    results = await asyncio.gather(
+        *(channel_layer.group_send(group, event) for group, event in events),
+        return_exceptions=True
+    )
+    return sum(1 for result in results if isinstance(result, Exception))
+
+
+def deliver_notifications(notifications, batch_size=None):
+    """Push ``notifications`` to their users' WebSocket groups, returns the number delivered"""
+    batch_size = batch_size or get_fanout_settings()["DELIVERY_BATCH_SIZE"]
+    channel_layer = get_channel_layer()
+    events = [
+        (f"user_notifications_{notification.user_id}", notification_event(notification))
+        for notification in notifications
+    ]
+    delivered = 0
+    for start in range(0, len(events), batch_size):
+        batch = events[start:start + batch_size]
+        failed = async_to_sync(send_events)(channel_layer, batch)
+        if failed:
+            logger.warning(f"{failed} of {len(batch)} notification events could not be sent")
+        delivered += len(batch) - failed
+    return delivered
+
+
+def fan_out(user_ids, title, message, notification_type):
+    """Create the notifications of ``user_ids`` and push them, returns (created, delivered)"""
+    notifications = create_notifications(user_ids, title, message, notification_type)
+    return len(notifications), deliver_notifications(notifications)
+
+
+def staff_user_ids():
+    return list(User.objects.filter(is_staff=True).values_list('id', flat=True))
+
+
+def notify_staff(title, message, notification_type):
+    """Notify every admin from a task, once the current transaction commits"""
+    from .tasks.fanout import fan_out_notification
+
+    transaction.on_commit(lambda: fan_out_notification.delay(title, message, notification_type))
@@ -3,11 +3,11 @@ from django.dispatch import receiver
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 import json
-from django.utils.timezone import localtime
 
 from payments.models import Subscription
 from courses.models import CourseDeclaration, CourseOfferingAction
 from .models import Notification
+from .fanout import notification_event, notify_staff
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -17,15 +17,8 @@ def send_notification_to_websocket(notification):
     channel_layer = get_channel_layer()
     # Send to the user's notification group
     async_to_sync(channel_layer.group_send)(
-        f"user_notifications_{notification.user.id}",
-        {
-            'type': 'notification',
-            'notification_id': notification.id,
-            'title': notification.title,
-            'message': notification.message,
-            'notification_type': notification.notification_type,
-            'created_at': localtime(notification.created_at).isoformat()
-        }
+        f"user_notifications_{notification.user_id}",
+        notification_event(notification)
     )
 
 @receiver(post_save, sender=Notification)
@@ -60,17 +53,12 @@ def create_course_declaration_notification(sender, instance, created, **kwargs):
     
     # Notification for when a new declaration is created - notify all admins
     if created:
-        # Get all admin users
-        admin_users = User.objects.filter(is_staff=True)
-        
-        # Create a notification for each admin
-        for admin in admin_users:
-            Notification.objects.create(
-                user=admin,
-                title="Nouvelle Déclaration de Cours",
-                message=f"Une nouvelle déclaration de cours a été soumise par {enrollment.teacher.get_full_name()} pour {enrollment.offer.subject.name} avec {enrollment.offer.student.get_full_name()}. Durée: {instance.duration} minutes. Date: {instance.declaration_date}",
-                notification_type='COURSE',
-            )
+        # Every admin is notified in bulk by a task
+        notify_staff(
+            title="Nouvelle Déclaration de Cours",
+            message=f"Une nouvelle déclaration de cours a été soumise par {enrollment.teacher.get_full_name()} pour {enrollment.offer.subject.name} avec {enrollment.offer.student.get_full_name()}. Durée: {instance.duration} minutes. Date: {instance.declaration_date}",
+            notification_type='COURSE',
+        )
         return
     
     # Notification for when declaration is paid
@@ -122,17 +110,12 @@ def notify_admins_of_new_user(sender, instance, created, **kwargs):
     Create notifications for all admin users when a new user registers.
     """
     if created:  # Only trigger when a new user is created, not on updates
-        # Get all admin users
-        admin_users = User.objects.filter(is_staff=True)
-        
-        # Create a notification for each admin
-        for admin in admin_users:
-            Notification.objects.create(
-                user=admin,
-                title="Nouvel Utilisateur Inscrit",
-                message=f"Un nouvel utilisateur '{instance.get_full_name()}' ({instance.email}) s'est inscrit. Type d'utilisateur: {instance.user_type}.",
-                notification_type='SYSTEM',
-            )
+        # Every admin is notified in bulk by a task
+        notify_staff(
+            title="Nouvel Utilisateur Inscrit",
+            message=f"Un nouvel utilisateur '{instance.get_full_name()}' ({instance.email}) s'est inscrit. Type d'utilisateur: {instance.user_type}.",
+            notification_type='SYSTEM',
+        )
 
 from django.core.mail import send_mail
 from django.conf import settings
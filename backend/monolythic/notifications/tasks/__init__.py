@@ -0,0 +1,4 @@
+# Make sure the tasks are registered when the 'tasks' package is imported
+from .fanout import fan_out_notification
+
+__all__ = ['fan_out_notification']
@@ -0,0 +1,28 @@
+import logging
+from celery import shared_task
+from ..fanout import fan_out, staff_user_ids
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def fan_out_notification(title, message, notification_type, user_ids=None):
+    """
+    Create a notification for each of ``user_ids`` (every admin by default)
+    in bulk and push them to the notifications WebSockets in batches.
+    """
+    try:
+        if user_ids is None:
+            user_ids = staff_user_ids()
+        created, delivered = fan_out(user_ids, title, message, notification_type)
+        logger.info(f"Fanned out notification '{title}' to {created} users ({delivered} delivered)")
+        return {
+            'status': 'success',
+            'created': created,
+            'delivered': delivered
+        }
+    except Exception as e:
+        logger.exception(f"Error fanning out notification '{title}': {str(e)}")
+        return {
+            'status': 'error',
+            'message': f'Error fanning out notification: {str(e)}'
+        }
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SubscriptionPlan, Subscription, Payment, Transaction, PaymentReference
+from .models import SubscriptionPlan, Subscription, Payment, Transaction, PaymentReference, WebhookEvent
 
 @admin.register(SubscriptionPlan)
 class SubscriptionPlanAdmin(admin.ModelAdmin):
@@ -101,3 +101,10 @@ class PaymentReferenceAdmin(admin.ModelAdmin):
                      'user__username', 'user__email')
     readonly_fields = ('created_at',)
     raw_id_fields = ('user', 'plan')
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('provider', 'reference', 'event_status', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('provider', 'status', 'event_status')
+    search_fields = ('reference', 'message')
+    readonly_fields = ('received_at', 'processed_at')
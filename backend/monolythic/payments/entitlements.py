@@ -0,0 +1,140 @@
+import logging
+
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Subscription
+
+logger = logging.getLogger(__name__)
+
+# The active plan of each user is kept in Redis until its subscription ends
+# (at most ENTITLEMENT_MAX_TIMEOUT), users without one for
+# NO_ENTITLEMENT_TIMEOUT. Subscription signals drop the entry of their user,
+# so premium checks and subscription badges do not query the subscriptions
+# table on every request.
+ENTITLEMENT_MAX_TIMEOUT = 60 * 60 * 24
+NO_ENTITLEMENT_TIMEOUT = 60 * 60
+# Cached for users without an active subscription, unlike None (cache miss)
+NO_ENTITLEMENT = {}
+
+
+def entitlement_cache_key(user_id):
+    return f"payments:entitlement:{user_id}"
+
+
+def active_subscriptions(now=None):
+    """Subscriptions currently giving access to their plan"""
+    return Subscription.objects.filter(is_active=True, end_date__gt=now or timezone.now())
+
+
+def build_entitlement(subscription):
+    return {
+        'subscription_id': subscription.pk,
+        'plan_id': subscription.plan_id,
+        'plan': subscription.plan.name,
+        'end_date': subscription.end_date.isoformat(),
+    }
+
+
+def entitlement_timeout(entitlement, now):
+    if not entitlement:
+        return NO_ENTITLEMENT_TIMEOUT
+    remaining = (parse_datetime(entitlement['end_date']) - now).total_seconds()
+    return max(1, min(int(remaining), ENTITLEMENT_MAX_TIMEOUT))
+
+
+def is_current(entitlement, now):
+    return bool(entitlement) and parse_datetime(entitlement['end_date']) > now
+
+
+def load_entitlements(user_ids, now):
+    """Latest active subscription of each user, one query for all of them"""
+    entitlements = {str(user_id): NO_ENTITLEMENT for user_id in user_ids}
+    subscriptions = (
+        active_subscriptions(now)
+        .filter(user_id__in=user_ids)
+        .select_related('plan')
+        .order_by('user_id', '-start_date')
+    )
+    for subscription in subscriptions:
+        if not entitlements[str(subscription.user_id)]:
+            entitlements[str(subscription.user_id)] = build_entitlement(subscription)
+    return entitlements
+
+
+def get_entitlements(user_ids):
+    """
+    Active plan of many users at once: {user_id: entitlement or None}, with
+    one cache round trip and at most one query for the users not cached.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+    now = timezone.now()
+    keys = {entitlement_cache_key(user_id): str(user_id) for user_id in user_ids}
+    try:
+        cached = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+    except Exception as e:
+        logger.warning(f"Entitlement cache unavailable: {str(e)}")
+        cached = {}
+
+    missing = [user_id for user_id in user_ids if str(user_id) not in cached]
+    if missing:
+        loaded = load_entitlements(missing, now)
+        try:
+            cache.set_many(
+                {entitlement_cache_key(user_id): NO_ENTITLEMENT for user_id, value in loaded.items() if not value},
+                timeout=NO_ENTITLEMENT_TIMEOUT
+            )
+            for user_id, entitlement in loaded.items():
+                if entitlement:
+                    cache.set(entitlement_cache_key(user_id), entitlement, timeout=entitlement_timeout(entitlement, now))
+        except Exception as e:
+            logger.warning(f"Entitlement cache unavailable: {str(e)}")
+        cached.update(loaded)
+
+    return {
+        user_id: cached[str(user_id)] if is_current(cached[str(user_id)], now) else None
+        for user_id in user_ids
+    }
+
+
+def get_entitlement(user_id):
+    """Active plan of a user ({subscription_id, plan_id, plan, end_date}) or None"""
+    return get_entitlements([user_id])[user_id]
+
+
+def has_active_subscription(user_id):
+    return get_entitlement(user_id) is not None
+
+
+def subscription_status(entitlement):
+    """The subscription badge of a user"""
+    if not entitlement:
+        return {'active': False}
+    return {'active': True, 'plan': entitlement['plan'], 'expires_at': entitlement['end_date']}
+
+
+def prefetch_entitlements(users):
+    """Load the entitlements of ``users`` in one go for their subscription_status"""
+    users = [user for user in users if user is not None and not hasattr(user, '_entitlement')]
+    entitlements = get_entitlements([user.pk for user in users])
+    for user in users:
+        user._entitlement = entitlements.get(user.pk)
+
+
+def invalidate_entitlement(user_id):
+    """
+    Drop the cached plan of a user, now and once the current transaction
+    commits, so that a concurrent read can not cache the old state again.
+    """
+    def delete():
+        try:
+            cache.delete(entitlement_cache_key(user_id))
+        except Exception as e:
+            logger.warning(f"Entitlement cache unavailable: {str(e)}")
+
+    delete()
+    db_transaction.on_commit(delete)
@@ -0,0 +1,124 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+
+from .models import PaymentReference, Transaction
+from .providers import get_campay_manager, get_freemopay_manager
+from .status import ERROR, PENDING, QUEUED, set_payment_status
+from .webhooks import CAMPAY, FREEMOPAY
+
+logger = logging.getLogger(__name__)
+
+# Asynchronous payment initiation: the view only writes the PaymentReference
+# and the PENDING Transaction and answers 202, the provider call is made by
+# the initiate_payment task and its outcome lands in the payment status.
+
+
+def async_initiation_requested(data):
+    """Whether the payment creation request asked for (or defaults to) asynchronous initiation"""
+    value = data.get('async', getattr(settings, 'PAYMENT_ASYNC_INITIATION', False))
+    if isinstance(value, str):
+        return value.lower() in ['1', 'true', 'yes']
+    return bool(value)
+
+
+def queue_initiation(payment_reference, transaction, options):
+    """Record the QUEUED status and start the provider call once the rows are committed"""
+    from .tasks.initiation import initiate_payment
+
+    status = set_payment_status(
+        payment_reference.internal_reference,
+        payment_reference.user_id,
+        provider=payment_reference.provider,
+        amount=str(payment_reference.amount),
+        status=QUEUED,
+        provider_reference=str(transaction.reference) if payment_reference.provider == CAMPAY else '',
+        message='',
+    )
+    db_transaction.on_commit(
+        lambda: initiate_payment.delay(payment_reference.provider, payment_reference.internal_reference, options)
+    )
+    return status
+
+
+def abandon_initiation(payment_reference, message):
+    """The provider refused the payment: forget it like the synchronous views do"""
+    Transaction.objects.filter(external_reference=payment_reference.internal_reference, status='PENDING').delete()
+    payment_reference.delete()
+    return set_payment_status(
+        payment_reference.internal_reference,
+        payment_reference.user_id,
+        status=ERROR,
+        message=message,
+    )
+
+
+def initiate_campay_payment(payment_reference, options):
+    user = payment_reference.user
+    try:
+        payment_link = get_campay_manager().create_payment_link(
+            amount=str(payment_reference.amount),
+            description=options['description'],
+            external_reference=str(payment_reference.external_reference),
+            redirect_url=options['success_url'],
+            failure_redirect_url=options['failure_url'],
+            first_name=user.first_name,
+            last_name=user.last_name,
+            email=user.email,
+            phone=payment_reference.phone_number
+        )
+        if payment_link.get('status') == 'FAILED' or not payment_link.get('link'):
+            raise Exception(payment_link.get('message') or 'Error creating payment link')
+    except Exception as e:
+        return abandon_initiation(payment_reference, f"Payment service error: {str(e)}")
+    return set_payment_status(
+        payment_reference.internal_reference,
+        payment_reference.user_id,
+        status=PENDING,
+        payment_link=payment_link['link'],
+        success_url=options['success_url'],
+        failure_url=options['failure_url'],
+    )
+
+
+def initiate_freemopay_payment(payment_reference, options):
+    try:
+        payment_response = get_freemopay_manager().init_payment(
+            payer=payment_reference.phone_number,
+            amount=str(payment_reference.amount),
+            external_id=payment_reference.internal_reference,
+            description=options['description'],
+            callback=options['callback_url'],
+            use_token=False
+        )
+    except Exception as e:
+        return abandon_initiation(payment_reference, f"Payment service error: {str(e)}")
+    reference = str(payment_response.get('reference', ''))
+    # The provider reference is what the status checks and the retries look the payment up by
+    Transaction.objects.filter(
+        external_reference=payment_reference.internal_reference, provider=FREEMOPAY
+    ).update(operator_reference=reference)
+    return set_payment_status(
+        payment_reference.internal_reference,
+        payment_reference.user_id,
+        status=PENDING,
+        provider_reference=reference,
+        message=payment_response.get('message', ''),
+    )
+
+
+INITIATE = {
+    CAMPAY: initiate_campay_payment,
+    FREEMOPAY: initiate_freemopay_payment,
+}
+
+
+def initiate(provider, internal_reference, options):
+    """Make the provider call of a queued payment, returns its payment status"""
+    payment_reference = PaymentReference.objects.select_related('user').filter(
+        internal_reference=internal_reference
+    ).first()
+    if payment_reference is None:
+        return None
+    return INITIATE[provider](payment_reference, options)
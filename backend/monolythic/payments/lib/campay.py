@@ -8,7 +8,8 @@ class CamPayManager:
     A class to manage CamPay payment operations efficiently.
     """
     
-    def __init__(self, app_username: str, app_password: str, environment: str = "DEV"):
+    def __init__(self, app_username: str, app_password: str, environment: str = "DEV",
+                 client: Optional[CamPayClient] = None):
         """
         Initialize the CamPay manager.
         
@@ -16,11 +17,12 @@ class CamPayManager:
             app_username (str): CamPay application username
             app_password (str): CamPay application password
             environment (str): Either 'DEV' for testing or 'PROD' for production
+            client (CamPayClient): Preconfigured SDK client (built from the credentials by default)
         """
         if environment not in ["DEV", "PROD"]:
             raise ValueError("Environment must be either 'DEV' or 'PROD'")
             
-        self.client = CamPayClient({
+        self.client = client or CamPayClient({
             "app_username": app_username,
             "app_password": app_password,
             "environment": environment
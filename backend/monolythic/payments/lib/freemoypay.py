@@ -10,7 +10,8 @@ class FreemoPayManager:
     A class to manage FreemoPay API v2 payment operations efficiently.
     """
     
-    def __init__(self, app_key: str, secret_key: str, base_url: str = "https://api-v2.freemopay.com"):
+    def __init__(self, app_key: str, secret_key: str, base_url: str = "https://api-v2.freemopay.com",
+                 session: Optional[requests.Session] = None, timeout: Optional[Union[float, tuple]] = None):
         """
         Initialize the FreemoPay manager.
         
@@ -18,10 +19,14 @@ class FreemoPayManager:
             app_key (str): FreemoPay application key (username for basic auth)
             secret_key (str): FreemoPay secret key (password for basic auth)
             base_url (str): Base URL for FreemoPay API
+            session (requests.Session): Shared session to reuse connections (a new one by default)
+            timeout: Request timeout in seconds, or a (connect, read) tuple
         """
         self.app_key = app_key
         self.secret_key = secret_key
         self.base_url = base_url.rstrip('/')
+        self.session = session or requests.Session()
+        self.timeout = timeout
         self.token = None
         self.token_expires_at = None
         
@@ -85,7 +90,7 @@ class FreemoPayManager:
         headers = self._get_basic_auth_headers()
         
         try:
-            response = requests.post(url, headers=headers)
+            response = self.session.post(url, headers=headers, timeout=self.timeout)
             response.raise_for_status()
             
             data = response.json()
@@ -148,7 +153,7 @@ class FreemoPayManager:
         }
 
         try:
-            response = requests.post(url, headers=headers, json=payload)
+            response = self.session.post(url, headers=headers, json=payload, timeout=self.timeout)
             
             # Handle rate limiting
             if response.status_code == 429:
@@ -189,7 +194,7 @@ class FreemoPayManager:
         headers = self._get_bearer_auth_headers() if use_token else self._get_basic_auth_headers()
 
         try:
-            response = requests.get(url, headers=headers)
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
             
             # Handle rate limiting
             if response.status_code == 429:
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from payments.providers import LATENCY_BUCKETS, get_provider_metrics
+from payments.webhooks import CAMPAY, FREEMOPAY
+
+class Command(BaseCommand):
+    help = 'Shows the latency of the calls made to the payment providers'
+
+    def handle(self, *args, **options):
+        try:
+            for provider in [CAMPAY, FREEMOPAY]:
+                metrics = get_provider_metrics(provider)
+                self.stdout.write(f'{provider}:' if metrics else f'{provider}: no calls recorded')
+                for operation, stats in sorted(metrics.items()):
+                    buckets = ', '.join(
+                        f'<={limit}ms: {stats["buckets"][str(limit)]}'
+                        for limit in [*LATENCY_BUCKETS, 'inf'] if str(limit) in stats['buckets']
+                    )
+                    self.stdout.write(
+                        f'  {operation}: {stats["calls"]} calls, {stats["errors"]} errors, '
+                        f'avg {stats["avg_ms"]}ms ({buckets})'
+                    )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'Failed to read the provider metrics: {str(e)}')
+            )
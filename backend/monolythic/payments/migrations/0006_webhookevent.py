@@ -0,0 +1,33 @@
+# Generated by Django 5.1.12 on 2026-10-18 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_alter_transaction_endpoint_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=50)),
+                ('reference', models.CharField(max_length=255)),
+                ('event_status', models.CharField(max_length=20)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('RECEIVED', 'Received'), ('PROCESSED', 'Processed'), ('FAILED', 'Failed')], default='RECEIVED', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('message', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-received_at'],
+                'indexes': [models.Index(fields=['status', 'received_at'], name='payments_we_status_4e31df_idx')],
+                'constraints': [models.UniqueConstraint(fields=('provider', 'reference', 'event_status'), name='unique_webhook_event')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.12 on 2026-10-18 03:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_webhookevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='last_retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='next_retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='retry_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.12 on 2026-10-18 03:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_transaction_last_retry_at_transaction_next_retry_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['status', 'created_at'], name='payments_tx_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.12 on 2026-10-18 03:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_transaction_payments_tx_pending_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'is_active', 'end_date'], name='payments_sub_active_idx'),
+        ),
+    ]
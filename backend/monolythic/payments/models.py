@@ -59,19 +59,19 @@ class Subscription(models.Model):
     
     @classmethod
     def has_active_subscription(cls, user):
-        """Check if user has any active subscription"""
-        now = timezone.now()
-        return cls.objects.filter(
-            user=user,
-            is_active=True,
-            end_date__gt=now
-        ).exists()
+        """Check if user has any active subscription (cached, see payments/entitlements.py)"""
+        from .entitlements import has_active_subscription
+        return has_active_subscription(user.pk)
     
     def __str__(self):
         return f'{self.user.email} - {self.plan.name} ({self.status})'
 
     class Meta:
         ordering = ['-created_at']  # Add default ordering
+        indexes = [
+            # Active subscription lookups of the entitlement service
+            models.Index(fields=['user', 'is_active', 'end_date'], name='payments_sub_active_idx'),
+        ]
 
 class Payment(models.Model):
     PAYMENT_METHODS = [
@@ -174,6 +174,11 @@ class Transaction(models.Model):
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    # Retries of failed payments (see payments/retry.py)
+    retry_count = models.PositiveIntegerField(default=0)
+    next_retry_at = models.DateTimeField(null=True, blank=True)
+    last_retry_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-created_at']
@@ -183,6 +188,12 @@ class Transaction(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['endpoint']),
             models.Index(fields=['created_at']),
+            # Only the few PENDING rows, for the stalled transaction sweeper
+            models.Index(
+                fields=['status', 'created_at'],
+                name='payments_tx_pending_idx',
+                condition=models.Q(status='PENDING'),
+            ),
         ]
 
     def __str__(self):
@@ -252,4 +263,41 @@ class PaymentReference(models.Model):
             try:
                 return cls.objects.get(internal_reference=reference)
             except cls.DoesNotExist:
-                return None
\ No newline at end of file
+                return None
+
+class WebhookEvent(models.Model):
+    """
+    Raw payment provider callbacks, stored before they are processed.
+    Callbacks repeating the same (provider, reference, status) are the same
+    event: providers retry them, they are only applied once.
+    """
+    EVENT_STATUS = [
+        ('RECEIVED', 'Received'),
+        ('PROCESSED', 'Processed'),
+        ('FAILED', 'Failed'),
+    ]
+
+    provider = models.CharField(max_length=50)
+    reference = models.CharField(max_length=255)  # The provider's transaction reference
+    event_status = models.CharField(max_length=20)  # Payment status announced by the callback
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=EVENT_STATUS, default='RECEIVED')
+    attempts = models.PositiveIntegerField(default=0)
+    message = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-received_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['provider', 'reference', 'event_status'],
+                name='unique_webhook_event',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'received_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.reference} {self.event_status} ({self.status})"
@@ -0,0 +1,298 @@
+import logging
+import os
+import re
+import threading
+import time
+
+import requests
+from campay.sdk import Client as CamPayClient
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .lib import CamPayManager, FreemoPayManager
+from .webhooks import CAMPAY, FREEMOPAY
+
+logger = logging.getLogger(__name__)
+
+# Every process keeps one pooled requests.Session per provider, so calls
+# reuse open connections instead of a new TCP/TLS handshake each time.
+# The CamPay token is shared by every worker through the cache: only one
+# worker refreshes an expiring token while the others wait for it. FreemoPay
+# calls use basic auth, which needs no token.
+DEFAULTS = {
+    "POOL_CONNECTIONS": 4,
+    "POOL_MAXSIZE": 20,
+    "CONNECT_TIMEOUT": 5,
+    "READ_TIMEOUT": 30,
+    # Only connection errors and idempotent requests are retried, never a payment initiation
+    "RETRIES": 2,
+    "BACKOFF_FACTOR": 0.5,
+    "VERIFY_SSL": True,
+    "TOKEN_TTL": 60 * 60,
+    # Tokens are refreshed this many seconds before they expire
+    "TOKEN_REFRESH_MARGIN": 60 * 5,
+    "TOKEN_LOCK_TIMEOUT": 30,
+    "TOKEN_WAIT": 10,
+    "SLOW_CALL": 5,
+}
+TOKEN_PREFIX = "payments:providers:token:"
+METRICS_PREFIX = "payments:providers:metrics:"
+LATENCY_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000)
+
+_session_lock = threading.Lock()
+_sessions = {}
+
+
+def get_provider_settings():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "PAYMENT_PROVIDERS", {}))
+    return config
+
+
+def operation_name(method, url):
+    """'GET /api/v2/payment/{id}' like name of a provider call, references are folded"""
+    path = requests.utils.urlparse(url).path
+    segments = [
+        '{id}' if re.search(r'\d', segment) and not re.fullmatch(r'v\d+', segment) else segment
+        for segment in path.split('/')
+    ]
+    return f"{method.upper()} {'/'.join(segments)}"
+
+
+def record_call(provider, operation, elapsed, ok):
+    """Add a provider call to its latency metrics, never fails the call itself"""
+    milliseconds = elapsed * 1000
+    bucket = next((f"le_{limit}" for limit in LATENCY_BUCKETS if milliseconds <= limit), "le_inf")
+    try:
+        pipe = get_redis_connection("default").pipeline()
+        key = f"{METRICS_PREFIX}{provider}"
+        pipe.hincrby(key, f"{operation}|calls", 1)
+        pipe.hincrbyfloat(key, f"{operation}|ms", round(milliseconds, 3))
+        pipe.hincrby(key, f"{operation}|{bucket}", 1)
+        if not ok:
+            pipe.hincrby(key, f"{operation}|errors", 1)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Provider metrics unavailable: {str(e)}")
+    if elapsed >= get_provider_settings()["SLOW_CALL"]:
+        logger.warning(f"Slow {provider} call {operation}: {milliseconds:.0f}ms")
+
+
+def get_provider_metrics(provider):
+    """Calls, errors, average latency and latency histogram per operation of ``provider``"""
+    raw = get_redis_connection("default").hgetall(f"{METRICS_PREFIX}{provider}")
+    metrics = {}
+    for field, value in raw.items():
+        operation, name = field.decode().rsplit('|', 1)
+        stats = metrics.setdefault(operation, {'calls': 0, 'errors': 0, 'ms': 0.0, 'buckets': {}})
+        if name.startswith('le_'):
+            stats['buckets'][name[3:]] = int(value)
+        else:
+            stats[name] = float(value) if name == 'ms' else int(value)
+    for stats in metrics.values():
+        stats['avg_ms'] = round(stats.pop('ms') / stats['calls'], 1) if stats['calls'] else 0
+    return metrics
+
+
+class ProviderSession(requests.Session):
+    """Session with default timeouts that records the latency of every call"""
+
+    def __init__(self, provider, timeout):
+        super().__init__()
+        self.provider = provider
+        self.timeout = timeout
+
+    def request(self, method, url, *args, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = super().request(method, url, *args, **kwargs)
+            ok = response.status_code < 500
+            return response
+        finally:
+            record_call(self.provider, operation_name(method, url), time.perf_counter() - started, ok)
+
+
+def build_session(provider, config):
+    session = ProviderSession(provider, (config["CONNECT_TIMEOUT"], config["READ_TIMEOUT"]))
+    retries = Retry(
+        total=config["RETRIES"],
+        connect=config["RETRIES"],
+        read=config["RETRIES"],
+        status=config["RETRIES"],
+        backoff_factor=config["BACKOFF_FACTOR"],
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config["POOL_CONNECTIONS"],
+        pool_maxsize=config["POOL_MAXSIZE"],
+        max_retries=retries,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.verify = config["VERIFY_SSL"]
+    return session
+
+
+def get_session(provider):
+    """
+    Process wide session of ``provider``. Sessions are only rebuilt after a
+    fork, so pooled connections are never shared between processes.
+    """
+    key = (os.getpid(), provider)
+    session = _sessions.get(key)
+    if session is None:
+        with _session_lock:
+            session = _sessions.get(key)
+            if session is None:
+                if any(pid != key[0] for pid, _ in _sessions):
+                    _sessions.clear()
+                session = build_session(provider, get_provider_settings())
+                _sessions[key] = session
+    return session
+
+
+def get_token(provider, fetch):
+    """
+    Cached token of ``provider``. ``fetch`` returns (token, expires_in) and is
+    only called by the worker holding the refresh lock; the others wait for
+    the new token, or fetch their own once TOKEN_WAIT has passed.
+    """
+    config = get_provider_settings()
+    key = f"{TOKEN_PREFIX}{provider}"
+    token = cache.get(key)
+    if token:
+        return token
+
+    lock_key = f"{key}:lock"
+    deadline = time.monotonic() + config["TOKEN_WAIT"]
+    while True:
+        if cache.add(lock_key, 1, timeout=config["TOKEN_LOCK_TIMEOUT"]):
+            try:
+                # The previous lock holder may have just stored it
+                token = cache.get(key)
+                if token:
+                    return token
+                token, expires_in = fetch()
+                timeout = (expires_in or config["TOKEN_TTL"]) - config["TOKEN_REFRESH_MARGIN"]
+                cache.set(key, token, timeout=max(timeout, 1))
+                logger.info(f"Refreshed {provider} token, cached for {max(timeout, 1)}s")
+                return token
+            finally:
+                cache.delete(lock_key)
+        time.sleep(0.1)
+        token = cache.get(key)
+        if token:
+            return token
+        if time.monotonic() >= deadline:
+            logger.warning(f"Timed out waiting for the {provider} token refresh")
+            return fetch()[0]
+
+
+def invalidate_token(provider):
+    """Drop a token the provider rejected, the next call fetches a new one"""
+    cache.delete(f"{TOKEN_PREFIX}{provider}")
+
+
+class PooledCamPayClient(CamPayClient):
+    """
+    CamPay SDK client on the pooled session, with the shared token. The SDK
+    requests a new token for every call and uses bare requests; the calls this
+    app makes (payment links and transaction status) are sent through the
+    session, the other SDK calls still benefit from the shared token.
+    """
+
+    def __init__(self, kwargs, session):
+        super().__init__(kwargs)
+        self.session = session
+
+    def _fetch_token(self):
+        response = self.session.post(
+            self.host + '/api/token/',
+            json={"username": self.app_username, "password": self.app_password},
+        )
+        data = response.json()
+        if response.status_code != 200 or not data.get('token'):
+            raise Exception(data.get('message') or data.get('detail') or 'CamPay token request failed')
+        return data['token'], data.get('expires_in')
+
+    def get_token(self):
+        try:
+            return {"token": get_token(CAMPAY, self._fetch_token), "is_successful": True}
+        except Exception as e:
+            logger.error(f"Error getting CamPay token: {str(e)}")
+            return {"token": None, "is_successful": False}
+
+    def _send(self, method, path, **kwargs):
+        """Authenticated call, retried once with a new token when the cached one is rejected"""
+        for attempt in range(2):
+            token = self.get_token()["token"]
+            if not token:
+                return None
+            headers = {'Authorization': 'Token ' + token, 'Content-Type': 'application/json'}
+            response = self.session.request(method, self.host + path, headers=headers, **kwargs)
+            if response.status_code != 401 or attempt:
+                return response
+            invalidate_token(CAMPAY)
+
+    def get_payment_link(self, values):
+        fields = [
+            "amount", "currency", "description", "external_reference", "redirect_url", "from",
+            "first_name", "last_name", "email", "failure_redirect_url", "payment_options",
+        ]
+        try:
+            response = self._send('POST', '/api/get_payment_link/', json={field: str(values[field]) for field in fields})
+            if response is None:
+                return {"status": "FAILED", "message": "Token error. Please check your App Username and Pass password. Also check your environment"}
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Error getting CamPay payment link: {str(e)}")
+            return {"status": "FAILED", "message": "Collect error"}
+        if response.status_code == 200:
+            return {"status": "SUCCESSFUL", "link": data['link']}
+        return {"status": "FAILED", "message": data.get("message")}
+
+    def get_transaction_status(self, values):
+        reference = values.get("reference")
+        if not reference:
+            return {"status": "", "message": "Transaction Reference is required"}
+        try:
+            response = self._send('GET', f"/api/transaction/{reference}/")
+            if response is None:
+                return {"status": "", "message": "Token error. Please check your App Username and Pass password. Also check your environment"}
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Error getting CamPay transaction status: {str(e)}")
+            return {"status": "", "message": "Request error"}
+
+
+def get_campay_manager():
+    credentials = {
+        "app_username": settings.CAMPAY_APP_USERNAME,
+        "app_password": settings.CAMPAY_APP_PASSWORD,
+        "environment": settings.CAMPAY_ENVIRONMENT,
+    }
+    return CamPayManager(
+        app_username=settings.CAMPAY_APP_USERNAME,
+        app_password=settings.CAMPAY_APP_PASSWORD,
+        environment=settings.CAMPAY_ENVIRONMENT,
+        client=PooledCamPayClient(credentials, get_session(CAMPAY))
+    )
+
+
+def get_freemopay_manager():
+    session = get_session(FREEMOPAY)
+    return FreemoPayManager(
+        app_key=settings.FREEMOPAY_APP_KEY,
+        secret_key=settings.FREEMOPAY_SECRET_KEY,
+        base_url=settings.FREEMOPAY_BASE_URL,
+        session=session,
+        timeout=session.timeout
+    )
@@ -0,0 +1,234 @@
+import logging
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from .models import Transaction, WebhookEvent
+from .providers import get_campay_manager, get_freemopay_manager
+from .status import provider_reference
+from .webhooks import CAMPAY, FREEMOPAY, FREEMOPAY_STATUS, apply_campay_payment, apply_freemopay_payment
+
+logger = logging.getLogger(__name__)
+
+# A FAILED transaction is checked again with its provider's status API; if
+# the provider says the payment went through (its callback was lost or
+# failed), the payment is applied like a callback would. Every attempt
+# pushes next_retry_at back exponentially, which also keeps queued
+# transactions out of the next runs.
+DEFAULTS = {
+    "INTERVAL": 15,
+    "BATCH_SIZE": 50,
+    "MAX_ATTEMPTS": 5,
+    "BASE_DELAY": 60 * 5,
+    "MAX_DELAY": 60 * 60 * 12,
+    "RATE_LIMITS": {CAMPAY: 30, FREEMOPAY: 30},
+}
+LOCK_KEY = "payments:retry:lock"
+REPORT_KEY = "payments:retry:last_report"
+
+RECOVERED = 'recovered'
+STILL_FAILED = 'still_failed'
+UNVERIFIABLE = 'unverifiable'
+SKIPPED = 'skipped'
+ERROR = 'error'
+
+
+def get_retry_settings():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "PAYMENT_RETRY", {}))
+    return config
+
+
+def retry_delay(retry_count, config=None):
+    """Seconds to wait after the ``retry_count``-th attempt"""
+    config = config or get_retry_settings()
+    return min(config["BASE_DELAY"] * 2 ** max(retry_count - 1, 0), config["MAX_DELAY"])
+
+
+def retryable_transactions(provider, now=None, config=None):
+    config = config or get_retry_settings()
+    now = now or timezone.now()
+    return Transaction.objects.filter(
+        Q(next_retry_at__isnull=True) | Q(next_retry_at__lte=now),
+        status='FAILED',
+        provider=provider,
+        retry_count__lt=config["MAX_ATTEMPTS"],
+    )
+
+
+def claim_batch(provider, after, size, now, config):
+    """
+    Lock the next ``size`` retryable transactions after the ``after``
+    (created_at, reference) keyset position and book their attempt. Rows
+    locked by another run are skipped. Returns the claimed transactions.
+    """
+    queryset = retryable_transactions(provider, now, config)
+    if after is not None:
+        created_at, reference = after
+        queryset = queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, reference__gt=reference)
+        )
+    with db_transaction.atomic():
+        batch = list(
+            queryset.select_for_update(skip_locked=True)
+            .order_by('created_at', 'reference')[:size]
+        )
+        for transaction in batch:
+            transaction.retry_count += 1
+            transaction.last_retry_at = now
+            transaction.next_retry_at = now + timezone.timedelta(seconds=retry_delay(transaction.retry_count, config))
+        Transaction.objects.bulk_update(batch, ['retry_count', 'last_retry_at', 'next_retry_at'])
+    return batch
+
+
+def schedule_retries():
+    """
+    Walk the retryable transactions of every provider and queue their checks,
+    one Celery chord per batch, at most RATE_LIMITS[provider] per minute over
+    the run interval. Batch callbacks add their outcomes to the run report.
+    Returns the scheduling report.
+    """
+    from celery import chord
+    from .tasks.process_payments import report_retry_batch, retry_payment_transaction
+
+    config = get_retry_settings()
+    if not cache.add(LOCK_KEY, 1, timeout=config["INTERVAL"] * 60):
+        return {'status': 'skipped', 'message': 'Another retry run is in progress'}
+
+    run_id = uuid.uuid4().hex
+    started = time.time()
+    now = timezone.now()
+    queued = Counter()
+    batches = 0
+    try:
+        for provider, rate in config["RATE_LIMITS"].items():
+            # Checks of a provider are spread over the run interval at ``rate`` per minute
+            budget = rate * config["INTERVAL"]
+            after = None
+            while queued[provider] < budget:
+                batch = claim_batch(provider, after, min(config["BATCH_SIZE"], budget - queued[provider]), now, config)
+                if not batch:
+                    break
+                after = (batch[-1].created_at, batch[-1].reference)
+                signatures = []
+                for transaction in batch:
+                    countdown = queued[provider] * 60.0 / rate
+                    signatures.append(
+                        retry_payment_transaction.signature((str(transaction.reference),), countdown=countdown)
+                    )
+                    queued[provider] += 1
+                chord(signatures)(report_retry_batch.s(run_id, started))
+                batches += 1
+    finally:
+        cache.delete(LOCK_KEY)
+
+    report = {
+        'status': 'success',
+        'run_id': run_id,
+        'queued': dict(queued),
+        'total': sum(queued.values()),
+        'batches': batches,
+        'exhausted': Transaction.objects.filter(status='FAILED', retry_count__gte=config["MAX_ATTEMPTS"]).count(),
+        'scheduling_seconds': round(time.time() - started, 3),
+    }
+    logger.info(f"Payment retry run {run_id}: queued {report['total']} checks in {batches} batches {report['queued']}")
+    return report
+
+
+def fetch_provider_status(transaction):
+    """
+    Payment data from the provider status API in the shape of its callback,
+    None when the provider reference of the transaction is unknown.
+    """
+    if transaction.provider == FREEMOPAY:
+        response = get_freemopay_manager().check_payment_status(provider_reference(transaction))
+        return {
+            'reference': str(transaction.reference),
+            'externalId': transaction.external_reference,
+            'status': response.get('status'),
+            'message': response.get('message', ''),
+            'transactionType': transaction.operator,
+        }
+
+    # CamPay payments are looked up by the CamPay reference, only known from its callbacks
+    campay_reference = (
+        WebhookEvent.objects.filter(provider=CAMPAY, payload__external_reference=str(transaction.reference))
+        .values_list('reference', flat=True)
+        .first()
+    )
+    if not campay_reference:
+        return None
+    webhook_data = dict(get_campay_manager().check_transaction_status(campay_reference))
+    webhook_data.setdefault('external_reference', str(transaction.reference))
+    return webhook_data
+
+
+def recover_payment(transaction):
+    """
+    Ask the provider about ``transaction`` and apply the payment if it went
+    through. Returns (outcome, message).
+    """
+    webhook_data = fetch_provider_status(transaction)
+    if webhook_data is None:
+        return UNVERIFIABLE, 'Provider reference unknown'
+
+    if transaction.provider == FREEMOPAY:
+        if FREEMOPAY_STATUS.get(webhook_data.get('status')) != 'SUCCESSFUL':
+            return STILL_FAILED, f"Provider status: {webhook_data.get('status')}"
+        result = apply_freemopay_payment(webhook_data)
+    else:
+        if webhook_data.get('status') != 'SUCCESSFUL':
+            return STILL_FAILED, f"Provider status: {webhook_data.get('status')}"
+        result = apply_campay_payment(webhook_data)
+    return RECOVERED, result.get('message', '')
+
+
+def retry_transaction(reference):
+    """Check one failed transaction with its provider, returns (outcome, message)"""
+    transaction = Transaction.objects.filter(reference=reference).first()
+    if transaction is None or transaction.status != 'FAILED':
+        return SKIPPED, 'Transaction is no longer failed'
+    return recover_payment(transaction)
+
+
+def record_batch_report(results, run_id, started):
+    """
+    Add the outcomes of a batch to the report of its run and return the
+    updated report: totals per outcome and provider, and throughput since the
+    run started. The latest report is also kept under REPORT_KEY.
+    """
+    outcomes = Counter(result.get('outcome', ERROR) for result in results if isinstance(result, dict))
+    providers = Counter(result.get('provider') for result in results if isinstance(result, dict))
+    key = f"payments:retry:run:{run_id}"
+    connection = get_redis_connection("default")
+    pipe = connection.pipeline()
+    pipe.hincrby(key, 'processed', len(results))
+    pipe.hincrby(key, 'batches', 1)
+    for outcome, count in outcomes.items():
+        pipe.hincrby(key, f'outcome:{outcome}', count)
+    for provider, count in providers.items():
+        pipe.hincrby(key, f'provider:{provider}', count)
+    pipe.expire(key, 60 * 60 * 24 * 7)
+    pipe.hgetall(key)
+    totals = {field.decode(): int(value) for field, value in pipe.execute()[-1].items()}
+
+    elapsed = max(time.time() - started, 0.001)
+    report = {
+        'run_id': run_id,
+        'batches': totals.get('batches', 0),
+        'processed': totals.get('processed', 0),
+        'outcomes': {field.split(':', 1)[1]: value for field, value in totals.items() if field.startswith('outcome:')},
+        'providers': {field.split(':', 1)[1]: value for field, value in totals.items() if field.startswith('provider:')},
+        'elapsed_seconds': round(elapsed, 1),
+        'per_minute': round(totals.get('processed', 0) / elapsed * 60, 1),
+        'updated_at': timezone.now().isoformat(),
+    }
+    cache.set(REPORT_KEY, report, timeout=60 * 60 * 24 * 7)
+    return report
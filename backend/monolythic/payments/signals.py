@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .entitlements import active_subscriptions, invalidate_entitlement
+from .models import Subscription, SubscriptionPlan
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def invalidate_subscription_entitlement(sender, instance, **kwargs):
+    """The user's cached plan is rebuilt from the subscriptions on its next lookup"""
+    invalidate_entitlement(instance.user_id)
+
+
+@receiver(post_save, sender=SubscriptionPlan)
+def invalidate_plan_entitlements(sender, instance, created, **kwargs):
+    """Cached entitlements carry the plan name"""
+    if created:
+        return
+    for user_id in active_subscriptions().filter(plan=instance).values_list('user_id', flat=True).distinct():
+        invalidate_entitlement(user_id)
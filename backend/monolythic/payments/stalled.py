@@ -0,0 +1,136 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Transaction
+from .retry import ERROR, RECOVERED, recover_payment
+from .status import publish_transaction_statuses
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "AFTER_MINUTES": 30,
+    "BATCH_SIZE": 500,
+    "MAX_BATCHES": 20,
+    "CHECK_PROVIDER": False,
+    "CHECK_WORKERS": 8,
+}
+
+
+def get_stalled_settings():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "STALLED_TRANSACTIONS", {}))
+    return config
+
+
+def stalled_transactions(cutoff_time):
+    # Served by the payments_tx_pending_idx partial index
+    return Transaction.objects.filter(status='PENDING', created_at__lt=cutoff_time).order_by('created_at')
+
+
+def check_with_provider(transaction):
+    try:
+        return recover_payment(transaction)[0]
+    except Exception as e:
+        logger.warning(f"Could not check stalled transaction {transaction.reference}: {str(e)}")
+        return ERROR
+    finally:
+        # Each worker thread has its own connection
+        close_old_connections()
+
+
+def recover_batch(batch, workers):
+    """Ask the providers about a batch concurrently, returns the references of the recovered payments"""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        outcomes = list(executor.map(check_with_provider, batch))
+    return {transaction.pk for transaction, outcome in zip(batch, outcomes) if outcome == RECOVERED}
+
+
+def fail_batch(cutoff_time, batch_size, only=None):
+    """
+    Mark up to ``batch_size`` stalled transactions FAILED in one short
+    transaction. Rows locked elsewhere (e.g. a webhook being applied) are
+    skipped and left for the next batch or run. The new statuses are then
+    published to the payment status cache and the payers. Returns the
+    number updated.
+    """
+    with db_transaction.atomic():
+        queryset = stalled_transactions(cutoff_time)
+        if only is not None:
+            queryset = queryset.filter(pk__in=only)
+        references = list(
+            queryset.select_for_update(skip_locked=True).values_list('pk', flat=True)[:batch_size]
+        )
+        if not references:
+            return 0
+        failed = Transaction.objects.filter(pk__in=references, status='PENDING').update(
+            status='FAILED', updated_at=timezone.now()
+        )
+    publish_transaction_statuses(Transaction.objects.filter(pk__in=references, status='FAILED'))
+    return failed
+
+
+def sweep_stalled_transactions():
+    """
+    Mark the transactions PENDING for more than AFTER_MINUTES as FAILED, at
+    most MAX_BATCHES batches of BATCH_SIZE rows per run. With CHECK_PROVIDER
+    every batch is first checked with the provider status APIs (concurrently)
+    and the payments that went through are applied instead. Returns the run
+    totals with the metrics of every batch.
+    """
+    config = get_stalled_settings()
+    cutoff_time = timezone.now() - timezone.timedelta(minutes=config["AFTER_MINUTES"])
+    batches = []
+    after = None
+    for number in range(1, config["MAX_BATCHES"] + 1):
+        started = time.perf_counter()
+        recovered = 0
+        if config["CHECK_PROVIDER"]:
+            queryset = stalled_transactions(cutoff_time).order_by('created_at', 'reference')
+            if after is not None:
+                # Keyset on the last row checked: rows left PENDING because
+                # they were locked are not checked twice in a run
+                created_at, reference = after
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, reference__gt=reference)
+                )
+            batch = list(queryset[:config["BATCH_SIZE"]])
+            if not batch:
+                break
+            after = (batch[-1].created_at, batch[-1].pk)
+            recovered_references = recover_batch(batch, config["CHECK_WORKERS"])
+            recovered = len(recovered_references)
+            remaining = [transaction.pk for transaction in batch if transaction.pk not in recovered_references]
+            failed = fail_batch(cutoff_time, config["BATCH_SIZE"], only=remaining) if remaining else 0
+            size = len(batch)
+        else:
+            failed = fail_batch(cutoff_time, config["BATCH_SIZE"])
+            size = failed
+            if not failed:
+                break
+
+        metrics = {
+            'batch': number,
+            'size': size,
+            'failed': failed,
+            'recovered': recovered,
+            'seconds': round(time.perf_counter() - started, 3),
+        }
+        batches.append(metrics)
+        logger.info(
+            f"Stalled transactions batch {number}: {failed} marked FAILED, {recovered} recovered "
+            f"out of {size} in {metrics['seconds']}s"
+        )
+        if size < config["BATCH_SIZE"]:
+            break
+
+    return {
+        'failed': sum(batch['failed'] for batch in batches),
+        'recovered': sum(batch['recovered'] for batch in batches),
+        'batches': batches,
+    }
@@ -0,0 +1,178 @@
+import logging
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import PaymentReference, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Status of a payment as seen by its payer, keyed by our internal reference
+# (the transaction_id returned when the payment is created). It is kept up to
+# date by the initiation task and the provider callbacks, so status polling
+# is served from the cache, and every change is pushed to the payer's
+# notifications WebSocket group.
+STATUS_PREFIX = "payments:status:"
+ALIAS_PREFIX = "payments:status:alias:"
+STATUS_TIMEOUT = 60 * 60 * 24
+
+QUEUED = 'QUEUED'
+PENDING = 'PENDING'
+SUCCESSFUL = 'SUCCESSFUL'
+FAILED = 'FAILED'
+ERROR = 'ERROR'
+# Statuses a payment never leaves
+FINAL_STATUSES = (SUCCESSFUL, FAILED, ERROR)
+
+
+def status_key(reference):
+    return f"{STATUS_PREFIX}{reference}"
+
+
+def provider_reference(transaction):
+    """The reference the provider knows the payment by"""
+    if transaction.provider == 'freemopay' and transaction.operator_reference:
+        # Asynchronously initiated FreemoPay payments only learn it from the provider
+        return transaction.operator_reference
+    return str(transaction.reference)
+
+
+def push_payment_status(user_id, payment):
+    """Send a payment status to the notifications WebSocket of ``user_id``"""
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            f"user_notifications_{user_id}",
+            {'type': 'payment_status', 'payment': payment}
+        )
+    except Exception as e:
+        logger.warning(f"Could not push the status of payment {payment.get('reference')}: {str(e)}")
+
+
+def set_payment_status(reference, user_id, **fields):
+    """
+    Update the cached status of the payment ``reference`` with ``fields``
+    and push it to its payer. Returns the updated status.
+
+    A final status is never moved back to QUEUED or PENDING: the provider
+    callback can land before the initiation task records PENDING.
+    """
+    payment = cache.get(status_key(reference)) or {'reference': reference}
+    if payment.get('status') in FINAL_STATUSES and fields.get('status') not in (None, *FINAL_STATUSES):
+        fields = {key: value for key, value in fields.items() if key not in ('status', 'message')}
+    payment.update(fields, user_id=user_id)
+    payment['updated_at'] = timezone.now().isoformat()
+    cache.set(status_key(reference), payment, timeout=STATUS_TIMEOUT)
+    if payment.get('provider_reference'):
+        cache.set(f"{ALIAS_PREFIX}{payment['provider_reference']}", reference, timeout=STATUS_TIMEOUT)
+    push_payment_status(user_id, public_payment_status(payment))
+    return payment
+
+
+def publish_transaction_status(transaction):
+    """
+    Cache and push the status of a transaction after its provider callback.
+    Runs after the payment is committed, so it never fails it.
+    """
+    reference = transaction.external_reference
+    try:
+        payment_ref = PaymentReference.objects.filter(internal_reference=reference).only('user_id').first()
+        if not reference or payment_ref is None:
+            return None
+        return set_payment_status(
+            reference,
+            payment_ref.user_id,
+            provider=transaction.provider,
+            amount=str(transaction.amount),
+            status=transaction.status,
+            provider_reference=provider_reference(transaction),
+            message=transaction.message or '',
+        )
+    except Exception as e:
+        logger.warning(f"Could not publish the status of transaction {transaction.reference}: {str(e)}")
+        return None
+
+
+def publish_transaction_statuses(transactions):
+    """
+    publish_transaction_status for many transactions updated in bulk (e.g.
+    failed by the stalled sweeper), with one query for their payers.
+    """
+    transactions = [transaction for transaction in transactions if transaction.external_reference]
+    try:
+        user_ids = dict(
+            PaymentReference.objects.filter(
+                internal_reference__in=[transaction.external_reference for transaction in transactions]
+            ).values_list('internal_reference', 'user_id')
+        )
+    except Exception as e:
+        logger.warning(f"Could not publish the status of {len(transactions)} transactions: {str(e)}")
+        return 0
+    published = 0
+    for transaction in transactions:
+        user_id = user_ids.get(transaction.external_reference)
+        if user_id is None:
+            continue
+        try:
+            set_payment_status(
+                transaction.external_reference,
+                user_id,
+                provider=transaction.provider,
+                amount=str(transaction.amount),
+                status=transaction.status,
+                provider_reference=provider_reference(transaction),
+                message=transaction.message or '',
+            )
+            published += 1
+        except Exception as e:
+            logger.warning(f"Could not publish the status of transaction {transaction.reference}: {str(e)}")
+    return published
+
+
+def load_payment_status(reference):
+    """Status of a payment built from the database, None if it is unknown"""
+    lookup = Q(external_reference=reference)
+    try:
+        lookup |= Q(reference=uuid.UUID(str(reference)))
+    except ValueError:
+        pass
+    transaction = Transaction.objects.filter(lookup).order_by('-created_at').first()
+    if transaction is None:
+        return None
+    payment_ref = PaymentReference.objects.filter(internal_reference=transaction.external_reference).only('user_id').first()
+    payment = {
+        'reference': transaction.external_reference,
+        'provider': transaction.provider,
+        'amount': str(transaction.amount),
+        'status': transaction.status,
+        'provider_reference': provider_reference(transaction),
+        'message': transaction.message or '',
+        'user_id': payment_ref.user_id if payment_ref else None,
+        'updated_at': transaction.updated_at.isoformat(),
+    }
+    cache.set(status_key(payment['reference']), payment, timeout=STATUS_TIMEOUT)
+    return payment
+
+
+def get_payment_status(reference):
+    """
+    Status of a payment from our internal reference or the provider's one,
+    from the cache when possible. None if the payment is unknown.
+    """
+    payment = cache.get(status_key(reference))
+    if payment is None:
+        alias = cache.get(f"{ALIAS_PREFIX}{reference}")
+        if alias:
+            payment = cache.get(status_key(alias))
+    return payment or load_payment_status(reference)
+
+
+def can_view_payment(user, payment):
+    return user.is_staff or str(payment.get('user_id')) == str(user.id)
+
+
+def public_payment_status(payment):
+    return {key: value for key, value in payment.items() if key != 'user_id'}
@@ -1,4 +1,6 @@
 # Make sure the task is imported when the 'tasks' package is imported
-from .process_payments import process_payment_task
+from .process_payments import process_payment_task, retry_failed_payments, retry_payment_transaction, report_retry_batch
+from .webhooks import process_webhook_event, requeue_stalled_webhook_events
+from .initiation import initiate_payment
 
-__all__ = ['process_payment_task']
+__all__ = ['process_payment_task', 'retry_failed_payments', 'retry_payment_transaction', 'report_retry_batch', 'process_webhook_event', 'requeue_stalled_webhook_events', 'initiate_payment']
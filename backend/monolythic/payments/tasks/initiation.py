@@ -0,0 +1,21 @@
+import logging
+from celery import shared_task
+from ..initiation import initiate
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def initiate_payment(provider, internal_reference, options):
+    """
+    Make the provider call of a payment created in asynchronous mode. Not
+    retried: a payment initiation is not idempotent on the provider side.
+    """
+    try:
+        payment = initiate(provider, internal_reference, options)
+        if payment is None:
+            return {'status': 'error', 'message': f'Payment reference {internal_reference} not found'}
+        logger.info(f"Initiated {provider} payment {internal_reference}: {payment['status']}")
+        return {'status': 'success', 'payment_status': payment['status']}
+    except Exception as e:
+        logger.exception(f"Error initiating {provider} payment {internal_reference}: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
@@ -0,0 +1,47 @@
+import logging
+from celery import shared_task
+from django.utils import timezone
+from ..models import WebhookEvent
+from ..webhooks import process_event
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def process_webhook_event(event_id):
+    """
+    Apply a payment provider callback stored by the webhook views
+    """
+    try:
+        result = process_event(event_id)
+        logger.info(f"Processed webhook event {event_id}: {result.get('message')}")
+        return result
+    except Exception as e:
+        logger.exception(f"Error processing webhook event {event_id}: {str(e)}")
+        return {'status': 'error', 'message': str(e)}
+
+@shared_task
+def requeue_stalled_webhook_events():
+    """
+    Queue again the callbacks stored more than 5 minutes ago that were never
+    processed (e.g. the broker was unavailable when they were received).
+    """
+    try:
+        cutoff_time = timezone.now() - timezone.timedelta(minutes=5)
+        event_ids = list(
+            WebhookEvent.objects.filter(status='RECEIVED', received_at__lt=cutoff_time)
+            .values_list('pk', flat=True)[:500]
+        )
+        for event_id in event_ids:
+            process_webhook_event.delay(event_id)
+
+        logger.info(f"Requeued {len(event_ids)} stalled webhook events")
+        return {
+            'status': 'success',
+            'count': len(event_ids)
+        }
+    except Exception as e:
+        logger.exception(f"Error requeueing webhook events: {str(e)}")
+        return {
+            'status': 'error',
+            'message': f'Error requeueing webhook events: {str(e)}'
+        }
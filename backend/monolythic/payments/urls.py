@@ -15,6 +15,7 @@ urlpatterns = [
     path('webhook/', views.payment_webhook, name='payment-webhook'),
     path('plans/<str:plan_id>/payment-link/', views.PaymentLinkView.as_view(), name='plan-payment'),
     path('payment-success/', views.payment_success, name='payment-success'),
+    path('payment-status/<str:reference>/', views.payment_status, name='payment-status'),
     
     # FreemoPay routes
     path('freemo/webhook/', views.freemo_payment_webhook, name='freemo-payment-webhook'),
@@ -9,7 +9,6 @@ from django.conf import settings
 from .models import PaymentReference, SubscriptionPlan, Subscription, Payment,Transaction
 from .serializers import SubscriptionDetailSerializer, SubscriptionPlanSerializer, SubscriptionSerializer, PaymentSerializer, TransactionSerializer
 from .filters import SubscriptionFilter, PaymentFilter, SubscriptionPlanFilter,TransactionFilter
-from .lib.campay import CamPayManager
 from django.urls import reverse
 import uuid
 from drf_yasg.utils import swagger_auto_schema
@@ -25,7 +24,20 @@ from django.core.cache import cache
 from .pagination import CustomPagination
 from rest_framework.decorators import action
 from utils.mixins import ActivityLoggingMixin
-from payments.lib import FreemoPayManager
+from utils.pagination import KeysetPagination
+from .providers import get_campay_manager, get_freemopay_manager
+from .initiation import async_initiation_requested, queue_initiation
+from .entitlements import get_entitlement
+from .status import PENDING, can_view_payment, get_payment_status, public_payment_status
+from .webhooks import CAMPAY, FREEMOPAY, WebhookError, receive_webhook
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Status names of FreemoPay for the statuses served from the cache
+FREEMOPAY_STATUS_NAMES = {'SUCCESSFUL': 'SUCCESS'}
+# FreemoPay status answers are shared by the clients polling the same payment
+FREEMOPAY_STATUS_CACHE_TIMEOUT = 5
 
 class SubscriptionPlanViewSet(ActivityLoggingMixin, viewsets.ModelViewSet):
     queryset = SubscriptionPlan.objects.filter(active=True)
@@ -111,6 +123,10 @@ class PaymentLinkView(ActivityLoggingMixin, APIView):
                     description='Failure redirect URL',
                     default='http://your-domain.com/payment/failure'
                 ),
+                'async': openapi.Schema(
+                    type=openapi.TYPE_BOOLEAN,
+                    description='Create the link in the background and answer 202 with a status_url to poll'
+                ),
             }
         ),
         responses={
@@ -217,11 +233,7 @@ class PaymentLinkView(ActivityLoggingMixin, APIView):
                 )
             
             # Initialize CamPay client
-            campay = CamPayManager(
-                app_username=settings.CAMPAY_APP_USERNAME,
-                app_password=settings.CAMPAY_APP_PASSWORD,
-                environment=settings.CAMPAY_ENVIRONMENT
-            )
+            campay = get_campay_manager()
             
             # Generate internal reference for tracking
             internal_reference = self.generate_short_reference(plan.id, request.user.id)
@@ -273,6 +285,39 @@ class PaymentLinkView(ActivityLoggingMixin, APIView):
             success_url = request.data.get('success_url') or request.build_absolute_uri(reverse('payment-success'))
             failure_url = request.data.get('failure_url') or request.build_absolute_uri(reverse('payment-failure'))
             
+            if async_initiation_requested(request.data):
+                # The payment link is created by a task, the client polls the status or listens to its notifications
+                transaction = Transaction.objects.create(
+                    reference=external_reference,
+                    status='PENDING',
+                    amount=plan.price,
+                    app_amount=plan.price,
+                    currency='XAF',
+                    operator='MTN',  # Default to MTN, can be updated later
+                    endpoint='collect',
+                    code='',
+                    operator_reference='',
+                    phone_number=phone_number.replace('+', ''),
+                    external_reference=internal_reference
+                )
+                payment = queue_initiation(payment_reference, transaction, {
+                    'description': description,
+                    'success_url': success_url,
+                    'failure_url': failure_url
+                })
+                self.log_activity(request, "Queued payment link", {
+                    "plan_id": plan_id,
+                    "amount": str(plan.price)
+                })
+                return Response({
+                    'status': payment['status'],
+                    'transaction_id': internal_reference,
+                    'external_reference': external_reference,
+                    'status_url': request.build_absolute_uri(reverse('payment-status', args=[internal_reference])),
+                    'success_url': success_url,
+                    'failure_url': failure_url
+                }, status=status.HTTP_202_ACCEPTED)
+            
             try:
                 # Create payment link
                 payment_link = campay.create_payment_link(
@@ -408,9 +453,13 @@ class FreemoPayLinkView(ActivityLoggingMixin, APIView):
                     type=openapi.TYPE_STRING, 
                     description='Callback URL for payment notifications (optional)'
                 ),
+                'async': openapi.Schema(
+                    type=openapi.TYPE_BOOLEAN,
+                    description='Initialize the payment in the background and answer 202 with a status_url to poll'
+                ),
             }
         ),
-        responses={200: "Payment link created successfully"}
+        responses={200: "Payment link created successfully", 202: "Payment queued for initialization"}
     )
     def post(self, request, plan_id):
         try:
@@ -494,12 +543,38 @@ class FreemoPayLinkView(ActivityLoggingMixin, APIView):
             # Get callback URL (default to webhook endpoint if not provided)
             callback_url = request.data.get('callback') or request.build_absolute_uri(reverse('freemo-payment-webhook'))
             
+            if async_initiation_requested(request.data):
+                # The payment is initialized by a task, the client polls the status or listens to its notifications
+                transaction = Transaction.objects.create(
+                    reference=transaction_uuid,
+                    status='PENDING',
+                    amount=plan.price,
+                    app_amount=plan.price,
+                    currency='XAF',
+                    operator='MTN',  # Default to MTN, can be updated later
+                    endpoint='freemopay_init',
+                    code='',
+                    operator_reference='',  # FreemoPay reference, set once the payment is initialized
+                    phone_number=phone_number.replace('+', ''),
+                    external_reference=internal_reference,
+                    provider='freemopay'
+                )
+                payment = queue_initiation(payment_reference, transaction, {
+                    'description': description,
+                    'callback_url': callback_url
+                })
+                self.log_activity(request, "Queued FreemoPay payment", {
+                    "plan_id": plan_id,
+                    "amount": str(plan.price)
+                })
+                return Response({
+                    'status': payment['status'],
+                    'internal_reference': internal_reference,
+                    'status_url': request.build_absolute_uri(reverse('freemo-payment-status', args=[internal_reference]))
+                }, status=status.HTTP_202_ACCEPTED)
+            
             # Initialize FreemoPay client
-            freemopay = FreemoPayManager(
-                app_key=settings.FREEMOPAY_APP_KEY,
-                secret_key=settings.FREEMOPAY_SECRET_KEY,
-                base_url=settings.FREEMOPAY_BASE_URL
-            )
+            freemopay = get_freemopay_manager()
             
             try:
                 # Initialize payment
@@ -598,11 +673,11 @@ class CurrentSubscriptionView(ActivityLoggingMixin, APIView):
     def get(self, request):
         self.log_activity(request, "Checked current subscription status")
         try:
-            subscription = Subscription.objects.filter(
-                user=request.user,
-                is_active=True,
-                end_date__gt=timezone.now()
-            ).latest('start_date')
+            # Users without a subscription are answered from the entitlement cache
+            entitlement = get_entitlement(request.user.pk)
+            if entitlement is None:
+                raise Subscription.DoesNotExist
+            subscription = Subscription.objects.select_related('plan', 'user').get(pk=entitlement['subscription_id'])
             serializer = SubscriptionDetailSerializer(subscription)
             return Response({
                 'subscription': serializer.data,
@@ -743,7 +818,7 @@ class TransactionViewSet(ActivityLoggingMixin, viewsets.ReadOnlyModelViewSet):
     filter_backends = [filters.SearchFilter, filters.OrderingFilter, django_filters.rest_framework.DjangoFilterBackend]
     search_fields = ['phone_number', 'reference']
     ordering_fields = ['created_at', 'amount']
-    pagination_class = CustomPagination
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         """
@@ -782,32 +857,34 @@ class TransactionViewSet(ActivityLoggingMixin, viewsets.ReadOnlyModelViewSet):
 @permission_classes([AllowAny])  # This will allow any request to access the endpoint
 def payment_webhook(request):
     """
-    Webhook to handle payment notifications from payment providers
+    Webhook to handle payment notifications from payment providers.
+    The raw event is stored and acknowledged right away, it is applied by
+    the process_webhook_event task (repeated callbacks are only applied once).
     """
     try:
         # Get webhook data and convert QueryDict to dict
         webhook_data = request.GET.dict()
-        
-        # Log the webhook data for debugging
-        print(f"Received webhook data: {webhook_data}")
-        
-        # Queue payment processing using Celery
-        result = process_payment_task.delay(webhook_data)
-        
-        print(f"Task queued with ID: {result.id}")
-        
+        logger.info(f"Received webhook data: {webhook_data}")
+
+        event, message = receive_webhook(CAMPAY, webhook_data)
         return Response({
             'status': 'success',
-            'message': 'Payment queued for processing',
-            'task_id': result.id
+            'message': message,
+            'event_id': event.pk if event else None
         })
-        
-    except Exception as e:
-        print(f"Payment webhook error: {str(e)}")
+
+    except WebhookError as e:
         return Response({
             'status': 'error',
             'message': str(e)
         }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.exception(f"Payment webhook error: {str(e)}")
+        # 5xx so that the provider retries the callback
+        return Response({
+            'status': 'error',
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['GET'])
 def payment_success(request):
@@ -891,7 +968,9 @@ def payment_success(request):
 @permission_classes([AllowAny])
 def freemo_payment_webhook(request):
     """
-    Webhook to handle payment notifications from FreemoPay
+    Webhook to handle payment notifications from FreemoPay.
+    The raw event is stored and acknowledged right away, it is applied by
+    the process_webhook_event task (repeated callbacks are only applied once).
     """
     try:
         # Get webhook data from request body
@@ -899,158 +978,28 @@ def freemo_payment_webhook(request):
             webhook_data = request.data
         else:
             webhook_data = request.POST.dict()
-        
-        # Log the webhook data for debugging
-        print(f"Received FreemoPay webhook data: {webhook_data}")
-        
+        logger.info(f"Received FreemoPay webhook data: {webhook_data}")
+
         # Validate webhook data
         if not webhook_data or not isinstance(webhook_data, dict):
             return Response({"status": "error", "message": "Invalid webhook data"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Extract important fields
-        payment_status = webhook_data.get('status')
-        reference = webhook_data.get('reference')
-        external_id = webhook_data.get('externalId')
-        amount = webhook_data.get('amount')
-        transaction_type = webhook_data.get('transactionType')
-        message = webhook_data.get('message', '')
-        
+
         # Validate required fields
-        if not all([payment_status, reference, external_id, amount, transaction_type]):
+        required_fields = ['status', 'reference', 'externalId', 'amount', 'transactionType']
+        if not all(webhook_data.get(field) for field in required_fields):
             return Response({"status": "error", "message": "Missing required webhook parameters"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Find the payment reference by internal reference (external_id in FreemoPay callback)
-        try:
-            payment_ref = PaymentReference.objects.get(internal_reference=external_id)
-        except PaymentReference.DoesNotExist:
-            # Try fetching from Redis cache if DB record not found
-            cache_key = f"freemo_payment_ref_{external_id}"
-            cached_data = cache.get(cache_key)
-            
-            if not cached_data:
-                return Response({"status": "error", "message": "Payment reference not found"}, status=status.HTTP_404_NOT_FOUND)
-            
-            # Parse cached reference data
-            ref_data = json.loads(cached_data)
-            print(f"Retrieved payment reference from cache: {ref_data}")
-            
-            # Process from cache data
-            if payment_status == 'SUCCESS':
-                # Create a Transaction record
-                transaction = Transaction.objects.create(
-                    reference=reference,
-                    status='SUCCESSFUL',
-                    amount=float(ref_data.get('amount', 0)),
-                    app_amount=float(ref_data.get('amount', 0)),
-                    currency='XAF',
-                    operator=transaction_type,
-                    endpoint='freemopay_callback',
-                    code='',
-                    operator_reference=reference,
-                    phone_number=ref_data.get('phone_number', ''),
-                    external_reference=external_id,
-                    provider='freemopay'
-                )
-                
-                # Queue payment processing
-                process_payment_task.delay({
-                    'provider': 'freemopay',
-                    'status': payment_status,
-                    'reference': reference,
-                    'amount': amount,
-                    'external_id': external_id,
-                    'plan_id': ref_data.get('plan_id'),
-                    'user_id': ref_data.get('user_id'),
-                })
-                
-                return Response({"status": "success", "message": "Payment processed from cache"})
-            else:
-                # Failed payment
-                Transaction.objects.create(
-                    reference=reference,
-                    status='FAILED',
-                    amount=float(ref_data.get('amount', 0)),
-                    app_amount=float(ref_data.get('amount', 0)),
-                    currency='XAF',
-                    operator=transaction_type,
-                    endpoint='freemopay_callback',
-                    code='',
-                    operator_reference=reference,
-                    phone_number=ref_data.get('phone_number', ''),
-                    external_reference=external_id,
-                    provider='freemopay',
-                    message=message
-                )
-                
-                return Response({"status": "error", "message": f"Payment failed: {message}"})
-        
-        # Payment reference found in database
-        print(f"Found payment reference: {payment_ref.id} for user: {payment_ref.user.id} and plan: {payment_ref.plan.id}")
-        
-        # Update transaction record
-        transaction = Transaction.objects.filter(external_reference=external_id).first()
-        if transaction:
-            transaction.status = 'SUCCESSFUL' if payment_status == 'SUCCESS' else 'FAILED'
-            transaction.operator_reference = reference
-            transaction.message = message
-            transaction.save()
-            print(f"Updated transaction {transaction.reference} status to {transaction.status}")
-        else:
-            # Create new transaction record if not found
-            transaction = Transaction.objects.create(
-                reference=reference,
-                status='SUCCESSFUL' if payment_status == 'SUCCESS' else 'FAILED',
-                amount=payment_ref.amount,
-                app_amount=payment_ref.amount,
-                currency='XAF',
-                operator=transaction_type,
-                endpoint='freemopay_callback',
-                code='',
-                operator_reference=reference,
-                phone_number=payment_ref.phone_number,
-                external_reference=external_id,
-                provider='freemopay',
-                message=message
-            )
-            print(f"Created new transaction with reference {transaction.reference}")
-        
-        # For successful payments, process subscription
-        if payment_status == 'SUCCESS':
-            try:
-                # First create subscription
-                subscription = Subscription.objects.create(
-                    user=payment_ref.user,
-                    plan=payment_ref.plan,
-                    start_date=timezone.now(),
-                    end_date=timezone.now() + timezone.timedelta(days=payment_ref.plan.duration_days),
-                    auto_renew=False,
-                    is_active=True
-                )
-                
-                # Then create payment record with subscription field
-                payment = Payment.objects.create(
-                    user=payment_ref.user,
-                    subscription=subscription,  # Link to subscription
-                    amount=payment_ref.amount,
-                    transaction_id=external_id,
-                    payment_method='FreemoPay',
-                    status='SUCCESSFUL'
-                )
-                
-                print(f"Created subscription {subscription.id} until {subscription.end_date}")
-                
-            except Exception as sub_error:
-                print(f"Error processing subscription: {str(sub_error)}")
-                return Response({
-                    "status": "error", 
-                    "message": f"Error creating subscription: {str(sub_error)}",
-                    "payment_processed": True
-                })
-        
-        return Response({"status": "success", "message": "Webhook processed successfully"})
-        
+
+        event, message = receive_webhook(FREEMOPAY, dict(webhook_data))
+        return Response({
+            "status": "success",
+            "message": message,
+            "event_id": event.pk if event else None
+        })
+
+    except WebhookError as e:
+        return Response({"status": "error", "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
-        print(f"FreemoPay webhook error: {str(e)}")
+        logger.exception(f"FreemoPay webhook error: {str(e)}")
         return Response({
             'status': 'error',
             'message': str(e)
@@ -1086,21 +1035,31 @@ def freemo_payment_webhook(request):
 )
 def freemo_payment_status(request, reference):
     """
-    Check the status of a FreemoPay payment
+    Check the status of a FreemoPay payment, by FreemoPay or internal reference.
+    Final and queued statuses are served from the cache, pending payments are
+    checked with FreemoPay (the answer is cached for a few seconds).
     """
     try:
-        # Initialize FreemoPay client
-        freemopay = FreemoPayManager(
-            app_key=settings.FREEMOPAY_APP_KEY,
-            secret_key=settings.FREEMOPAY_SECRET_KEY,
-            base_url=settings.FREEMOPAY_BASE_URL
-        )
-        
-        # Query payment status
-        payment_status = freemopay.check_payment_status(reference)
+        payment = get_payment_status(reference)
+        if payment is not None and not can_view_payment(request.user, payment):
+            return Response({'status': 'error', 'message': 'Payment not found'}, status=status.HTTP_404_NOT_FOUND)
+        if payment is not None and (payment['status'] != PENDING or not payment.get('provider_reference')):
+            return Response({
+                'reference': payment.get('provider_reference'),
+                'merchandRef': payment['reference'],
+                'amount': payment.get('amount'),
+                'status': FREEMOPAY_STATUS_NAMES.get(payment['status'], payment['status']),
+                'reason': payment.get('message', ''),
+                'payment': public_payment_status(payment)
+            })
         
-        # Log the request
-        print(f"Checking FreemoPay payment status for reference: {reference}")
+        provider_reference = payment['provider_reference'] if payment else reference
+        cache_key = f"freemo_payment_status_{provider_reference}"
+        payment_status = cache.get(cache_key)
+        if payment_status is None:
+            # Query payment status
+            payment_status = get_freemopay_manager().check_payment_status(provider_reference)
+            cache.set(cache_key, payment_status, timeout=FREEMOPAY_STATUS_CACHE_TIMEOUT)
         
         return Response(payment_status)
         
@@ -1111,6 +1070,49 @@ def freemo_payment_status(request, reference):
             'message': str(e)
         }, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@swagger_auto_schema(
+    operation_description="Status of a payment, from its transaction_id or provider reference",
+    manual_parameters=[
+        openapi.Parameter(
+            'reference',
+            openapi.IN_PATH,
+            description="Internal reference (transaction_id) or provider reference of the payment",
+            type=openapi.TYPE_STRING,
+            required=True
+        )
+    ],
+    responses={
+        200: openapi.Response(
+            description="Payment status",
+            schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'reference': openapi.Schema(type=openapi.TYPE_STRING, description='Internal reference'),
+                    'provider': openapi.Schema(type=openapi.TYPE_STRING, description='Payment provider'),
+                    'status': openapi.Schema(type=openapi.TYPE_STRING, description='QUEUED, PENDING, SUCCESSFUL, FAILED or ERROR'),
+                    'payment_link': openapi.Schema(type=openapi.TYPE_STRING, description='CamPay payment link, once created'),
+                    'provider_reference': openapi.Schema(type=openapi.TYPE_STRING, description='Provider reference'),
+                    'message': openapi.Schema(type=openapi.TYPE_STRING, description='Error or provider message'),
+                    'updated_at': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME)
+                }
+            )
+        ),
+        404: "Payment not found"
+    }
+)
+def payment_status(request, reference):
+    """
+    Status of a payment served from the cache (kept up to date by the
+    initiation task and the provider callbacks, which also push it to the
+    notifications WebSocket)
+    """
+    payment = get_payment_status(reference)
+    if payment is None or not can_view_payment(request.user, payment):
+        return Response({'status': 'error', 'message': 'Payment not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(public_payment_status(payment))
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAdminUser])
 @swagger_auto_schema(
@@ -1138,11 +1140,7 @@ def generate_freemo_token(request):
     """
     try:
         # Initialize FreemoPay client
-        freemopay = FreemoPayManager(
-            app_key=settings.FREEMOPAY_APP_KEY,
-            secret_key=settings.FREEMOPAY_SECRET_KEY,
-            base_url=settings.FREEMOPAY_BASE_URL
-        )
+        freemopay = get_freemopay_manager()
         
         # Generate token
         token_response = freemopay.generate_token()
@@ -0,0 +1,313 @@
+import json
+import logging
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from .models import Payment, PaymentReference, Subscription, SubscriptionPlan, Transaction, WebhookEvent
+from .status import publish_transaction_status
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+# Redis marker set when a callback is first received, so that provider retry
+# storms are answered without touching the database. The WebhookEvent unique
+# constraint is what guarantees idempotency, the marker only absorbs load.
+CLAIM_PREFIX = "payments:webhook:"
+CLAIM_TIMEOUT = 60 * 60 * 24
+
+CAMPAY = 'campay'
+FREEMOPAY = 'freemopay'
+
+FREEMOPAY_STATUS = {
+    'SUCCESS': 'SUCCESSFUL',
+    'FAILED': 'FAILED',
+}
+
+FINAL_STATUSES = ['PROCESSED']
+
+
+class WebhookError(Exception):
+    """The callback can not be applied (unknown reference, missing data...)"""
+
+
+def get_event_identity(provider, webhook_data):
+    """(reference, status) identifying a provider callback"""
+    if provider == FREEMOPAY:
+        status = webhook_data.get('status')
+        return webhook_data.get('reference'), FREEMOPAY_STATUS.get(status, status)
+    return webhook_data.get('reference') or webhook_data.get('external_reference'), webhook_data.get('status')
+
+
+def claim_key(provider, reference, status):
+    return f"{CLAIM_PREFIX}{provider}:{reference}:{status}"
+
+
+def claim_event(provider, reference, status):
+    """
+    True the first time a callback is seen. Fails open when Redis is
+    unavailable, the database constraint then catches the duplicates.
+    """
+    try:
+        return bool(get_redis_connection("default").set(
+            claim_key(provider, reference, status), 1, nx=True, ex=CLAIM_TIMEOUT
+        ))
+    except Exception as e:
+        logger.warning(f"Webhook claim unavailable: {str(e)}")
+        return True
+
+
+def release_event(provider, reference, status):
+    """Let the next provider retry of a callback through"""
+    try:
+        get_redis_connection("default").delete(claim_key(provider, reference, status))
+    except Exception as e:
+        logger.warning(f"Webhook claim unavailable: {str(e)}")
+
+
+def record_event(provider, webhook_data):
+    """
+    Persist a callback and queue its processing after commit. Returns the
+    event and whether it still had to be processed.
+    """
+    from .tasks.webhooks import process_webhook_event
+
+    reference, status = get_event_identity(provider, webhook_data)
+    # get_or_create also handles the same callback being stored concurrently
+    event, created = WebhookEvent.objects.get_or_create(
+        provider=provider,
+        reference=str(reference),
+        event_status=str(status),
+        defaults={'payload': webhook_data},
+    )
+    if not created and event.status in FINAL_STATUSES:
+        return event, False
+    db_transaction.on_commit(lambda: process_webhook_event.delay(event.pk))
+    return event, True
+
+
+def receive_webhook(provider, webhook_data):
+    """
+    Fast acknowledgement of a provider callback: the raw event is stored and
+    processed by a task. Returns (event or None for duplicates, message).
+    """
+    reference, status = get_event_identity(provider, webhook_data)
+    if not reference or not status:
+        raise WebhookError("Missing reference or status in webhook data")
+    if not claim_event(provider, reference, status):
+        return None, 'Duplicate event ignored'
+    try:
+        event, queued = record_event(provider, webhook_data)
+    except Exception:
+        release_event(provider, reference, status)
+        raise
+    return event, 'Payment queued for processing' if queued else 'Event already processed'
+
+
+def lock_transaction(**filters):
+    """The matching transaction row, locked until the end of the atomic block"""
+    return Transaction.objects.select_for_update().filter(**filters).order_by('-created_at').first()
+
+
+def activate_subscription(user, plan, amount, payment_method, transaction_id):
+    """
+    Create the subscription and its payment, once per ``transaction_id``.
+    Must run inside the atomic block holding the transaction row lock.
+    """
+    payment = Payment.objects.filter(transaction_id=transaction_id).select_related('subscription').first()
+    if payment is not None:
+        return payment.subscription, False
+    subscription = Subscription.objects.create(
+        user=user,
+        plan=plan,
+        start_date=timezone.now(),
+        end_date=timezone.now() + timezone.timedelta(days=plan.duration_days),
+        is_active=True,
+    )
+    Payment.objects.create(
+        user=user,
+        subscription=subscription,
+        amount=amount,
+        status='SUCCESSFUL',
+        payment_method=payment_method,
+        transaction_id=transaction_id,
+    )
+    return subscription, True
+
+
+def apply_campay_payment(webhook_data):
+    """Apply a CamPay callback: transaction status, then subscription and payment if successful"""
+    external_reference = webhook_data.get('external_reference')
+    status = webhook_data.get('status')
+    operator = webhook_data.get('operator', '')
+    if not external_reference:
+        raise WebhookError('Missing external_reference in webhook data')
+
+    payment_ref = PaymentReference.objects.select_related('user', 'plan').filter(
+        external_reference=external_reference
+    ).first()
+
+    with db_transaction.atomic():
+        transaction = lock_transaction(reference=external_reference)
+        if transaction is None and payment_ref:
+            transaction = lock_transaction(
+                phone_number=payment_ref.phone_number,
+                amount=payment_ref.amount,
+                status='PENDING',
+            )
+        if transaction is None:
+            raise WebhookError(f'Transaction with reference {external_reference} not found.')
+
+        if transaction.status == 'SUCCESSFUL' and status != 'SUCCESSFUL':
+            # A late PENDING/FAILED callback must not undo a payment
+            return {
+                'status': 'success',
+                'message': f'Transaction already successful, ignored status {status}',
+                'transaction_reference': str(transaction.reference)
+            }
+
+        transaction.status = status
+        transaction.code = webhook_data.get('code', '')
+        transaction.operator = operator
+        transaction.operator_reference = webhook_data.get('operator_reference', '')
+        transaction.save()
+        logger.info(f"Updated transaction with reference {transaction.reference} to status {status}")
+        db_transaction.on_commit(lambda: publish_transaction_status(transaction))
+
+        if status != 'SUCCESSFUL':
+            return {
+                'status': 'success',
+                'message': f'Transaction updated with status: {status}',
+                'transaction_reference': str(transaction.reference)
+            }
+
+        if payment_ref:
+            user, plan, amount = payment_ref.user, payment_ref.plan, payment_ref.amount
+        else:
+            # Use cache data as fallback
+            reference_data_json = cache.get(f"payment_ref_{external_reference}")
+            if not reference_data_json:
+                raise WebhookError('Reference data not found in cache')
+            reference_data = json.loads(reference_data_json)
+            user = User.objects.get(id=reference_data.get('user_id'))
+            plan = SubscriptionPlan.objects.get(id=reference_data.get('plan_id'))
+            amount = reference_data.get('amount')
+
+        subscription, created = activate_subscription(user, plan, amount, operator, external_reference)
+
+    return {
+        'status': 'success',
+        'message': 'Payment processed successfully' if created else 'Payment already processed',
+        'subscription_id': str(subscription.pk)
+    }
+
+
+def apply_freemopay_payment(webhook_data):
+    """Apply a FreemoPay callback: transaction status, then subscription and payment if successful"""
+    reference = webhook_data.get('reference')
+    external_id = webhook_data.get('externalId')
+    status = FREEMOPAY_STATUS.get(webhook_data.get('status'), 'FAILED')
+    message = webhook_data.get('message', '')
+    if not external_id:
+        raise WebhookError('Missing externalId in webhook data')
+
+    payment_ref = PaymentReference.objects.select_related('user', 'plan').filter(
+        internal_reference=external_id
+    ).first()
+    if payment_ref:
+        user, plan = payment_ref.user, payment_ref.plan
+        amount, phone_number = payment_ref.amount, payment_ref.phone_number
+    else:
+        # Try the Redis backup when the DB record is not found
+        cached_data = cache.get(f"freemo_payment_ref_{external_id}")
+        if not cached_data:
+            raise WebhookError('Payment reference not found')
+        ref_data = json.loads(cached_data)
+        user = User.objects.get(id=ref_data.get('user_id'))
+        plan = SubscriptionPlan.objects.get(id=ref_data.get('plan_id'))
+        amount, phone_number = ref_data.get('amount', 0), ref_data.get('phone_number', '')
+
+    with db_transaction.atomic():
+        transaction = lock_transaction(external_reference=external_id)
+        if transaction is None:
+            transaction = Transaction(
+                reference=reference,
+                amount=amount,
+                app_amount=amount,
+                currency='XAF',
+                operator=webhook_data.get('transactionType', ''),
+                endpoint='freemopay_callback',
+                code='',
+                phone_number=phone_number,
+                external_reference=external_id,
+                provider=FREEMOPAY,
+            )
+        elif transaction.status == 'SUCCESSFUL' and status != 'SUCCESSFUL':
+            return {
+                'status': 'success',
+                'message': f'Transaction already successful, ignored status {status}',
+                'transaction_reference': str(transaction.reference)
+            }
+
+        transaction.status = status
+        transaction.operator_reference = reference
+        transaction.message = message
+        transaction.save()
+        logger.info(f"Updated transaction {transaction.reference} status to {status}")
+        db_transaction.on_commit(lambda: publish_transaction_status(transaction))
+
+        if status != 'SUCCESSFUL':
+            return {
+                'status': 'success',
+                'message': f'Transaction updated with status: {status}',
+                'transaction_reference': str(transaction.reference)
+            }
+
+        subscription, created = activate_subscription(user, plan, amount, 'FreemoPay', external_id)
+
+    return {
+        'status': 'success',
+        'message': 'Payment processed successfully' if created else 'Payment already processed',
+        'subscription_id': str(subscription.pk)
+    }
+
+
+APPLY = {
+    CAMPAY: apply_campay_payment,
+    FREEMOPAY: apply_freemopay_payment,
+}
+
+
+def process_event(event_id):
+    """
+    Apply a stored callback once. The event row is locked for the whole state
+    change, so concurrent deliveries of the same event wait and then see it
+    processed.
+    """
+    try:
+        with db_transaction.atomic():
+            event = WebhookEvent.objects.select_for_update().get(pk=event_id)
+            if event.status in FINAL_STATUSES:
+                return {'status': 'success', 'message': f'Event already {event.status.lower()}'}
+            event.attempts += 1
+            result = APPLY[event.provider](event.payload)
+            event.status = 'PROCESSED'
+            event.message = result.get('message', '')
+            event.processed_at = timezone.now()
+            event.save(update_fields=['status', 'attempts', 'message', 'processed_at'])
+        return result
+    except Exception as e:
+        WebhookEvent.objects.filter(pk=event_id).update(
+            status='FAILED',
+            attempts=F('attempts') + 1,
+            message=str(e),
+        )
+        event = WebhookEvent.objects.filter(pk=event_id).first()
+        if event:
+            # Let the provider's next retry queue it again
+            release_event(event.provider, event.reference, event.event_status)
+        raise
@@ -0,0 +1,134 @@
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+import logging
+from urllib import request as urlrequest
+from urllib.error import URLError, HTTPError
+
+# Replays synthetic visitor beacons against the batch endpoint
+# (/api/visitors/batch/) at a fixed rate and reports throughput and latency.
+# Only uses the standard library, e.g.:
+#   python beacon_load_test.py --url http://localhost:8000 --rate 2000 --batch-size 50 --duration 30
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+PATHS = [
+    '/fr', '/en', '/en/contact', '/fr/pricing', '/fr/contact', '/en/pricing',
+    '/fr/faq', '/en/faq', '/fr/help', '/en/help', '/fr/privacy', '/en/privacy',
+]
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_4) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15',
+    'Mozilla/5.0 (Linux; Android 14) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Mobile Safari/537.36',
+]
+LANGUAGES = ['fr-FR', 'en-US', 'en-GB', 'fr-CM']
+
+
+def make_beacon(visitor_ids):
+    return {
+        'visitor_id': random.choice(visitor_ids),
+        'ip_address': f'10.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}',
+        'user_agent': random.choice(USER_AGENTS),
+        'referrer': random.choice([None, 'https://www.google.com/', 'https://www.facebook.com/']),
+        'path': random.choice(PATHS),
+        'browser_language': random.choice(LANGUAGES),
+        'screen_width': random.choice([390, 1280, 1440, 1920]),
+        'screen_height': random.choice([844, 720, 900, 1080]),
+    }
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.sent = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def add(self, latency, sent, accepted=0, rejected=0, error=False):
+        with self.lock:
+            self.latencies.append(latency)
+            self.sent += sent
+            self.accepted += accepted
+            self.rejected += rejected
+            self.errors += int(error)
+
+    def percentile(self, value):
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return 0
+        return latencies[min(len(latencies) - 1, int(len(latencies) * value / 100))]
+
+
+def send_batch(url, events, timeout, stats):
+    body = json.dumps({'events': events}).encode()
+    req = urlrequest.Request(url, data=body, headers={'Content-Type': 'application/json'}, method='POST')
+    start = time.perf_counter()
+    try:
+        with urlrequest.urlopen(req, timeout=timeout) as response:
+            payload = json.loads(response.read() or b'{}')
+        stats.add(time.perf_counter() - start, len(events), payload.get('accepted', 0), len(payload.get('rejected', [])))
+    except (HTTPError, URLError, TimeoutError, ValueError) as e:
+        stats.add(time.perf_counter() - start, len(events), error=True)
+        logging.debug(f"Batch failed: {str(e)}")
+
+
+def run(args):
+    url = args.url.rstrip('/') + '/api/visitors/batch/'
+    visitor_ids = [str(uuid.uuid4()) for _ in range(args.visitors)]
+    stats = Stats()
+    semaphore = threading.BoundedSemaphore(args.concurrency)
+    interval = args.batch_size / args.rate
+    threads = []
+
+    def worker(events):
+        try:
+            send_batch(url, events, args.timeout, stats)
+        finally:
+            semaphore.release()
+
+    logging.info(f"Sending {args.rate} events/s in batches of {args.batch_size} to {url} for {args.duration}s")
+    start = time.perf_counter()
+    next_send = start
+    while time.perf_counter() - start < args.duration:
+        events = [make_beacon(visitor_ids) for _ in range(args.batch_size)]
+        # Blocks when every worker is busy: the achieved rate then drops below the target
+        semaphore.acquire()
+        thread = threading.Thread(target=worker, args=(events,), daemon=True)
+        thread.start()
+        threads.append(thread)
+        next_send += interval
+        time.sleep(max(0, next_send - time.perf_counter()))
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    logging.info(
+        f"Sent {stats.sent} events in {len(stats.latencies)} requests over {elapsed:.1f}s "
+        f"({stats.sent / elapsed:.0f} events/s): {stats.accepted} accepted, "
+        f"{stats.rejected} rejected, {stats.errors} failed requests"
+    )
+    logging.info(
+        f"Request latency p50 {stats.percentile(50) * 1000:.1f}ms, "
+        f"p95 {stats.percentile(95) * 1000:.1f}ms, p99 {stats.percentile(99) * 1000:.1f}ms"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay synthetic visitor beacons at a configurable rate')
+    parser.add_argument('--url', default='http://localhost:8000', help='Backend base URL')
+    parser.add_argument('--rate', type=float, default=500, help='Events per second')
+    parser.add_argument('--batch-size', type=int, default=20, help='Events per request')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+    parser.add_argument('--visitors', type=int, default=5000, help='Number of distinct visitor ids')
+    parser.add_argument('--concurrency', type=int, default=20, help='Maximum requests in flight')
+    parser.add_argument('--timeout', type=float, default=10, help='Request timeout in seconds')
+    run(parser.parse_args())
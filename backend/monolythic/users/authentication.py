@@ -0,0 +1,21 @@
+from oauth2_provider.contrib.rest_framework import OAuth2Authentication
+from .token_cache import resolve_token
+
+
+class CachedOAuth2Authentication(OAuth2Authentication):
+    """
+    OAuth2Authentication that resolves bearer tokens through the token cache
+    (users/token_cache.py) instead of loading the AccessToken on every request.
+    Unknown or expired tokens go through the regular django-oauth-toolkit
+    validation so error responses are unchanged.
+    """
+
+    def authenticate(self, request):
+        if request is None:
+            return None
+        auth_header = request.headers.get('Authorization', '')
+        if auth_header.startswith('Bearer '):
+            resolution = resolve_token(auth_header.split(' ', 1)[1].strip())
+            if resolution is not None:
+                return resolution.user, resolution.access_token
+        return super().authenticate(request)
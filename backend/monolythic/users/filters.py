@@ -1,20 +1,26 @@
 import django_filters
 from django_filters.rest_framework import filters
 from .models import User
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 import logging
 from datetime import timedelta
+from payments.entitlements import active_subscriptions
+from utils.search import search
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
+# Fields of the ranked ?search=, indexed by users/migrations/0006_search_indexes.py
+USER_SEARCH_FIELDS = {'first_name': 'A', 'last_name': 'A', 'email': 'B'}
+
 class UserFilter(django_filters.FilterSet):
     email = django_filters.CharFilter(lookup_expr='icontains')
     first_name = django_filters.CharFilter(lookup_expr='icontains')
     last_name = django_filters.CharFilter(lookup_expr='icontains')
     name = filters.CharFilter(method='filter_by_name')
+    search = filters.CharFilter(method='filter_search')
     phone_number = django_filters.CharFilter(lookup_expr='icontains')
     user_type = django_filters.ChoiceFilter(choices=User.USER_TYPES)
     enterprise_name = django_filters.CharFilter(lookup_expr='icontains')
@@ -43,6 +49,10 @@ class UserFilter(django_filters.FilterSet):
             Q(last_name__icontains=value)
         )
         
+    def filter_search(self, queryset, name, value):
+        """Ranked search on names and email, best matches first (see utils/search.py)"""
+        return search(queryset, USER_SEARCH_FIELDS, value)
+
     def filter_by_section(self, queryset, name, value):
         """Filter users by the section name or code of their enrolled class"""
         logger.debug(f"filter_by_section received value: {value}")
@@ -159,22 +169,11 @@ class UserFilter(django_filters.FilterSet):
         has_subscription = self._parse_boolean(value)
         logger.debug(f"has_subscription parsed to: {has_subscription}")
         
-        now = timezone.now()
-        
-        # Use user IDs with active subscriptions to filter
+        # One EXISTS subquery on payments_sub_active_idx instead of a join
+        has_active = Exists(active_subscriptions().filter(user=OuterRef('pk')))
         if has_subscription:
-            # Get users with active subscriptions
-            return queryset.filter(
-                subscriptions__is_active=True,
-                subscriptions__end_date__gt=now
-            ).distinct()
-        else:
-            # Get users without active subscriptions
-            users_with_subscription = User.objects.filter(
-                subscriptions__is_active=True,
-                subscriptions__end_date__gt=now
-            ).distinct()
-            return queryset.exclude(id__in=users_with_subscription)
+            return queryset.filter(has_active)
+        return queryset.exclude(has_active)
     
     def filter_subscription_expiring(self, queryset, name, value):
         """
@@ -0,0 +1,77 @@
+import json
+import statistics
+import time
+
+from django.db import connections
+from django.core.management.base import BaseCommand
+
+from courses.filters import ResourceFilter
+from courses.models import AbstractResource
+from forum.models import Post
+from forum.views import POST_SEARCH_FIELDS
+from users.filters import UserFilter
+from users.models import User
+from utils.search import is_postgres, search
+
+
+def plan_nodes(plan):
+    """Node types of an EXPLAIN (FORMAT JSON) plan, with the index used if any"""
+    node = plan["Node Type"]
+    if plan.get("Index Name"):
+        node = f"{node} on {plan['Index Name']}"
+    return [node] + [child for subplan in plan.get("Plans", []) for child in plan_nodes(subplan)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the current icontains filters (user name and class/section/level, resource "
+        "title, post content) against the ranked ?search= mode for the same terms"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('terms', nargs='*', default=['ali', 'math'], help="Search terms to time")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs of each query, the median is reported")
+        parser.add_argument('--limit', type=int, default=20, help="Rows fetched per run (one page)")
+        parser.add_argument('--explain', action='store_true', help="Print the plan nodes of each query (PostgreSQL)")
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        resources = AbstractResource.objects.non_polymorphic()
+        posts = Post.objects.filter(parent=None)
+        self.stdout.write(
+            f"{users.count()} users, {resources.count()} resources, {posts.count()} posts, "
+            f"{connections[users.db].vendor} database"
+        )
+
+        for term in options['terms']:
+            self.stdout.write(f"\n{term!r}")
+            queries = [
+                ("users: name icontains (current)", UserFilter({'name': term}, queryset=users).qs.order_by('-date_joined')),
+                ("users: class_name icontains (current)", UserFilter({'class_name': term}, queryset=users).qs.order_by('-date_joined')),
+                ("users: section icontains (current)", UserFilter({'section': term}, queryset=users).qs.order_by('-date_joined')),
+                ("users: ?search=", UserFilter({'search': term}, queryset=users).qs),
+                ("resources: title icontains (current)", ResourceFilter({'title': term}, queryset=resources).qs),
+                ("resources: ?search=", ResourceFilter({'search': term}, queryset=resources).qs),
+                ("posts: content icontains", posts.filter(content__icontains=term).order_by('-created_at')),
+                ("posts: ?search=", search(posts, POST_SEARCH_FIELDS, term)),
+            ]
+            for label, queryset in queries:
+                self.measure(label, queryset, options)
+
+    def measure(self, label, queryset, options):
+        timings = []
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            rows = len(queryset[:options['limit']].values_list('pk', flat=True))
+            timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(self.style.SUCCESS(
+            f"  {label:<40} {statistics.median(timings):8.2f} ms  ({rows} rows, total {queryset.count()})"
+        ))
+        if options['explain'] and is_postgres(queryset):
+            sql, params = queryset[:options['limit']].values_list('pk', flat=True).query.sql_with_params()
+            with connections[queryset.db].cursor() as cursor:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            self.stdout.write(f"    {' > '.join(plan_nodes(plan[0]['Plan']))}")
@@ -1,11 +1,11 @@
 from django.http import JsonResponse
 from rest_framework import status
-from .models import UserActiveToken
+from .token_cache import get_active_token
 from django.conf import settings
 import user_agents
 import threading
 from urllib.parse import parse_qs
-from .models import UserActivityLog
+from .models import UserActivityLog, UserActiveToken
 from django.utils.timezone import now
 
 # Thread local storage
@@ -39,9 +39,11 @@ class SingleSessionMiddleware:
                 user = request.user
 
                 if user and user.is_authenticated:
-                    try:
-                        active_token = UserActiveToken.objects.get(user=user)
-                        if active_token.token != token:
+                    active_session = get_active_token(user.pk)
+                    if active_session is not None and not active_session.matches(token):
+                        # Signed in elsewhere since, the device details are only loaded here
+                        active_token = UserActiveToken.objects.filter(pk=active_session.id).first()
+                        if active_token is not None and active_token.token != token:
                             return JsonResponse(
                                 {
                                     'error': 'This account is being used on another device.',
@@ -54,8 +56,6 @@ class SingleSessionMiddleware:
                                 }, 
                                 status=status.HTTP_401_UNAUTHORIZED
                             )
-                    except UserActiveToken.DoesNotExist:
-                        pass
 
         response = self.get_response(request)
         return response
@@ -0,0 +1,25 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+from utils.search import add_postgres_indexes, search_index, trigram_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_alter_useractivitylog_timestamp'),
+    ]
+
+    operations = [
+        # Both are no-ops outside PostgreSQL. The search index must match
+        # users.filters.USER_SEARCH_FIELDS, the trigram ones serve the
+        # name/email icontains filters of UserFilter.
+        TrigramExtension(),
+        add_postgres_indexes(
+            'users', 'User',
+            search_index('users_user_search_idx', {'first_name': 'A', 'last_name': 'A', 'email': 'B'}),
+            trigram_index('users_user_first_name_trgm_idx', 'first_name'),
+            trigram_index('users_user_last_name_trgm_idx', 'last_name'),
+            trigram_index('users_user_email_trgm_idx', 'email'),
+        ),
+    ]
@@ -110,6 +110,14 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+    @property
+    def subscription_status(self):
+        """Active plan badge, from the entitlement cache (see payments/entitlements.py)"""
+        from payments.entitlements import get_entitlement, subscription_status
+        if not hasattr(self, '_entitlement'):
+            self._entitlement = get_entitlement(self.pk)
+        return subscription_status(self._entitlement)
+
     def clean(self):
         from django.core.exceptions import ValidationError
 
@@ -220,7 +228,7 @@ class UserActivityLog(models.Model):
     request_path = models.TextField(null=True, blank=True)  # Which page/API was accessed
     referrer = models.TextField(null=True, blank=True)  # Where the user came from
     extra_data = models.JSONField(null=True, blank=True)  # Any additional metadata
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)  # Set by the caller so batched writes keep the action time
 
     def __str__(self):
         return f"{self.user} - {self.action} - {self.timestamp}"
\ No newline at end of file
@@ -10,8 +10,15 @@ class PermissionSerializer(serializers.ModelSerializer):
         model = Permission
         fields = ['id', 'name', 'codename']
 
+class UserListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # One entitlement lookup for the whole list instead of one per user
+        from payments.entitlements import prefetch_entitlements
+        users = list(data.all() if hasattr(data, 'all') else data)
+        prefetch_entitlements(users)
+        return super().to_representation(users)
+
 class UserSerializer(serializers.ModelSerializer):
-    subscription_status = serializers.ReadOnlyField()
     class_display = serializers.SerializerMethodField()
     is_superuser = serializers.BooleanField(read_only=True)
     is_staff = serializers.BooleanField(read_only=True)
@@ -22,7 +29,7 @@ class UserSerializer(serializers.ModelSerializer):
             'id', 'email', 'first_name', 'last_name', 'phone_number', 'date_of_birth', 
             'user_type', 'class_enrolled',
             'enterprise_name', 'platform_usage_reason', 'email_verified', 'avatar', 'language', 
-            'town', 'quarter', 'subscription_status', 'class_display',
+            'town', 'quarter', 'class_display',
             'is_active', 'created_at', 'updated_at', 'date_joined', 'last_login',
             'is_superuser', 'is_staff'
         ]
@@ -30,6 +37,18 @@ class UserSerializer(serializers.ModelSerializer):
     def get_class_display(self, obj):
         return obj.get_class_display()
 
+class UserDetailSerializer(UserSerializer):
+    """
+    UserSerializer with the subscription badge, for the user endpoints only:
+    nested users (post senders, enrollments...) would cost one entitlement
+    lookup each.
+    """
+    subscription_status = serializers.ReadOnlyField()
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ['subscription_status']
+        list_serializer_class = UserListSerializer
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     is_superuser = serializers.BooleanField(required=False, default=False)
@@ -7,6 +7,7 @@ from .models import UserActivityLog
 from django.utils.timezone import now
 from utils.thread_local import get_request  # Get stored request
 from oauth2_provider.models import AccessToken
+from .token_cache import invalidate_session_user
 
 User = get_user_model()
 
@@ -16,6 +17,7 @@ def invalidate_cache(sender,instance,**kwargs):
     if instance.id:
         # invalidate user_info cache
         cache.delete_pattern(f'*user_info*')
+        invalidate_session_user(instance.id)
     
     # TODO
     cache.delete_pattern('*user_list*')
@@ -0,0 +1,4 @@
+# Make sure the tasks are registered when the 'tasks' package is imported
+from .task import send_async_mail, write_activity_logs_task
+
+__all__ = ['send_async_mail', 'write_activity_logs_task']
@@ -25,4 +25,17 @@ def send_async_mail(self, subject: Any, message: Any, from_email: str|None, reci
         except:
             # If retry fails, just log it and continue
             logger.error("Max retries reached for sending email")
-        return False
\ No newline at end of file
+        return False
+
+@shared_task
+def write_activity_logs_task(entries):
+    """
+    Write a batch of activity logs handed over by utils.activity_log.CeleryActivityLogSink
+    """
+    from utils.activity_log import write_activity_logs
+
+    try:
+        return write_activity_logs(entries)
+    except Exception as e:
+        logger.error(f"Failed to write {len(entries)} activity logs: {str(e)}")
+        return 0
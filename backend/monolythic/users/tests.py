@@ -1,3 +1,112 @@
+import os
+import signal
+import unittest
+from unittest import mock
+
+from django.db import connection
 from django.test import TestCase
 
-# Create your tests here.
+from utils import activity_log
+from utils.activity_log import BufferedActivityLogSink, flush_activity_logs, flush_activity_logs_at_exit
+from .models import UserActivityLog
+
+
+class InlineSink(BufferedActivityLogSink):
+    """Buffered sink without its flusher thread: the tests flush explicitly"""
+
+    def _ensure_worker(self):
+        self.database = connection.settings_dict["NAME"]
+
+
+class RecordingSink(InlineSink):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = []
+
+    def write(self, batch):
+        self.batches.append([entry["action"] for entry in batch])
+
+
+def entry(number):
+    return {"action": f"action {number}", "request_method": "GET", "request_path": "/api/"}
+
+
+class BufferedActivityLogSinkTest(TestCase):
+
+    def test_flush_writes_in_batches(self):
+        sink = RecordingSink(batch_size=2, flush_interval=60, max_buffer=100)
+        sink.emit(entry(1))
+        self.assertFalse(sink._wakeup.is_set())
+        sink.emit(entry(2))
+        # A full batch wakes the flusher up before the interval
+        self.assertTrue(sink._wakeup.is_set())
+        sink.emit(entry(3))
+
+        self.assertEqual(sink.flush(), 3)
+        self.assertEqual(sink.batches, [["action 1", "action 2"], ["action 3"]])
+        self.assertEqual(sink.stats()["pending"], 0)
+        self.assertEqual(sink.stats()["flushed"], 3)
+
+    def test_oldest_entries_are_dropped_beyond_max_buffer(self):
+        sink = RecordingSink(batch_size=10, flush_interval=60, max_buffer=3)
+        for number in range(5):
+            sink.emit(entry(number))
+
+        self.assertEqual(sink.stats()["dropped"], 2)
+        sink.flush()
+        self.assertEqual(sink.batches, [["action 2", "action 3", "action 4"]])
+
+    def test_failed_writes_are_counted(self):
+        sink = InlineSink(batch_size=10, flush_interval=60, max_buffer=100)
+        sink.emit({"action": "bad", "unknown_field": True})
+
+        with self.assertLogs("utils.activity_log", level="ERROR"):
+            self.assertEqual(sink.flush(), 0)
+        self.assertEqual(sink.stats()["failed"], 1)
+
+    def test_shutdown_flushes_pending_entries(self):
+        sink = InlineSink(batch_size=10, flush_interval=60, max_buffer=100)
+        with mock.patch.object(activity_log, "_sink", sink):
+            sink.emit(entry(1))
+            sink.emit(entry(2))
+            flush_activity_logs()
+
+        self.assertEqual(UserActivityLog.objects.count(), 2)
+        self.assertEqual(sink.stats()["pending"], 0)
+
+    def test_exit_flush_writes_to_the_buffered_database(self):
+        sink = InlineSink(batch_size=10, flush_interval=60, max_buffer=100)
+        with mock.patch.object(activity_log, "_sink", sink):
+            sink.emit(entry(1))
+            flush_activity_logs_at_exit()
+
+        self.assertEqual(UserActivityLog.objects.count(), 1)
+
+    def test_exit_flush_is_skipped_once_the_database_is_gone(self):
+        sink = InlineSink(batch_size=10, flush_interval=60, max_buffer=100)
+        with mock.patch.object(activity_log, "_sink", sink):
+            sink.emit(entry(1))
+            sink.database = "destroyed_test_database"
+            with self.assertLogs("utils.activity_log", level="WARNING"):
+                flush_activity_logs_at_exit()
+
+        self.assertEqual(UserActivityLog.objects.count(), 0)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs fork")
+    def test_child_of_a_fork_does_not_inherit_held_locks(self):
+        sink = RecordingSink(batch_size=10, flush_interval=60, max_buffer=100)
+        sink.emit(entry(1))
+        with mock.patch.object(activity_log, "_sink", sink):
+            # A parent thread in the middle of emit() when the process forks
+            with sink._lock:
+                pid = os.fork()
+                if pid == 0:
+                    # Killed by the alarm if emit() deadlocks
+                    signal.alarm(5)
+                    sink.emit(entry(2))
+                    os._exit(0 if sink.stats()["pending"] == 1 else 1)
+        _, status = os.waitpid(pid, 0)
+
+        self.assertTrue(os.WIFEXITED(status))
+        self.assertEqual(os.WEXITSTATUS(status), 0)
+        self.assertEqual(sink.stats()["pending"], 1)
@@ -0,0 +1,177 @@
+import copy
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from django.core.cache import cache
+from django.utils import timezone
+from oauth2_provider.models import AccessToken
+
+from utils.local_cache import LocalLRUCache
+from .models import User, UserActiveToken
+
+logger = logging.getLogger(__name__)
+
+# Token -> access token and user -> (user, active session) entries are kept
+# in Redis for TOKEN_CACHE_TIMEOUT and in each process for
+# LOCAL_TOKEN_CACHE_TIMEOUT. Redis only holds what authentication needs
+# (token owner, expiry and scope; user pk and the id and checksum of the
+# active session token), never tokens or user rows: users are loaded by pk
+# when their Redis entry is used, full instances only live in the
+# process-local LRU.
+# Signals drop the Redis and local entries when tokens, sessions or users
+# change; other processes see it once their short local entry expires.
+TOKEN_CACHE_TIMEOUT = 60 * 5
+LOCAL_TOKEN_CACHE_TIMEOUT = 10
+
+_local = LocalLRUCache(max_size=4096, timeout=LOCAL_TOKEN_CACHE_TIMEOUT)
+_MISSING = object()
+
+
+@dataclass
+class ActiveSession:
+    """The token a user is currently signed in with (UserActiveToken)"""
+    id: int
+    checksum: str
+
+    def matches(self, token):
+        return token_checksum(token) == self.checksum
+
+
+@dataclass
+class TokenResolution:
+    access_token: AccessToken
+    user: User
+    active_token: Optional[ActiveSession]
+
+
+def token_checksum(token):
+    # Same checksum django-oauth-toolkit stores in AccessToken.token_checksum
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def access_token_cache_key(checksum):
+    return f"oauth_access_token_{checksum}"
+
+
+def session_user_cache_key(user_id):
+    return f"session_user_{user_id}"
+
+
+def _redis_get(key):
+    try:
+        return cache.get(key, _MISSING)
+    except Exception as e:
+        logger.warning(f"Token cache unavailable: {str(e)}")
+        return _MISSING
+
+
+def _cache_set(key, local_value, shared_value, timeout=TOKEN_CACHE_TIMEOUT):
+    _local.set(key, local_value, timeout=min(timeout, LOCAL_TOKEN_CACHE_TIMEOUT))
+    try:
+        cache.set(key, shared_value, timeout=timeout)
+    except Exception as e:
+        logger.warning(f"Token cache unavailable: {str(e)}")
+
+
+def _cache_delete(key):
+    _local.delete(key)
+    try:
+        cache.delete(key)
+    except Exception as e:
+        logger.warning(f"Token cache unavailable: {str(e)}")
+
+
+def load_user(user_id):
+    return User.objects.select_related("class_enrolled__definition").filter(pk=user_id).first()
+
+
+def get_session_user(user_id):
+    """The user and its active session (None if it has none)"""
+    key = session_user_cache_key(user_id)
+    entry = _local.get(key, _MISSING)
+    if entry is not _MISSING:
+        return entry
+
+    shared = _redis_get(key)
+    if shared is not _MISSING:
+        user = load_user(user_id) if shared["user_id"] is not None else None
+        entry = (user, ActiveSession(**shared["active_token"]) if shared["active_token"] else None)
+        _local.set(key, entry)
+        return entry
+
+    user = load_user(user_id)
+    active_token = None
+    if user is not None:
+        row = UserActiveToken.objects.filter(user_id=user_id).values("id", "token").first()
+        if row is not None:
+            active_token = ActiveSession(id=row["id"], checksum=token_checksum(row["token"]))
+    entry = (user, active_token)
+    _cache_set(key, entry, {
+        "user_id": str(user.pk) if user else None,
+        "active_token": {"id": active_token.id, "checksum": active_token.checksum} if active_token else None,
+    })
+    return entry
+
+
+def get_active_token(user_id):
+    return get_session_user(user_id)[1]
+
+
+def resolve_token(token):
+    """
+    Resolve a bearer token to a TokenResolution, or None when the token is
+    unknown or expired. A warm local cache answers without touching the
+    database, warm Redis entries with one user query.
+    """
+    if not token:
+        return None
+    checksum = token_checksum(token)
+    key = access_token_cache_key(checksum)
+    access_token = _local.get(key, _MISSING)
+    if access_token is _MISSING:
+        shared = _redis_get(key)
+        if shared is not _MISSING:
+            # Unsaved instance without the raw token, enough for request.auth
+            access_token = AccessToken(token_checksum=checksum, **shared)
+            _local.set(key, access_token)
+    if access_token is _MISSING:
+        access_token = (
+            AccessToken.objects.select_related("application")
+            .filter(token_checksum=checksum)
+            .first()
+        )
+        if access_token is None or access_token.user_id is None:
+            return None
+        # The user is not loaded here, it has its own entry so that user
+        # changes only need to drop one key
+        remaining = int((access_token.expires - timezone.now()).total_seconds())
+        if remaining > 0:
+            _cache_set(key, access_token, {
+                "id": access_token.pk,
+                "user_id": access_token.user_id,
+                "application_id": access_token.application_id,
+                "expires": access_token.expires,
+                "scope": access_token.scope,
+            }, timeout=min(remaining, TOKEN_CACHE_TIMEOUT))
+
+    if access_token.is_expired():
+        return None
+    user, active_token = get_session_user(access_token.user_id)
+    if user is None:
+        return None
+    # Cached instances are shared by the requests of this process
+    access_token, user = copy.copy(access_token), copy.copy(user)
+    access_token.user = user
+    return TokenResolution(access_token=access_token, user=user, active_token=active_token)
+
+
+def invalidate_token(token):
+    if token:
+        _cache_delete(access_token_cache_key(token_checksum(token)))
+
+
+def invalidate_session_user(user_id):
+    if user_id:
+        _cache_delete(session_user_cache_key(user_id))
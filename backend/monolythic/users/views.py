@@ -8,7 +8,7 @@ from .serializers import (
     PasswordResetConfirmSerializer,
     PhoneNumberValidationSerializer,
     UserActivityLogSerializer,
-    UserSerializer,
+    UserDetailSerializer,
     UserRegistrationSerializer,
     ChangePasswordSerializer,
     PasswordResetSerializer,
@@ -32,6 +32,7 @@ from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from oauth2_provider.models import AccessToken as OAuth2AccessToken
 from .models import UserActiveToken
+from .token_cache import invalidate_token, invalidate_session_user
 from .middleware import get_current_request, SingleSessionMiddleware
 from .tasks.task import send_async_mail
 from django_filters.rest_framework import DjangoFilterBackend
@@ -43,16 +44,19 @@ from django.db.models import Count
 from datetime import datetime,timedelta
 import logging
 from utils.mixins import ActivityLoggingMixin
+from utils.pagination import KeysetPagination
 
 from django.db.models import Sum, F,Q
 from payments.models import Subscription
+from analytics.models import DailyMetrics
+from analytics.metrics import get_period_metrics, get_user_totals
 
 logger = logging.getLogger(__name__)
 
 
 class UserViewSet(ActivityLoggingMixin,viewsets.ModelViewSet):
     queryset = User.objects.all()
-    serializer_class = UserSerializer
+    serializer_class = UserDetailSerializer
     filterset_class = UserFilter
     filter_backends = [DjangoFilterBackend]
     swagger_tags = ["Users"]
@@ -67,7 +71,7 @@ class UserViewSet(ActivityLoggingMixin,viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action == "create":
             return UserRegistrationSerializer
-        return UserSerializer
+        return UserDetailSerializer
 
     @swagger_auto_schema(tags=["Users"])
     def create(self, request, *args, **kwargs):
@@ -140,14 +144,14 @@ class UserViewSet(ActivityLoggingMixin,viewsets.ModelViewSet):
         responses={
             200: openapi.Response(
                 description="User information retrieved successfully",
-                schema=UserSerializer
+                schema=UserDetailSerializer
             )
         }
     )
     @action(detail=False, methods=["get"])
     def info(self, request):
         user = request.user
-        serializer = UserSerializer(user, context={"request": request})
+        serializer = UserDetailSerializer(user, context={"request": request})
         self.log_activity(self.request,"Viewed user information", {"user_id": str(user.id)})
         return Response(serializer.data)
 
@@ -169,29 +173,12 @@ class UserViewSet(ActivityLoggingMixin,viewsets.ModelViewSet):
     )
     @action(detail=False, methods=["get"])
     def stats(self, request):
-        # Get counts for different user types
-        
-        # Count students (users with user_type STUDENT)
-        # Exclude staff and superusers
-        total_students = User.objects.filter(
-            user_type='STUDENT',
-            is_staff=False,
-            is_superuser=False
-        ).count()
-        
-        # Count professionals (users with user_type PROFESSIONAL)
-        # Exclude staff and superusers
-        total_professionals = User.objects.filter(
-            user_type='PROFESSIONAL',
-            is_staff=False,
-            is_superuser=False
-        ).count()
-        
-        # Count admins (users who are staff OR superusers)
-        total_admins = User.objects.filter(Q(is_staff=True) | Q(is_superuser=True)).count()
-        
-        # Total users
-        total_users = User.objects.count()
+        # Counts of the latest DailyMetrics rollup
+        totals = get_user_totals()
+        total_students = totals['total_students']
+        total_professionals = totals['total_professionals']
+        total_admins = totals['total_admins']
+        total_users = totals['total_users']
         # Return the statistics
         data = {
             'total_students': total_students,
@@ -665,6 +652,7 @@ class PasswordResetConfirmView(APIView):
 
 @receiver(post_save, sender=OAuth2AccessToken)
 def update_user_active_token(sender, instance, created, **kwargs):
+    invalidate_token(instance.token)
     if created and instance.user:
         request = get_current_request()
         device_info = SingleSessionMiddleware.get_device_info(request)
@@ -675,11 +663,15 @@ def update_user_active_token(sender, instance, created, **kwargs):
                 **device_info
             }
         )
+        invalidate_session_user(instance.user_id)
 
 @receiver(post_delete, sender=OAuth2AccessToken)
 def delete_user_active_token(sender, instance, **kwargs):
+    # Revoked or deleted token
+    invalidate_token(instance.token)
     if instance.user:
         UserActiveToken.objects.filter(user=instance.user).delete()
+        invalidate_session_user(instance.user_id)
 
 
 class UserStatsView(ActivityLoggingMixin, APIView):
@@ -716,86 +708,42 @@ class UserStatsView(ActivityLoggingMixin, APIView):
         }
     )
     def get(self, request):
-        current_year = datetime.now().year
-        current_month = datetime.now().month
-        last_month = (current_month - 1) if current_month > 1 else 12
-        current_time = timezone.now()
-        
+        # Everything is read from the DailyMetrics rollup (analytics.tasks.rollup_daily_metrics),
+        # so the cost does not depend on the size of the users and subscriptions tables
+        today = timezone.localdate()
+        month_start = today.replace(day=1)
+        last_month_end = month_start - timedelta(days=1)
+        last_month_start = last_month_end.replace(day=1)
+
+        this_month = get_period_metrics(month_start, today)
+        last_month = get_period_metrics(last_month_start, last_month_end)
+
         # Users statistics
-        total_users = User.objects.count()
-        users_last_month = User.objects.filter(
-            date_joined__year=current_year,
-            date_joined__month=last_month
-        ).count()
-        users_this_month = User.objects.filter(
-            date_joined__year=current_year,
-            date_joined__month=current_month
-        ).count()
-        user_growth = self.calculate_growth(users_last_month, users_this_month)
-
-        # Updated Revenue statistics using subscription plan prices
-        monthly_revenue = Subscription.objects.filter(
-            created_at__year=current_year,
-            created_at__month=current_month,
-            is_active=True,
-            end_date__gt=current_time
-        ).annotate(
-            plan_price=F('plan__price')  # Get price from related SubscriptionPlan
-        ).aggregate(
-            total=Sum('plan_price', default=0)
-        )['total'] or 0
-        
-        last_month_revenue = Subscription.objects.filter(
-            created_at__year=current_year,
-            created_at__month=last_month,
-            is_active=True,
-            end_date__gt=current_time
-        ).annotate(
-            plan_price=F('plan__price')  # Get price from related SubscriptionPlan
-        ).aggregate(
-            total=Sum('plan_price', default=0)
-        )['total'] or 0
-        
-        revenue_growth = self.calculate_growth(last_month_revenue, monthly_revenue)  # Calculate revenue growth here
+        total_users = get_user_totals()['total_users']
+        user_growth = self.calculate_growth(last_month['signups'], this_month['signups'])
+
+        # Revenue statistics (subscription plan prices)
+        monthly_revenue = this_month['revenue']
+        revenue_growth = self.calculate_growth(last_month['revenue'], monthly_revenue)
 
         # Conversion rate statistics
-        visits_this_month = User.objects.filter(
-            last_login__year=current_year,
-            last_login__month=current_month
-        ).count()
-        
-        purchases_this_month = Subscription.objects.filter(
-            created_at__year=current_year,
-            created_at__month=current_month,
-            is_active=True,
-            end_date__gt=current_time
-        ).values('user').distinct().count()
-        
-        # Calculate last month's conversion rate for growth
-        visits_last_month = User.objects.filter(
-            last_login__year=current_year,
-            last_login__month=last_month
-        ).count()
-        
-        purchases_last_month = Subscription.objects.filter(
-            created_at__year=current_year,
-            created_at__month=last_month,
-            is_active=True,
-            end_date__gt=current_time
-        ).values('user').distinct().count()
-        
+        visits_this_month = this_month['logins']
+        purchases_this_month = this_month['purchasers']
+        visits_last_month = last_month['logins']
+        purchases_last_month = last_month['purchasers']
+
         conversion_rate = round((purchases_this_month / visits_this_month * 100) if visits_this_month > 0 else 0, 2)
         last_month_conversion = (purchases_last_month / visits_last_month * 100) if visits_last_month > 0 else 0
         conversion_growth = self.calculate_growth(last_month_conversion, conversion_rate)
 
-        # Monthly user statistics (existing code)
-        monthly_stats = User.objects.filter(
-            date_joined__year=current_year
+        # Monthly signups of the current year
+        monthly_stats = DailyMetrics.objects.filter(
+            date__year=today.year,
         ).annotate(
-            month=ExtractMonth('date_joined')
+            month=ExtractMonth('date')
         ).values('month').annotate(
-            users=Count('id')
-        ).order_by('month')
+            users=Sum('signups')
+        ).filter(users__gt=0).order_by('month')
 
         # French month names (existing code)
         month_names = {
@@ -831,6 +779,11 @@ class UserStatsView(ActivityLoggingMixin, APIView):
         return f"{'+' if growth >= 0 else ''}{growth:.1f}%"
 
 
+class UserActivityLogPagination(KeysetPagination):
+    """Newest logs first, paged on (timestamp, pk)"""
+    ordering = ('-timestamp',)
+
+
 class UserActivityLogViewSet(ActivityLoggingMixin, viewsets.ReadOnlyModelViewSet):
     """
     A viewset that provides `list` and `retrieve` actions for UserActivityLog.
@@ -841,6 +794,7 @@ class UserActivityLogViewSet(ActivityLoggingMixin, viewsets.ReadOnlyModelViewSet
     serializer_class = UserActivityLogSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['user']
+    pagination_class = UserActivityLogPagination
     
     def list(self, request, *args, **kwargs):
         self.log_activity(request, "Viewed user activity logs")
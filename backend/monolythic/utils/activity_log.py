@@ -0,0 +1,239 @@
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "SINK": "buffered",  # sync, buffered or celery
+    "BATCH_SIZE": 200,  # flush as soon as this many entries are waiting
+    "FLUSH_INTERVAL": 2.0,  # seconds between background flushes
+    "MAX_BUFFER": 10000,  # oldest entries are dropped beyond this size
+}
+
+
+def get_activity_log_settings():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "ACTIVITY_LOG", {}))
+    return config
+
+
+def write_activity_logs(entries):
+    """ Persist a batch of activity log entries with a single bulk INSERT """
+    from users.models import UserActivityLog
+
+    if not entries:
+        return 0
+    logs = []
+    for entry in entries:
+        entry = dict(entry)
+        if isinstance(entry.get("timestamp"), str):
+            entry["timestamp"] = parse_datetime(entry["timestamp"])
+        logs.append(UserActivityLog(**entry))
+    UserActivityLog.objects.bulk_create(logs)
+    return len(logs)
+
+
+class SyncActivityLogSink:
+    """ Writes every entry immediately (previous behaviour, handy for tests) """
+
+    def emit(self, entry):
+        write_activity_logs([entry])
+
+    def flush(self):
+        return 0
+
+    def stats(self):
+        return {"sink": "sync"}
+
+
+class BufferedActivityLogSink:
+    """
+    In-process ring buffer of activity log entries.
+
+    Entries are flushed with one ``bulk_create`` by a daemon thread every
+    ``FLUSH_INTERVAL`` seconds, or as soon as ``BATCH_SIZE`` entries are
+    waiting. When writes cannot keep up the buffer is capped at
+    ``MAX_BUFFER`` entries: the oldest ones are discarded and counted in
+    ``dropped`` instead of making requests wait on the database.
+    """
+
+    name = "buffered"
+
+    def __init__(self, batch_size, flush_interval, max_buffer):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        # Database the buffered entries belong to, see flush_activity_logs_at_exit
+        self.database = None
+
+    def emit(self, entry):
+        self._ensure_worker()
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append(entry)
+            pending = len(self._buffer)
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def _drain(self):
+        with self._lock:
+            batch = list(self._buffer)
+            self._buffer.clear()
+        return batch
+
+    def write(self, batch):
+        write_activity_logs(batch)
+
+    def flush(self):
+        """ Write out everything currently buffered, returns the number of entries """
+        with self._flush_lock:
+            batch = self._drain()
+            written = 0
+            for start in range(0, len(batch), self.batch_size):
+                chunk = batch[start:start + self.batch_size]
+                try:
+                    self.write(chunk)
+                    written += len(chunk)
+                except Exception as e:
+                    self.failed += len(chunk)
+                    logger.error(f"Failed to write {len(chunk)} activity logs: {str(e)}")
+            self.flushed += written
+            return written
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._buffer)
+        return {
+            "sink": self.name,
+            "pending": pending,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def after_fork(self):
+        """
+        Reset the child of a fork (gunicorn/celery prefork): the worker thread
+        did not survive it, the locks may have been held by parent threads that
+        no longer exist, and the buffered entries are the parent's to write.
+        """
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.database = None
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.database = connection.settings_dict["NAME"]
+            self._thread = threading.Thread(
+                target=self._run, name="activity-log-flusher", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            self.flush()
+
+
+class CeleryActivityLogSink(BufferedActivityLogSink):
+    """ Same buffering, but each batch is handed to a Celery task for writing """
+
+    name = "celery"
+
+    def write(self, batch):
+        from users.tasks.task import write_activity_logs_task
+
+        payload = []
+        for entry in batch:
+            entry = dict(entry)
+            if entry.get("user_id") is not None:
+                entry["user_id"] = str(entry["user_id"])
+            if entry.get("timestamp") is not None:
+                entry["timestamp"] = entry["timestamp"].isoformat()
+            payload.append(entry)
+        write_activity_logs_task.delay(payload)
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_activity_log_sink():
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                config = get_activity_log_settings()
+                if config["SINK"] == "sync":
+                    _sink = SyncActivityLogSink()
+                else:
+                    sink_class = CeleryActivityLogSink if config["SINK"] == "celery" else BufferedActivityLogSink
+                    _sink = sink_class(
+                        batch_size=config["BATCH_SIZE"],
+                        flush_interval=config["FLUSH_INTERVAL"],
+                        max_buffer=config["MAX_BUFFER"],
+                    )
+    return _sink
+
+
+def flush_activity_logs(**kwargs):
+    """ Flush pending entries, connected to Celery worker shutdown """
+    if _sink is not None:
+        try:
+            _sink.flush()
+        except Exception as e:
+            logger.error(f"Error flushing activity logs on shutdown: {str(e)}")
+
+
+def flush_activity_logs_at_exit():
+    """
+    Flush pending entries on process exit, unless the database they were
+    buffered for is gone (e.g. a test database destroyed before the
+    interpreter exits): they are dropped rather than written to another one.
+    """
+    sink = _sink
+    if sink is None:
+        return
+    database = getattr(sink, "database", None)
+    if database is not None and connection.settings_dict["NAME"] != database:
+        logger.warning(f"Dropping {sink.stats()['pending']} activity logs buffered for database {database}")
+        return
+    flush_activity_logs()
+
+
+def _reset_after_fork():
+    global _sink_lock
+    _sink_lock = threading.Lock()
+    if _sink is not None and hasattr(_sink, "after_fork"):
+        _sink.after_fork()
+
+
+atexit.register(flush_activity_logs_at_exit)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,48 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalLRUCache:
+    """
+    Small thread safe in-process LRU with per entry expiry, used as a first
+    tier in front of Redis for very hot keys. Entries cannot be invalidated
+    from other processes, so keep ``timeout`` short.
+    """
+
+    def __init__(self, max_size=1024, timeout=30):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            self._entries[key] = (value, time.time() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
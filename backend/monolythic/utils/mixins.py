@@ -1,12 +1,13 @@
-from users.models import UserActivityLog
 from django.utils.timezone import now
+from .activity_log import get_activity_log_sink
 
 class ActivityLoggingMixin:
     def log_activity(self, request, action, extra_data=None):
         """ Log API activity with more details """
         if request.user.is_authenticated:
-            UserActivityLog.objects.create(
-                user=request.user,
+            # Buffered and written in batches, see utils.activity_log
+            get_activity_log_sink().emit(dict(
+                user_id=request.user.pk,
                 action=action,
                 ip_address=self.get_client_ip(request),
                 user_agent=request.META.get("HTTP_USER_AGENT", ""),
@@ -15,7 +16,7 @@ class ActivityLoggingMixin:
                 referrer=request.META.get("HTTP_REFERER", ""),
                 extra_data=extra_data or {},
                 timestamp=now()
-            )
+            ))
 
     def get_client_ip(self, request):
         x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
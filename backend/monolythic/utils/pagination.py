@@ -0,0 +1,239 @@
+import base64
+import datetime
+import decimal
+import json
+import uuid
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimate_count(queryset):
+    """
+    Cheap row count estimate on PostgreSQL: the table statistics (reltuples)
+    for an unfiltered queryset, the planner's row estimate otherwise.
+    Returns None when no estimate is available.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    queryset = queryset.order_by()
+    with connection.cursor() as cursor:
+        if not queryset.query.where and not queryset.query.annotations:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            # -1 (or 0) means the table has never been analyzed
+            return row[0] if row and row[0] > 0 else None
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination: pages are fetched with a WHERE on the ordering
+    columns of the last row seen instead of an OFFSET, so deep pages cost the
+    same as the first one.
+
+    The ordering is taken from the queryset (view ordering, OrderingFilter or
+    model Meta) and falls back to ``ordering``; the primary key is appended as
+    a tie-breaker. Ordering columns must be plain non-null fields or
+    annotations. ``?count=exact|estimate|none`` picks how ``count`` is
+    computed, clients still sending ``?page=N`` get page-number pagination.
+    """
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    # exact, estimate (falls back to exact when unavailable) or none
+    count_mode = "estimate"
+    ordering = ("-created_at",)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.legacy = None
+        ordering = self.get_ordering(queryset)
+        cursor = request.query_params.get(self.cursor_query_param)
+
+        if ordering is None or (not cursor and request.query_params.get("page")):
+            self.legacy = PageNumberPagination()
+            self.legacy.page_size = self.page_size
+            self.legacy.page_size_query_param = self.page_size_query_param
+            self.legacy.max_page_size = self.max_page_size
+            return self.legacy.paginate_queryset(queryset, request, view)
+
+        self.count = self.get_count(queryset)
+        position, reverse = self.decode_cursor(cursor) if cursor else (None, False)
+        if position is not None and len(position) != len(ordering):
+            raise NotFound("Invalid cursor")
+
+        page_ordering = [self.invert(field) for field in ordering] if reverse else ordering
+        queryset = queryset.order_by(*page_ordering)
+        if position is not None:
+            queryset = queryset.filter(self.build_filter(page_ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        # Moving backwards we know there is a next page, moving forwards we know
+        # there is a previous one as soon as a cursor was given
+        self.has_next = has_more if not reverse else True
+        self.has_previous = has_more if reverse else position is not None
+        self.ordering_fields = ordering
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+        return Response({
+            "count": self.count,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "count": {"type": "integer", "nullable": True},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+            {
+                "name": self.count_query_param,
+                "required": False,
+                "in": "query",
+                "description": "How to compute count: exact, estimate or none.",
+                "schema": {"type": "string"},
+            },
+        ]
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+            return max(1, min(page_size, self.max_page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, queryset):
+        """Ordering of the queryset as a list of field names, None if it cannot be used for keysets"""
+        query = queryset.query
+        if query.order_by:
+            ordering = list(query.order_by)
+        elif query.default_ordering and queryset.model._meta.ordering:
+            ordering = list(queryset.model._meta.ordering)
+        else:
+            ordering = list(self.ordering)
+
+        if not all(isinstance(field, str) and "__" not in field and field.lstrip("-") != "?" for field in ordering):
+            return None
+        pk_names = ("pk", queryset.model._meta.pk.name)
+        if not any(field.lstrip("-") in pk_names for field in ordering):
+            ordering.append("-pk" if ordering and ordering[-1].startswith("-") else "pk")
+        return ordering
+
+    def get_count(self, queryset):
+        mode = self.request.query_params.get(self.count_query_param, self.count_mode)
+        if mode == "none":
+            return None
+        if mode == "estimate":
+            count = estimate_count(queryset)
+            if count is not None:
+                return count
+        return queryset.count()
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def build_filter(ordering, position):
+        """
+        Rows strictly after ``position`` in ``ordering``:
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return condition
+
+    def get_position(self, obj):
+        position = []
+        for field in self.ordering_fields:
+            value = getattr(obj, field.lstrip("-"))
+            if isinstance(value, (datetime.datetime, datetime.date)):
+                value = value.isoformat()
+            elif isinstance(value, (decimal.Decimal, uuid.UUID)):
+                value = str(value)
+            position.append(value)
+        return position
+
+    def encode_cursor(self, position, reverse):
+        data = json.dumps({"p": position, "r": int(reverse)}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            return list(data["p"]), bool(data.get("r"))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound("Invalid cursor")
+
+    def build_link(self, cursor):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, "page")
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.build_link(self.encode_cursor(self.get_position(self.page[-1]), False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.build_link(self.encode_cursor(self.get_position(self.page[0]), True))
@@ -0,0 +1,110 @@
+import re
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections, migrations
+from django.db.models import Case, FloatField, Q, TextField, Value, When
+from django.db.models.functions import Cast, Upper
+
+# Ranked full-text search over a few text columns of a model, given as
+# {field: weight}. On PostgreSQL every term must prefix-match a word of
+# to_tsvector('simple', ...) and rows are ordered by ts_rank; the migrations
+# index that exact expression with GIN (search_index), so the index follows
+# every write without triggers. Other databases (SQLite for local runs) fall
+# back to one icontains per term and field, ranked by the matched weights.
+#
+# Migrations build their indexes from the same helpers: when the fields or
+# weights of a search change, its index has to be rebuilt in a migration or
+# PostgreSQL stops using it.
+SEARCH_CONFIG = "simple"
+MAX_TERMS = 8
+# Fallback rank of a term found in a field, by weight
+WEIGHT_POINTS = {"A": 8, "B": 4, "C": 2, "D": 1}
+
+
+def is_postgres(queryset):
+    return connections[queryset.db].vendor == "postgresql"
+
+
+def search_terms(value):
+    """Lowercased words of a search string, at most MAX_TERMS"""
+    return re.findall(r"\w+", value.lower())[:MAX_TERMS]
+
+
+def search_vector(fields):
+    vector = None
+    for field, weight in fields.items():
+        field_vector = SearchVector(field, weight=weight, config=SEARCH_CONFIG)
+        vector = field_vector if vector is None else vector + field_vector
+    return vector
+
+
+def search_query(terms):
+    """Every term, as a word prefix: 'ali:* & ngo:*'"""
+    return SearchQuery(" & ".join(f"{term}:*" for term in terms), search_type="raw", config=SEARCH_CONFIG)
+
+
+def search(queryset, fields, value):
+    """
+    Rows of ``queryset`` matching every word of ``value`` in ``fields``,
+    annotated with ``search_rank`` and ordered by it (best first, newest
+    rows first among equals when the model has a created_at).
+    """
+    terms = search_terms(value)
+    if not terms:
+        return queryset
+    if "search_rank" in queryset.query.annotations:
+        # Already searched, e.g. by a filterset run again by the filter backend
+        return queryset
+    if is_postgres(queryset):
+        vector = search_vector(fields)
+        queryset = queryset.alias(search_document=vector).filter(search_document=search_query(terms)).annotate(
+            # double precision: the rank round-trips through keyset cursors unchanged
+            search_rank=Cast(SearchRank(vector, search_query(terms)), FloatField())
+        )
+    else:
+        condition = Q()
+        points = []
+        for term in terms:
+            condition &= Q(*[Q(**{f"{field}__icontains": term}) for field in fields], _connector=Q.OR)
+            points += [
+                Case(When(**{f"{field}__icontains": term}, then=Value(WEIGHT_POINTS[weight])), default=Value(0))
+                for field, weight in fields.items()
+            ]
+        queryset = queryset.filter(condition).annotate(search_rank=sum(points[1:], points[0]))
+    ordering = ["-search_rank"]
+    if any(field.name == "created_at" for field in queryset.model._meta.concrete_fields):
+        ordering.append("-created_at")
+    return queryset.order_by(*ordering)
+
+
+def search_index(name, fields):
+    """GIN index of the search_vector of ``fields``"""
+    return GinIndex(search_vector(fields), name=name)
+
+
+def trigram_index(name, field):
+    """Trigram GIN index on UPPER(field), which serves ``field__icontains`` on PostgreSQL"""
+    return GinIndex(OpClass(Upper(Cast(field, TextField())), name="gin_trgm_ops"), name=name)
+
+
+def add_postgres_indexes(app_label, model_name, *indexes):
+    """
+    Migration operation creating ``indexes`` on PostgreSQL only; the models
+    do not declare them since SQLite has no GIN indexes.
+    """
+    def forwards(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        model = apps.get_model(app_label, model_name)
+        for index in indexes:
+            schema_editor.add_index(model, index)
+
+    def backwards(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        model = apps.get_model(app_label, model_name)
+        for index in indexes:
+            schema_editor.remove_index(model, index)
+
+    return migrations.RunPython(forwards, backwards)
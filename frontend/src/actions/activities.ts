@@ -4,7 +4,7 @@ import api from "@/services/api";
 import { auth } from "@/auth";
 import { AxiosError } from "axios";
 import { Action } from "sonner";
-import { ActivityLogType } from "@/types";
+import { ActivityLogType, PaginatedResponse } from "@/types";
 
 
 type Params = {
@@ -23,7 +23,7 @@ export const listActivities  =async (params?:Params) =>{
             },
             params
         });
-        return response.data as ActivityLogType[];
+        return (response.data as PaginatedResponse<ActivityLogType>).results;
     } catch (error: unknown) {
         const axiosError = error as AxiosError;
         if (axiosError.response?.data) {
@@ -30,7 +30,8 @@ export const trackUserVisit = async (data: VisitorTrackingData) => {
             };
         }
 
-        const response = await api.post("/api/visitors/", data, { headers });
+        // Queued by the backend and written in bulk
+        const response = await api.post("/api/visitors/batch/", { events: [data] }, { headers });
         return response.data;
     } catch (error: unknown) {
         const axiosError = error as AxiosError;